@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Worker Time-to-Ready Benchmark
+Runs `handler_fluxgym.py --profile-startup --json` in fresh interpreters,
+records the median wall-clock time-to-ready and per-phase timings for the
+current git commit, and compares against the previous recorded run.
+
+    python bench_startup.py                 # 5 runs, append to STARTUP_HISTORY
+    python bench_startup.py --runs 10 --no-record
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Kept in the repository so time-to-ready can be compared across commits
+DEFAULT_HISTORY = os.getenv("STARTUP_HISTORY", os.path.join(HERE, "benchmarks", "startup_history.jsonl"))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=HERE,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_once():
+    """One cold interpreter start; returns (wall ms, in-process report)"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(HERE, "handler_fluxgym.py"),
+                             "--profile-startup", "--json"],
+                            capture_output=True, text=True, cwd=HERE, check=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return wall_ms, report
+
+
+def summarize(runs):
+    phases = {}
+    for _, report in runs:
+        for entry in report["phases"]:
+            if entry["ms"] is not None:
+                phases.setdefault(entry["phase"], []).append(entry["ms"])
+    return {
+        "wall_ms": round(statistics.median(wall for wall, _ in runs), 2),
+        "time_to_ready_ms": round(statistics.median(r["time_to_ready_ms"] for _, r in runs), 2),
+        "phases": {name: round(statistics.median(values), 2) for name, values in phases.items()},
+    }
+
+
+def last_entry(history_path):
+    try:
+        with open(history_path) as f:
+            lines = [line for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    return json.loads(lines[-1]) if lines else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--no-record", action="store_true")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    entry = {"commit": git_commit(), "timestamp": time.time(), "runs": args.runs, **summarize(runs)}
+    previous = last_entry(args.history)
+
+    print(f"Commit {entry['commit'][:12]}: wall {entry['wall_ms']:.1f} ms, "
+          f"in-process time-to-ready {entry['time_to_ready_ms']:.1f} ms (median of {args.runs})")
+    for name, ms in entry["phases"].items():
+        print(f"   {name:<40} {ms:10.2f} ms")
+    if previous:
+        delta = entry["wall_ms"] - previous["wall_ms"]
+        print(f"vs {previous['commit'][:12]}: {delta:+.1f} ms wall ({previous['wall_ms']:.1f} ms before)")
+
+    if not args.no_record:
+        os.makedirs(os.path.dirname(args.history) or ".", exist_ok=True)
+        with open(args.history, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Image Captioning
+Pluggable captioning stage between image ingestion and dataset.toml creation.
+Images are captioned in batches, captions are cached by image content hash
+and captioner identity, and the trigger word is prepended to every caption.
+
+    CAPTIONER=none          constant "<trigger_word> <character_name>" captions
+    CAPTIONER=stub          fixed caption, CPU only (tests)
+    CAPTIONER=florence2     Florence-2 (CAPTION_MODEL_ID), GPU when available
+"""
+
+import json
+import os
+import threading
+
+from file_cache import sha256_file
+
+CAPTIONER = os.getenv("CAPTIONER", "none")
+CAPTION_MODEL_ID = os.getenv("CAPTION_MODEL_ID", "multimodalart/Florence-2-large-no-flash-attn")
+CAPTION_TASK = os.getenv("CAPTION_TASK", "<DETAILED_CAPTION>")
+CAPTION_BATCH_SIZE = int(os.getenv("CAPTION_BATCH_SIZE", "8"))
+CAPTION_MAX_TOKENS = int(os.getenv("CAPTION_MAX_TOKENS", "256"))
+CAPTION_CACHE_PATH = os.getenv("CAPTION_CACHE_PATH", "/tmp/fluxgym_cache/captions.json")
+CAPTION_CACHE_ENABLED = os.getenv("CAPTION_CACHE_ENABLED", "1") == "1"
+
+# Boilerplate Florence-2 opens detailed captions with
+CAPTION_PREFIXES = ("The image shows ", "The image is ", "In this image, ", "The image features ")
+
+
+class CaptioningError(Exception):
+    """Raised when the captioner cannot be loaded or fails on a batch"""
+
+
+class StubCaptioner:
+    """Deterministic CPU captioner for tests and dry runs"""
+
+    name = "stub"
+    uses_gpu = False
+
+    def __init__(self, caption="a photo of a person"):
+        self.caption = caption
+        self.identity = f"stub:{caption}"
+
+    def caption_batch(self, paths, device=None):
+        return [self.caption for _ in paths]
+
+    def release(self):
+        pass
+
+
+class Florence2Captioner:
+    """Florence-2 captioner; loaded on first use, offloaded to CPU between jobs"""
+
+    name = "florence2"
+    # Runs on a GPU when one is available, so callers hold a training slot
+    uses_gpu = True
+
+    def __init__(self, model_id=CAPTION_MODEL_ID, task=CAPTION_TASK, max_new_tokens=CAPTION_MAX_TOKENS):
+        self.model_id = model_id
+        self.task = task
+        self.max_new_tokens = max_new_tokens
+        self.identity = f"florence2:{model_id}:{task}:{max_new_tokens}"
+        self.model = None
+        self.processor = None
+        self.device = "cpu"
+        self._lock = threading.Lock()
+
+    def _load(self, device=None):
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoProcessor
+        except ImportError as e:
+            raise CaptioningError(f"Florence-2 captioning needs torch and transformers: {e}")
+        self.device = (device or "cuda") if torch.cuda.is_available() else "cpu"
+        if self.model is None:
+            print(f"Loading captioner {self.model_id}...")
+            self.model = AutoModelForCausalLM.from_pretrained(
+                self.model_id, torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+                trust_remote_code=True).eval()
+            self.processor = AutoProcessor.from_pretrained(self.model_id, trust_remote_code=True)
+        self.model.to(self.device)
+
+    def caption_batch(self, paths, device=None):
+        from PIL import Image
+
+        with self._lock:
+            if self.model is None or self.device == "cpu" or (device and self.device != device):
+                self._load(device)
+            images = []
+            for path in paths:
+                with Image.open(path) as image:
+                    images.append(image.convert("RGB"))
+            inputs = self.processor(text=[self.task] * len(images), images=images,
+                                    return_tensors="pt", padding=True)
+            inputs = {k: v.to(self.device, self.model.dtype) if v.is_floating_point() else v.to(self.device)
+                      for k, v in inputs.items()}
+            generated = self.model.generate(input_ids=inputs["input_ids"], pixel_values=inputs["pixel_values"],
+                                            max_new_tokens=self.max_new_tokens, num_beams=3)
+            texts = self.processor.batch_decode(generated, skip_special_tokens=True)
+        return [clean_caption(text) for text in texts]
+
+    def release(self):
+        """Free GPU memory for training; the weights stay loaded on the CPU"""
+        with self._lock:
+            if self.model is not None and self.device != "cpu":
+                import torch
+                self.model.to("cpu")
+                self.device = "cpu"
+                torch.cuda.empty_cache()
+
+
+CAPTIONERS = {"stub": StubCaptioner, "florence2": Florence2Captioner}
+
+_captioners = {}
+_captioners_lock = threading.Lock()
+
+
+def get_captioner(name=CAPTIONER):
+    """Process-wide captioner instance, or None for constant captions"""
+    if name == "none":
+        return None
+    if name not in CAPTIONERS:
+        raise CaptioningError(f"Unknown captioner {name!r}; expected none or {', '.join(CAPTIONERS)}")
+    with _captioners_lock:
+        if name not in _captioners:
+            _captioners[name] = CAPTIONERS[name]()
+        return _captioners[name]
+
+
+def clean_caption(text):
+    """Strip Florence-2 boilerplate and whitespace from a generated caption"""
+    text = " ".join(text.split())
+    for prefix in CAPTION_PREFIXES:
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+            break
+    return text.rstrip(".")
+
+
+def with_trigger(trigger_word, caption):
+    """FluxGym caption format: trigger word first, then the description"""
+    return f"{trigger_word}, {caption}" if caption else trigger_word
+
+
+class CaptionCache:
+    """JSON file of (image sha256, captioner identity) -> caption"""
+
+    def __init__(self, path=CAPTION_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._captions = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._captions = {}
+
+    @staticmethod
+    def key(image_sha, identity):
+        return f"{identity}|{image_sha}"
+
+    def get(self, image_sha, identity):
+        with self._lock:
+            return self._captions.get(self.key(image_sha, identity))
+
+    def update(self, captions, identity):
+        """Record {image sha256: caption} and persist the cache file"""
+        with self._lock:
+            for image_sha, caption in captions.items():
+                self._captions[self.key(image_sha, identity)] = caption
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._captions, f)
+            os.replace(tmp, self.path)
+
+
+_caption_cache = None
+_caption_cache_lock = threading.Lock()
+
+
+def get_caption_cache():
+    """Process-wide CaptionCache, or None when CAPTION_CACHE_ENABLED=0"""
+    global _caption_cache
+    if not CAPTION_CACHE_ENABLED:
+        return None
+    if _caption_cache is None:
+        with _caption_cache_lock:
+            if _caption_cache is None:
+                _caption_cache = CaptionCache()
+    return _caption_cache
+
+
+def caption_images(paths, captioner, trigger_word, cache=None, batch_size=CAPTION_BATCH_SIZE, device=None):
+    """Caption every image (cached ones skipped); returns {path: caption with trigger word}
+
+    device picks the CUDA device for GPU captioners (e.g. "cuda:1"); the
+    caller should hold that GPU's training slot while this runs.
+    """
+    hashes = {path: sha256_file(path) for path in paths}
+    captions = {}
+    misses = []
+    for path in paths:
+        cached = cache.get(hashes[path], captioner.identity) if cache is not None else None
+        if cached is None:
+            misses.append(path)
+        else:
+            captions[path] = cached
+
+    fresh = {}
+    try:
+        for start in range(0, len(misses), max(1, batch_size)):
+            batch = misses[start:start + batch_size]
+            try:
+                texts = captioner.caption_batch(batch, device=device)
+            except CaptioningError:
+                raise
+            except Exception as e:
+                raise CaptioningError(f"{captioner.name} failed on a batch of {len(batch)}: {e}") from e
+            for path, text in zip(batch, texts):
+                captions[path] = text
+                fresh[hashes[path]] = text
+    finally:
+        if misses:
+            captioner.release()
+        if cache is not None and fresh:
+            cache.update(fresh, captioner.identity)
+
+    print(f"Captioned {len(paths)} images with {captioner.name} "
+          f"({len(paths) - len(misses)} cached, {len(misses)} generated)")
+    return {path: with_trigger(trigger_word, captions[path]) for path in paths}
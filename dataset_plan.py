@@ -0,0 +1,103 @@
+"""
+Dataset Planner
+Chooses the training resolution (full 1024 or a 512/768 fast preview),
+derives Kohya aspect-ratio bucket settings from the preprocessed image sizes
+and writes dataset.toml with a TOML serializer, so trigger words and names
+containing quotes or backslashes cannot break the file.
+"""
+
+import math
+import os
+
+from image_preprocess import TRAINING_RESOLUTION
+
+RESOLUTIONS = (512, 768, 1024)
+PREVIEW_RESOLUTION = int(os.getenv("PREVIEW_RESOLUTION", "512"))
+BUCKET_RESO_STEPS = 64
+MIN_BUCKET_RESO = 256
+# Images whose aspect ratios all fall within this of square train unbucketed
+SQUARE_TOLERANCE = 0.1
+
+
+class DatasetPlanError(ValueError):
+    """Raised for an unsupported resolution request"""
+
+
+def resolve_resolution(resolution=None, preview=False):
+    """Training resolution for a job: explicit value, preview, or the worker default"""
+    if resolution is None:
+        return PREVIEW_RESOLUTION if preview else TRAINING_RESOLUTION
+    try:
+        resolution = int(resolution)
+    except (TypeError, ValueError):
+        raise DatasetPlanError(f"resolution must be one of {', '.join(map(str, RESOLUTIONS))}")
+    if resolution not in RESOLUTIONS:
+        raise DatasetPlanError(f"resolution must be one of {', '.join(map(str, RESOLUTIONS))}")
+    return resolution
+
+
+def _round_to_step(value, up):
+    steps = value / BUCKET_RESO_STEPS
+    return int(math.ceil(steps) if up else math.floor(steps)) * BUCKET_RESO_STEPS
+
+
+def plan_buckets(sizes, resolution):
+    """Kohya bucket settings covering every (width, height) at the training area"""
+    aspects = [width / height for width, height in sizes]
+    if all(abs(aspect - 1) <= SQUARE_TOLERANCE for aspect in aspects):
+        return {"enable_bucket": False}
+
+    # A bucket keeps the pixel area at resolution^2, so an image with aspect
+    # a needs sides resolution * sqrt(a) and resolution / sqrt(a)
+    widest = max(max(aspects), 1 / min(aspects))
+    long_side = _round_to_step(resolution * math.sqrt(widest), up=True)
+    short_side = _round_to_step(resolution / math.sqrt(widest), up=False)
+    no_upscale = any(width * height < resolution ** 2 for width, height in sizes)
+    if no_upscale:
+        # Small images keep their own size, so the buckets must reach down to them
+        smallest = min(min(width, height) for width, height in sizes)
+        short_side = min(short_side, _round_to_step(smallest, up=False))
+    return {
+        "enable_bucket": True,
+        "min_bucket_reso": max(MIN_BUCKET_RESO, min(short_side, resolution)),
+        "max_bucket_reso": min(2 * resolution, max(long_side, resolution)),
+        "bucket_reso_steps": BUCKET_RESO_STEPS,
+        # Small images train at their own size rather than being upscaled
+        "bucket_no_upscale": no_upscale,
+    }
+
+
+def build_dataset_config(image_dir, sizes, resolution, num_repeats, class_tokens, batch_size=1):
+    """dataset.toml contents as a dict, in the layout FluxGym generates"""
+    return {
+        "general": {
+            "shuffle_caption": False,
+            "caption_extension": ".txt",
+            "keep_tokens": 1,
+        },
+        "datasets": [{
+            "resolution": resolution,
+            "batch_size": batch_size,
+            "keep_tokens": 1,
+            **plan_buckets(sizes, resolution),
+            "subsets": [{
+                "image_dir": image_dir,
+                "class_tokens": class_tokens,
+                "num_repeats": num_repeats,
+            }],
+        }],
+    }
+
+
+def write_dataset_config(config, path):
+    import toml
+
+    with open(path, "w", encoding="utf-8") as f:
+        toml.dump(config, f)
+    return path
+
+
+def summarize(config):
+    """Resolution and bucket settings for the job result"""
+    dataset = config["datasets"][0]
+    return {key: value for key, value in dataset.items() if key != "subsets"}
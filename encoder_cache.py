@@ -0,0 +1,158 @@
+"""
+Encoder Output Cache
+Persists the latent (`*_flux.npz`) and text-encoder (`*_flux_te.npz`) files
+Kohya writes next to each training image, so retraining on the same images
+and captions skips the VAE and T5XXL/CLIP-L encode passes.
+
+Latents are keyed by preprocessed image content, training resolution and VAE
+identity, text encoder outputs by caption text and CLIP-L/T5XXL identity.
+Objects live in a FileCache and are copied (not hard-linked) in and out of
+the job dataset directory: Kohya rewrites a cache file it considers stale in
+place, which would otherwise corrupt the shared object (a retried job reuses
+its directory).
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from file_cache import FileCache, sha256_file
+from model_provisioner import artifact_fingerprint
+
+ENCODER_CACHE_DIR = os.getenv("ENCODER_CACHE_DIR", "/tmp/fluxgym_cache/encoders")
+ENCODER_CACHE_MAX_BYTES = int(os.getenv("ENCODER_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+ENCODER_CACHE_ENABLED = os.getenv("ENCODER_CACHE_ENABLED", "1") == "1"
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+LATENT_SUFFIX = "_flux.npz"
+TEXT_ENCODER_SUFFIX = "_flux_te.npz"
+
+
+def _digest(*parts):
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def encoder_identity(paths):
+    """Model identities the cached outputs depend on, from the provisioned paths"""
+    return {
+        "vae": artifact_fingerprint(paths["vae"]),
+        "text": _digest(artifact_fingerprint(paths["clip_l"]), artifact_fingerprint(paths["t5xxl"])),
+    }
+
+
+def _dataset_entries(dataset_dir):
+    """(image base path, image sha256, caption or None) per training image"""
+    for name in sorted(os.listdir(dataset_dir)):
+        base, ext = os.path.splitext(name)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            continue
+        base_path = os.path.join(dataset_dir, base)
+        caption = None
+        try:
+            with open(f"{base_path}.txt", encoding="utf-8") as f:
+                caption = f.read().strip()
+        except FileNotFoundError:
+            pass
+        yield base_path, sha256_file(os.path.join(dataset_dir, name)), caption
+
+
+class EncoderCache(FileCache):
+    """FileCache of .npz outputs with a (content, encoder) -> cached files index"""
+
+    def __init__(self, root=ENCODER_CACHE_DIR, max_bytes=ENCODER_CACHE_MAX_BYTES):
+        super().__init__(root, max_bytes)
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self):
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.index_path)
+
+    @staticmethod
+    def _keys(image_sha, caption, identity, resolution):
+        latent_key = _digest("latent", image_sha, str(resolution), identity["vae"])
+        text_key = _digest("text", caption, identity["text"]) if caption is not None else None
+        return latent_key, text_key
+
+    def restore(self, dataset_dir, identity, resolution):
+        """Copy cached .npz files next to their images; returns (hits, misses)"""
+        hits = misses = 0
+        for base_path, image_sha, caption in _dataset_entries(dataset_dir):
+            for key in self._keys(image_sha, caption, identity, resolution):
+                if key is None:
+                    continue
+                with self._lock:
+                    files = self._index.get(key)
+                # Every file recorded for the key must still be cached
+                if files and all(self.get(sha) for sha in files.values()):
+                    for suffix, sha in files.items():
+                        self.copy_into(sha, f"{base_path}{suffix}")
+                    hits += 1
+                else:
+                    misses += 1
+        return hits, misses
+
+    def store(self, dataset_dir, identity, resolution):
+        """Add the .npz files Kohya wrote for each image; returns files stored"""
+        stored = 0
+        updates = {}
+        for base_path, image_sha, caption in _dataset_entries(dataset_dir):
+            latent_key, text_key = self._keys(image_sha, caption, identity, resolution)
+            prefix = os.path.basename(base_path)
+            latents = {}
+            for name in os.listdir(os.path.dirname(base_path)):
+                # `<base>_<W>x<H>_flux.npz`, one per bucket resolution
+                if name.startswith(f"{prefix}_") and name.endswith(LATENT_SUFFIX) \
+                        and not name.endswith(TEXT_ENCODER_SUFFIX):
+                    suffix = name[len(prefix):]
+                    latents[suffix] = self.put(f"{base_path}{suffix}", copy=True)
+            if latents:
+                updates[latent_key] = latents
+                stored += len(latents)
+            te_path = f"{base_path}{TEXT_ENCODER_SUFFIX}"
+            if text_key and os.path.exists(te_path):
+                updates[text_key] = {TEXT_ENCODER_SUFFIX: self.put(te_path, copy=True)}
+                stored += 1
+        if updates:
+            with self._lock:
+                self._index.update(updates)
+                self._save_index()
+        return stored
+
+    def evict(self, max_bytes=None):
+        reclaimed = super().evict(max_bytes)
+        if reclaimed:
+            with self._lock:
+                self._index = {
+                    k: files for k, files in self._index.items()
+                    if all(os.path.exists(self.object_path(sha)) for sha in files.values())
+                }
+                self._save_index()
+        return reclaimed
+
+
+_encoder_cache = None
+_encoder_cache_lock = threading.Lock()
+
+
+def get_encoder_cache():
+    """Process-wide EncoderCache, or None when ENCODER_CACHE_ENABLED=0"""
+    global _encoder_cache
+    if not ENCODER_CACHE_ENABLED:
+        return None
+    if _encoder_cache is None:
+        with _encoder_cache_lock:
+            if _encoder_cache is None:
+                _encoder_cache = EncoderCache()
+    return _encoder_cache
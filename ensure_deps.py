@@ -1,69 +1,127 @@
 #!/usr/bin/env python3
 """
-Runtime Dependency Installer
-Installs any missing packages when the handler starts
+Runtime Dependency Checker
+Verifies the packages the handler needs from installed metadata and module
+specs, without importing them, and reports how long the check took.
+
+    python ensure_deps.py            # runtime check (what the handler runs)
+    python ensure_deps.py --build    # image build: exit non-zero if anything is missing
+
+Missing packages are only pip-installed at runtime when ALLOW_RUNTIME_PIP=1;
+the image build is where they belong.
 """
 
+import argparse
+import importlib.metadata
+import importlib.util
+import os
 import subprocess
 import sys
+import time
+
+ALLOW_RUNTIME_PIP = os.getenv("ALLOW_RUNTIME_PIP", "0") == "1"
+
+# (distribution name, import name, needed by)
+# "handler": imported by the serving process itself
+# "trainer": only used inside the Kohya training subprocess / warm trainer
+# "captioner": only needed with CAPTIONER=florence2
+# "compaction": only needed when LoRA compaction (lora_compact.py) is enabled
+DEPENDENCY_MANIFEST = [
+    ('runpod', 'runpod', 'handler'),
+    ('boto3', 'boto3', 'handler'),
+    ('huggingface-hub', 'huggingface_hub', 'handler'),
+    ('Pillow', 'PIL', 'handler'),
+    ('toml', 'toml', 'handler'),
+    ('torch', 'torch', 'trainer'),
+    ('transformers', 'transformers', 'trainer'),
+    ('diffusers', 'diffusers', 'trainer'),
+    ('accelerate', 'accelerate', 'trainer'),
+    ('safetensors', 'safetensors', 'trainer'),
+    ('datasets', 'datasets', 'trainer'),
+    ('peft', 'peft', 'trainer'),
+    ('bitsandbytes', 'bitsandbytes', 'trainer'),
+    ('tqdm', 'tqdm', 'trainer'),
+    ('omegaconf', 'omegaconf', 'trainer'),
+    ('opencv-python', 'cv2', 'trainer'),
+    ('scipy', 'scipy', 'trainer'),
+    ('einops', 'einops', 'trainer'),
+    ('tensorboard', 'tensorboard', 'trainer'),
+    ('timm', 'timm', 'captioner'),
+    ('numpy', 'numpy', 'compaction'),
+]
+
 
-def install_if_missing(package_name, import_name=None):
-    """Install package if not already available"""
-    if import_name is None:
-        import_name = package_name
-    
+def check_package(package_name, import_name):
+    """(available, version) using find_spec and package metadata - no import"""
     try:
-        __import__(import_name)
-        print(f"✅ {package_name} already available")
+        spec = importlib.util.find_spec(import_name)
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None:
+        return False, None
+    try:
+        version = importlib.metadata.version(package_name)
+    except importlib.metadata.PackageNotFoundError:
+        version = "unknown"
+    return True, version
+
+
+def check_manifest(manifest=DEPENDENCY_MANIFEST):
+    """Check every manifest entry; returns (missing entries, timing report)"""
+    missing = []
+    report = []
+    for package, import_name, scope in manifest:
+        started = time.perf_counter()
+        available, version = check_package(package, import_name)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        report.append({"package": package, "scope": scope, "available": available,
+                       "version": version, "ms": round(elapsed_ms, 2)})
+        if not available:
+            missing.append((package, import_name, scope))
+    return missing, report
+
+
+def install_packages(packages):
+    """pip install the given distributions (runtime fallback, opt-in only)"""
+    print(f"📦 Installing {', '.join(packages)}...")
+    try:
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install', *packages, '--quiet'])
+        importlib.invalidate_caches()
         return True
-    except ImportError:
-        print(f"📦 Installing {package_name}...")
-        try:
-            subprocess.check_call([sys.executable, '-m', 'pip', 'install', package_name, '--quiet'])
-            print(f"✅ {package_name} installed successfully")
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Failed to install {package_name}: {e}")
-            return False
-
-def ensure_runtime_deps():
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Failed to install packages: {e}")
+        return False
+
+
+def ensure_runtime_deps(build=False, verbose=False):
     """Ensure all runtime dependencies are available"""
-    print("🔧 Checking runtime dependencies...")
-    
-    # Critical packages the handler needs
-    deps = [
-        ('runpod', 'runpod'),
-        ('torch', 'torch'),
-        ('transformers', 'transformers'),
-        ('diffusers', 'diffusers'),
-        ('accelerate', 'accelerate'),
-        ('safetensors', 'safetensors'),
-        ('huggingface-hub', 'huggingface_hub'),
-        ('boto3', 'boto3'),
-        ('Pillow', 'PIL'),
-        ('requests', 'requests'),
-        ('datasets', 'datasets'),
-        ('peft', 'peft'),
-        ('bitsandbytes', 'bitsandbytes'),
-        ('tqdm', 'tqdm'),
-        ('omegaconf', 'omegaconf'),
-        ('opencv-python', 'cv2'),
-        ('scipy', 'scipy'),
-        ('einops', 'einops'),
-        ('tensorboard', 'tensorboard'),
-    ]
-    
-    all_good = True
-    for package, import_name in deps:
-        if not install_if_missing(package, import_name):
-            all_good = False
-    
-    if all_good:
-        print("🎉 All runtime dependencies are ready!")
+    started = time.perf_counter()
+    missing, report = check_manifest()
+
+    if verbose:
+        for entry in report:
+            mark = "✅" if entry["available"] else "❌"
+            print(f"{mark} {entry['package']} {entry['version'] or ''} "
+                  f"[{entry['scope']}] {entry['ms']:.2f}ms")
+
+    if missing and not build and ALLOW_RUNTIME_PIP:
+        if install_packages([package for package, _, _ in missing]):
+            missing, report = check_manifest()
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if missing:
+        names = ", ".join(f"{package} ({scope})" for package, _, scope in missing)
+        print(f"⚠️  Missing dependencies: {names} - checked in {elapsed_ms:.1f}ms")
     else:
-        print("⚠️  Some dependencies failed to install")
-    
-    return all_good
+        print(f"🎉 All {len(report)} runtime dependencies present - checked in {elapsed_ms:.1f}ms")
+    return not missing
+
 
 if __name__ == "__main__":
-    ensure_runtime_deps()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Check handler/trainer dependencies without importing them")
+    parser.add_argument("--build", action="store_true",
+                        help="fail (exit 1) on missing packages instead of installing them")
+    parser.add_argument("--verbose", action="store_true", help="print a per-package timing report")
+    cli = parser.parse_args()
+    ok = ensure_runtime_deps(build=cli.build, verbose=cli.verbose or cli.build)
+    sys.exit(0 if ok or not cli.build else 1)
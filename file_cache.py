@@ -0,0 +1,200 @@
+"""
+Content-Addressed File Cache
+On-disk store shared across jobs on the same worker, evicted LRU by byte
+budget and hard-linked into job directories instead of copied
+"""
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import threading
+from urllib.parse import urlsplit
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "/tmp/fluxgym_cache/images")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "1") == "1"
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    """Hex sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dest):
+    """Hard-link src to dest, falling back to a copy across filesystems"""
+    tmp = f"{dest}.link"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+    return dest
+
+
+class FileCache:
+    """Objects stored as <root>/objects/<key[:2]>/<key>, LRU by mtime"""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def object_path(self, key):
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def get(self, key):
+        """Path of a cached object (marking it recently used) or None"""
+        path = self.object_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, src, key=None, copy=False):
+        """Add src to the store (hard-linked when possible, unless copy) and return its key"""
+        key = key or sha256_file(src)
+        path = self.object_path(key)
+        if self.get(key) is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if copy:
+                tmp = f"{path}.copy"
+                shutil.copyfile(src, tmp)
+                os.replace(tmp, path)
+            else:
+                link_or_copy(src, path)
+        return key
+
+    def link_into(self, key, dest):
+        """Materialize a cached object at dest; returns dest or None on miss"""
+        path = self.get(key)
+        if path is None:
+            return None
+        return link_or_copy(path, dest)
+
+    def copy_into(self, key, dest):
+        """Like link_into, but a private copy for consumers that may rewrite dest in place"""
+        path = self.get(key)
+        if path is None:
+            return None
+        tmp = f"{dest}.copy"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, dest)
+        return dest
+
+    def evict(self, max_bytes=None):
+        """Drop least recently used objects until the store fits max_bytes"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = []
+        total = 0
+        for dirpath, _, files in os.walk(self.objects_dir):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        reclaimed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            reclaimed += size
+        if reclaimed:
+            print(f"Cache {self.root}: evicted {reclaimed / 1024 ** 2:.1f} MB")
+        return reclaimed
+
+
+class ImageCache(FileCache):
+    """Image store keyed by content sha256, with a URL -> (sha256, ETag) index"""
+
+    def __init__(self, root=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        super().__init__(root, max_bytes)
+        self.index_path = os.path.join(root, "urls.json")
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self):
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.index_path)
+
+    @staticmethod
+    def url_key(url):
+        # Presigned URLs change their query on every request; the ETag check
+        # on revalidation is what guarantees the object is still the same
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+    def lookup(self, url):
+        """Index entry for url if it has an ETag and its object is still cached"""
+        with self._lock:
+            entry = self._index.get(self.url_key(url))
+        if entry and entry.get("etag") and self.get(entry["sha256"]):
+            return entry
+        return None
+
+    def store(self, url, path, etag=None):
+        """Record a freshly downloaded file under its content hash"""
+        sha = self.put(path)
+        with self._lock:
+            self._index[self.url_key(url)] = {
+                "sha256": sha,
+                "etag": etag,
+                "ext": os.path.splitext(path)[1],
+            }
+            self._save_index()
+        return sha
+
+    def evict(self, max_bytes=None):
+        reclaimed = super().evict(max_bytes)
+        if reclaimed:
+            with self._lock:
+                self._index = {
+                    k: v for k, v in self._index.items()
+                    if os.path.exists(self.object_path(v["sha256"]))
+                }
+                self._save_index()
+        return reclaimed
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Process-wide ImageCache, or None when IMAGE_CACHE_ENABLED=0"""
+    global _image_cache
+    if not IMAGE_CACHE_ENABLED:
+        return None
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                _image_cache = ImageCache()
+    return _image_cache
@@ -0,0 +1,148 @@
+"""
+Cross-Process File Lock
+Lock files created with O_EXCL so they work on shared network volumes, kept
+alive by a heartbeat and broken when the owner stops heartbeating or its
+process is gone
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+LOCK_STALE_SECONDS = float(os.getenv("LOCK_STALE_SECONDS", "60"))
+LOCK_HEARTBEAT_SECONDS = float(os.getenv("LOCK_HEARTBEAT_SECONDS", "10"))
+LOCK_POLL_SECONDS = 2.0
+
+
+class LockTimeout(Exception):
+    """Raised when a lock cannot be acquired within the requested timeout"""
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class FileLock:
+    """Exclusive lock at `path`, usable as a context manager"""
+
+    def __init__(self, path, stale_after=LOCK_STALE_SECONDS, heartbeat=LOCK_HEARTBEAT_SECONDS,
+                 poll=LOCK_POLL_SECONDS, timeout=None):
+        self.path = path
+        self.stale_after = stale_after
+        self.heartbeat = heartbeat
+        self.poll = poll
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _try_create(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump({"host": socket.gethostname(), "pid": os.getpid(),
+                       "token": self.token, "created": time.time()}, f)
+        return True
+
+    def _snapshot(self, path):
+        """(inode, mtime, raw record) identifying one lock file, or None if absent"""
+        try:
+            st = os.stat(path)
+            with open(path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, raw
+
+    def _stale_snapshot(self):
+        """Snapshot of the current lock if its holder stopped heartbeating or is dead, else None"""
+        snapshot = self._snapshot(self.path)
+        if snapshot is None:
+            return None
+        age = time.time() - snapshot[1] / 1e9
+        try:
+            owner = json.loads(snapshot[2])
+        except ValueError:
+            # Half-written owner record: only stale once it stops changing
+            return snapshot if age > self.stale_after else None
+        if owner.get("host") == socket.gethostname() and not _pid_alive(owner.get("pid", -1)):
+            return snapshot
+        return snapshot if age > self.stale_after else None
+
+    def _break_stale(self, stale):
+        """Move the lock aside; keep it broken only if it is the stale record that was read
+
+        Two waiters can judge the same record stale. The slower one's rename
+        may then grab the lock the faster one has just taken, which shows up
+        as a different inode, mtime or record, and is put back.
+        """
+        aside = f"{self.path}.stale.{self.token}"
+        try:
+            os.rename(self.path, aside)
+        except FileNotFoundError:
+            return
+        if self._snapshot(aside) == stale:
+            print(f"Broke stale lock {self.path}")
+        else:
+            try:
+                os.link(aside, self.path)
+            except FileExistsError:
+                pass
+        os.remove(aside)
+
+    def _beat(self):
+        while not self._stop.wait(self.heartbeat):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def acquire(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        announced = False
+        while not self._try_create():
+            stale = self._stale_snapshot()
+            if stale is not None:
+                self._break_stale(stale)
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                raise LockTimeout(f"Timed out waiting for {self.path}")
+            if not announced:
+                print(f"Waiting for lock {self.path} held by another worker...")
+                announced = True
+            time.sleep(self.poll)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+        self._thread.start()
+        return self
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            with open(self.path) as f:
+                owned = json.load(f).get("token") == self.token
+        except (FileNotFoundError, ValueError):
+            return
+        if owned:
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
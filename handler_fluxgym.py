@@ -2,44 +2,70 @@
 SIMPLE FluxGym Handler - Just Works
 Input: images + trigger_word + character_name  
 Output: trained FLUX LoRA
+
+Heavy dependencies (runpod, boto3, huggingface_hub, PIL) are imported lazily
+on first use. Run with --profile-startup to print per-phase startup timings.
 """
 
+from startup_profile import STARTUP
+
 # FIRST: Ensure all dependencies are installed
-try:
-    from ensure_deps import ensure_runtime_deps
-    ensure_runtime_deps()
-except ImportError:
-    print("⚠️  Dependency checker not found, continuing...")
+with STARTUP.phase("deps_check"):
+    try:
+        from ensure_deps import ensure_runtime_deps
+        ensure_runtime_deps()
+    except ImportError:
+        print("⚠️  Dependency checker not found, continuing...")
 
-import runpod
-import os
-import json
-import subprocess
-import sys
-import uuid
-from huggingface_hub import hf_hub_download
-import boto3
-from botocore.config import Config
+with STARTUP.phase("imports"):
+    import os
+    import json
+    import sys
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from contextlib import contextmanager, nullcontext
+    from captioning import (CAPTIONER, CAPTIONERS, CaptioningError, caption_images,
+                            get_caption_cache, get_captioner)
+    from dataset_plan import DatasetPlanError, build_dataset_config, resolve_resolution, write_dataset_config
+    from dataset_plan import summarize as summarize_dataset
+    from encoder_cache import encoder_identity, get_encoder_cache
+    from file_cache import get_image_cache, sha256_file
+    from image_downloader import ImageDownloadError, iter_downloads
+    from image_preprocess import ImageValidationError, preprocess_images
+    from kohya_command import build_training_args, launch_command
+    from job_metrics import JobMetrics, metered_downloads
+    from job_metrics import emit as emit_metrics
+    from launch_profile import describe as describe_profile, get_launch_profile
+    from lora_compact import CompactionError, compact_outputs, compaction_options, is_noop
+    from model_prewarm import MODEL_PREWARM, PREWARM, PREWARM_REFUSE
+    from model_provisioner import is_complete, provision_models
+    from model_registry import get_artifacts, sd_scripts_dir
+    from pipeline import PIPELINE_JOBS, concurrency_modifier, get_training_slots, make_async_handler
+    from r2_storage import UPLOAD_MODES, OutputUploader, all_uploaded, find_outputs
+    from result_index import lookup as lookup_result
+    from result_index import record as record_result
+    from result_index import spec_fingerprint
+    from resume_store import RESUME_SAVE_EVERY_STEPS, ResumableRun, get_resume_store
+    from trainer_worker import (TRAINER_SOCKET, WARM_TRAINER, is_healthy, ping, start_worker,
+                                submit_training, wait_until_ready)
+    from training_progress import ProgressTracker, runpod_reporter, stream_process
+    from training_schedule import DEFAULT_STEPS, ScheduleError, estimate_seconds, plan_schedule
+    from workspace import (WorkspaceError, estimate_job_bytes, job_dir, prepare_workspace,
+                           release_workspace)
 
-# CRITICAL FluxGym environment configuration - THESE WERE MISSING!
+# CRITICAL FluxGym environment configuration (read by huggingface_hub at import,
+# so it must be set before the lazy import in the provisioner)
 os.environ["HF_HUB_ENABLE_HF_TRANSFER"] = "1"  # Essential for HuggingFace transfers
 os.environ['GRADIO_ANALYTICS_ENABLED'] = '0'   # Disable Gradio analytics
-
-# Add FluxGym and Kohya to Python path
-sys.path.insert(0, '/workspace/fluxgym')
-sys.path.insert(0, '/workspace/fluxgym/sd-scripts')
-sys.path.append('/workspace/fluxgym')
-sys.path.append('/workspace/fluxgym/sd-scripts')
-
-# Set essential environment variables for training
-os.environ['PYTHONPATH'] = '/workspace/fluxgym/sd-scripts'
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 os.environ['LOG_LEVEL'] = 'DEBUG'
 
-# Set critical environment variables
-os.environ["HF_HUB_ENABLE_HF_TRANSFER"] = "1"
-os.environ["PYTHONIOENCODING"] = "utf-8"
-os.environ["LOG_LEVEL"] = "DEBUG"
+# Multi-character batches ("characters": [...] input)
+BATCH_MAX_CHARACTERS = int(os.getenv("BATCH_MAX_CHARACTERS", "8"))
+BATCH_TRAINER_START_TIMEOUT = float(os.getenv("BATCH_TRAINER_START_TIMEOUT", "300"))
+
+# Modules that are only imported on first use; --profile-startup times them
+LAZY_IMPORTS = ["runpod", "boto3", "huggingface_hub", "PIL.Image"]
 
 def download_flux_model():
     """Download FLUX.1-dev model and all required text encoders"""
@@ -50,241 +76,491 @@ def download_flux_model():
     if not hf_token:
         print("Warning: HUGGINGFACE_TOKEN not found. FLUX.1-dev requires a token.")
     
-    # Create model directories
-    os.makedirs("/workspace/models/unet", exist_ok=True)
-    os.makedirs("/workspace/models/clip", exist_ok=True) 
-    os.makedirs("/workspace/models/vae", exist_ok=True)
-    
-    # 1. Download FLUX.1-dev main model (specific file, not full repo)
-    flux_model_path = "/workspace/models/unet/flux1-dev.sft"
-    if not os.path.exists(flux_model_path):
-        print("Downloading FLUX.1-dev model (flux1-dev.sft)...")
-        from huggingface_hub import hf_hub_download
-        hf_hub_download(
-            repo_id="black-forest-labs/FLUX.1-dev",
-            filename="flux1-dev.sft",
-            local_dir="/workspace/models/unet",
-            local_dir_use_symlinks=False,
-            token=hf_token
-        )
-        print("FLUX.1-dev model download completed!")
-    
-    # 2. Download CLIP text encoder
-    clip_path = "/workspace/models/clip/clip_l.safetensors"
-    if not os.path.exists(clip_path):
-        print("Downloading CLIP text encoder...")
-        hf_hub_download(
-            repo_id="comfyanonymous/flux_text_encoders",
-            filename="clip_l.safetensors",
-            local_dir="/workspace/models/clip",
-            local_dir_use_symlinks=False
-        )
-        print("CLIP text encoder download completed!")
-    
-    # 3. Download T5XXL text encoder (large!)
-    t5xxl_path = "/workspace/models/clip/t5xxl_fp16.safetensors"
-    if not os.path.exists(t5xxl_path):
-        print("Downloading T5XXL text encoder...")
-        hf_hub_download(
-            repo_id="comfyanonymous/flux_text_encoders", 
-            filename="t5xxl_fp16.safetensors",
-            local_dir="/workspace/models/clip",
-            local_dir_use_symlinks=False
-        )
-        print("T5XXL text encoder download completed!")
-    
-    # 4. Download VAE (AutoEncoder)
-    vae_path = "/workspace/models/vae/ae.sft"
-    if not os.path.exists(vae_path):
-        print("Downloading VAE...")
-        hf_hub_download(
-            repo_id="cocktailpeanut/xulf-dev",
-            filename="ae.sft", 
-            local_dir="/workspace/models/vae",
-            local_dir_use_symlinks=False
-        )
-        print("VAE download completed!")
+    # Fetch all four artifacts concurrently, verified and atomically placed
+    # at the paths resolved by the model registry
+    paths = provision_models(token=hf_token)
     
     print("All FLUX models and text encoders ready!")
-    return "/app/models/unet/flux1-dev.sft"
+    return paths
 
-def upload_to_r2(file_path, object_name):
-    """Upload file to Cloudflare R2 storage"""
+def run_training(training_args, on_line, trainer_socket=None, profile=None, gpu=None):
+    """Train on a warm trainer worker if one is up, else via accelerate launch"""
+    if trainer_socket is None and WARM_TRAINER:
+        trainer_socket = TRAINER_SOCKET
+    # The warm trainer lives on the first GPU; other slots launch their own run
+    if gpu is not None and gpu != get_training_slots().primary:
+        trainer_socket = None
+    if trainer_socket and is_healthy(trainer_socket):
+        print("Training on warm trainer worker...")
+        try:
+            returncode, _ = submit_training(training_args, on_line=on_line, socket_path=trainer_socket)
+            return returncode
+        except (OSError, ConnectionError, ValueError) as e:
+            print(f"Warm trainer failed ({e}), falling back to accelerate launch")
+    
+    # Set environment for training
+    env = os.environ.copy()
+    env['PYTHONIOENCODING'] = 'utf-8'
+    env['LOG_LEVEL'] = 'DEBUG'
+    env['PYTHONPATH'] = sd_scripts_dir()
+    if gpu is not None:
+        env['CUDA_VISIBLE_DEVICES'] = gpu
+    
+    # Stream output line by line instead of buffering the whole log
+    return stream_process(launch_command(training_args, profile), on_line, env=env)
+
+def parse_training_spec(input_data):
+    """Validate one character's inputs and plan its schedule; returns (spec, error)"""
+    spec = {
+        "trigger_word": input_data.get("trigger_word", "person"),
+        "character_name": input_data.get("character_name", "character"),
+        "images": input_data.get("images", []),
+        "steps": input_data.get("steps", DEFAULT_STEPS),
+        "batch_size": input_data.get("batch_size", 1),
+        # "all" (default), "final" (only the last LoRA) or "stream" (checkpoints
+        # are uploaded while training continues)
+        "upload_mode": input_data.get("upload_mode", os.getenv("R2_UPLOAD_MODE", "all")),
+        "captioner": input_data.get("captioner", CAPTIONER),
+        # Retrain even if an identical spec has already been trained
+        "force_retrain": bool(input_data.get("force_retrain", False)),
+    }
+    
     try:
-        # Get R2 credentials from environment (matching web app variable names)
-        access_key = os.getenv('CLOUDFLARE_R2_ACCESS_KEY_ID')
-        secret_key = os.getenv('CLOUDFLARE_R2_SECRET_ACCESS_KEY')
-        account_id = os.getenv('CLOUDFLARE_ACCOUNT_ID')
-        bucket_name = os.getenv('R2_BUCKET_NAME')
-        public_url_base = os.getenv('R2_BUCKET_PUBLIC_URL')
-        
-        if not all([access_key, secret_key, account_id, bucket_name]):
-            print("Missing R2 credentials, returning local path")
-            return file_path
-        
-        # Construct R2 endpoint URL
-        endpoint_url = f"https://{account_id}.r2.cloudflarestorage.com"
-        
-        # Initialize R2 client
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=endpoint_url,
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            config=Config(signature_version='s3v4')
-        )
-        
-        # Upload file
-        s3_client.upload_file(file_path, bucket_name, object_name)
-        
-        # Return public URL using the public URL base
-        if public_url_base:
-            public_url = f"{public_url_base}/{object_name}"
-        else:
-            public_url = f"https://pub-{account_id}.r2.dev/{object_name}"
-        
-        print(f"Uploaded to R2: {public_url}")
-        return public_url
-        
-    except Exception as e:
-        print(f"R2 upload failed: {e}")
-        return file_path
+        # Optional post-training compaction: {"select", "dtype", "rank", "quality"}
+        spec["compact"] = compaction_options(input_data.get("compact"))
+    except CompactionError as e:
+        return None, {"error": str(e)}
+    
+    try:
+        # "preview": true trains at PREVIEW_RESOLUTION (512) for a fast draft
+        spec["resolution"] = resolve_resolution(input_data.get("resolution"),
+                                                preview=bool(input_data.get("preview", False)))
+    except DatasetPlanError as e:
+        return None, {"error": str(e)}
+    
+    if not spec["images"]:
+        return None, {"error": "No images provided"}
+    
+    if spec["upload_mode"] not in UPLOAD_MODES:
+        return None, {"error": f"upload_mode must be one of {', '.join(UPLOAD_MODES)}"}
+    
+    if spec["captioner"] not in ("none", *CAPTIONERS):
+        return None, {"error": f"captioner must be one of none, {', '.join(CAPTIONERS)}"}
+    
+    # Plan the exact optimizer-step schedule (and its expected duration) up front
+    try:
+        spec["schedule"] = plan_schedule(spec["steps"], len(spec["images"]), spec["batch_size"])
+    except ScheduleError as e:
+        return None, {"error": f"Invalid training schedule: {str(e)}"}
+    spec["estimated_seconds"] = estimate_seconds(spec["schedule"], len(spec["images"]),
+                                                 resolution=spec["resolution"],
+                                                 profile=get_launch_profile()["name"])
+    print(f"Training schedule for {spec['character_name']}: {spec['schedule']} "
+          f"(estimated {spec['estimated_seconds']:.0f}s)")
+    return spec, None
 
-def run_flux_training(job):
-    """Simple FLUX training - no complications"""
+def prepare_dataset(spec, train_dir, metrics):
+    """Download and preprocess images, then write captions and dataset.toml"""
+    os.makedirs(train_dir, exist_ok=True)
+    trigger_word, character_name = spec["trigger_word"], spec["character_name"]
     
-    input_data = job["input"]
+    # Download images (parallel, keep-alive, retried, served from the worker cache)
+    # and validate/rotate/downsize each one in the process pool as it lands
+    ingest_started = time.perf_counter()
+    prepared = preprocess_images(
+        metered_downloads(iter_downloads(spec["images"], train_dir, cache=get_image_cache()), metrics),
+        resolution=spec["resolution"],
+    )
+    # Preprocessing overlaps the downloads; only the tail after the last
+    # image arrived is attributed to it
+    metrics.record("preprocess", time.perf_counter() - ingest_started - metrics.phases.get("download", 0.0))
+    
+    # An identical spec already trained and uploaded skips captioning and training
+    spec["fingerprint"] = spec_fingerprint(spec, [sha256_file(image["path"]) for image in prepared],
+                                           get_launch_profile()["name"])
+    spec["memoized"] = None if spec["force_retrain"] else lookup_result(spec["fingerprint"])
+    if spec["memoized"]:
+        return prepared
+    
+    # Caption the images (batched, cached by image hash), or fall back to the
+    # constant "<trigger_word> <character_name>" caption
+    paths = [image["path"] for image in prepared]
+    captioner = get_captioner(spec["captioner"])
+    if captioner is None:
+        captions = {path: f"{trigger_word} {character_name}" for path in paths}
+    elif captioner.uses_gpu:
+        # GPU captioning takes a training slot so it never shares a GPU with
+        # a pipelined job that is training
+        wait_started = time.perf_counter()
+        slots = get_training_slots()
+        with slots.slot() as gpu:
+            metrics.record("gpu_wait", time.perf_counter() - wait_started)
+            with metrics.phase("captioning"):
+                captions = caption_images(paths, captioner, trigger_word, cache=get_caption_cache(),
+                                          device=slots.device(gpu))
+    else:
+        with metrics.phase("captioning"):
+            captions = caption_images(paths, captioner, trigger_word, cache=get_caption_cache())
+    for path, caption in captions.items():
+        with open(f"{os.path.splitext(path)[0]}.txt", "w", encoding="utf-8") as f:
+            f.write(caption)
+    
+    # Create dataset.toml file (FluxGym layout, with aspect-ratio buckets
+    # planned from the preprocessed image sizes)
+    dataset_config = build_dataset_config(
+        image_dir=train_dir,
+        sizes=[(image["width"], image["height"]) for image in prepared],
+        resolution=spec["resolution"],
+        num_repeats=spec["schedule"]["num_repeats"],
+        class_tokens=f"{trigger_word} {character_name}",
+        batch_size=spec["schedule"]["batch_size"],
+    )
+    write_dataset_config(dataset_config, f"{train_dir}/dataset.toml")
+    spec["dataset"] = summarize_dataset(dataset_config)
+    return prepared
+
+def train_and_publish(spec, train_dir, model_paths, metrics, report=None, trainer_socket=None):
+    """Train one prepared dataset and upload its LoRA; returns the result dict"""
+    trigger_word, character_name = spec["trigger_word"], spec["character_name"]
     
-    # Get parameters
-    trigger_word = input_data.get("trigger_word", "person")
-    character_name = input_data.get("character_name", "character")
-    images = input_data.get("images", [])
-    steps = input_data.get("steps", 1000)
+    # Run Kohya training with all required text encoders, using the flag set
+    # tuned for this worker's GPU memory and CPU count
+    profile = get_launch_profile()
     
-    if not images:
-        return {"error": "No images provided"}
+    # Resume from durable training state left by a preempted run of this spec
+    schedule = spec["schedule"]
+    resume_store = get_resume_store()
+    resumable = resume_from = None
+    resumed_step = 0
+    if resume_store is not None:
+        if RESUME_SAVE_EVERY_STEPS and not 0 < schedule["save_every_n_steps"] <= RESUME_SAVE_EVERY_STEPS:
+            schedule = {**schedule, "save_every_n_steps": RESUME_SAVE_EVERY_STEPS}
+        resumable = ResumableRun(resume_store, spec["fingerprint"], f"{train_dir}/output")
+        with metrics.phase("resume_restore"):
+            resume_from, resumed_step = resumable.restore()
     
+    training_args = build_training_args(
+        dataset_config=f"{train_dir}/dataset.toml",
+        output_dir=f"{train_dir}/output",
+        output_name=character_name,
+        schedule=schedule,
+        paths=model_paths,
+        profile=profile,
+        save_state=resumable is not None,
+        resume=resume_from,
+    )
+    tracker = ProgressTracker(report=report)
+    
+    # Reuse latents / text-encoder outputs from earlier runs on the same data
+    encoder_cache = get_encoder_cache()
+    if encoder_cache is not None:
+        identity = encoder_identity(model_paths)
+        with metrics.phase("encoder_cache"):
+            hits, misses = encoder_cache.restore(train_dir, identity, spec["resolution"])
+        metrics.set("encoder_cache_hits", hits)
+        print(f"Encoder cache: {hits} hits, {misses} misses")
+    
+    uploader = OutputUploader(character_name, trigger_word)
+    compact = not is_noop(spec["compact"])
+    # Compacted outputs only exist after training, so nothing is streamed early
+    if spec["upload_mode"] == "stream" and not compact:
+        uploader.watch(f"{train_dir}/output")
+    if resumable is not None:
+        resumable.watch()
     try:
-        # Download FLUX model if needed
-        model_path = download_flux_model()
-        
-        # Create training directory
-        train_dir = f"/tmp/training_{job['id']}"
-        os.makedirs(train_dir, exist_ok=True)
-        
-        # Download images
-        for i, img_url in enumerate(images):
-            subprocess.run([
-                "wget", "-O", f"{train_dir}/image_{i:03d}.jpg", img_url
-            ], check=True)
+        # One training run per GPU; other jobs keep ingesting/uploading meanwhile
+        wait_started = time.perf_counter()
+        with get_training_slots().slot() as gpu:
+            metrics.record("gpu_wait", time.perf_counter() - wait_started)
+            with metrics.phase("training"):
+                returncode = run_training(training_args, tracker.feed, trainer_socket=trainer_socket,
+                                          profile=profile, gpu=gpu)
+    except BaseException:
+        uploader.close()
+        if resumable is not None:
+            resumable.finish(success=False)
+        raise
+    finally:
+        metrics.set("it_per_sec", tracker.state.get("it_per_sec"))
+        metrics.set("steps", tracker.state.get("step"))
+        # Kohya writes the caches before the first step, so keep them even
+        # when training itself fails
+        if encoder_cache is not None:
+            with metrics.phase("encoder_cache"):
+                encoder_cache.store(train_dir, identity, spec["resolution"])
+                encoder_cache.evict()
+    
+    if returncode == 0:
+        try:
+            outputs = find_outputs(f"{train_dir}/output", output_name=character_name,
+                                   final_only=spec["upload_mode"] == "final" and spec["compact"]["select"] == "all")
+            compaction = None
+            if compact:
+                # Pick the final/best checkpoint, convert dtype / reduce rank, add sidecars
+                with metrics.phase("compaction"):
+                    outputs, compaction = compact_outputs(
+                        outputs, character_name, spec["compact"], losses=tracker.losses,
+                        metadata={"trigger_word": trigger_word, "character_name": character_name,
+                                  "fingerprint": spec["fingerprint"]})
         
-        # Create simple captions
-        for i in range(len(images)):
-            with open(f"{train_dir}/image_{i:03d}.txt", "w") as f:
-                f.write(f"{trigger_word} {character_name}")
+            # Upload the output LoRA file(s) to R2 concurrently
+            with metrics.phase("upload"):
+                output_files, public_urls = uploader.finish(outputs)
+            metrics.add_bytes("upload", sum(os.path.getsize(path) for path in output_files))
+            if resumable is not None:
+                resumable.finish(success=True)
+        except BaseException:
+            # Compaction or upload failed: stop both watchers and keep the
+            # durable state so a retry can resume
+            uploader.close()
+            if resumable is not None:
+                resumable.finish(success=False)
+            raise
         
-        # Create dataset.toml file (FluxGym style)
-        dataset_config = f"""[[datasets]]
-[[datasets.subsets]]
-image_dir = "{train_dir}"
-num_repeats = 10
-class_tokens = "{trigger_word} {character_name}"
+        return {
+            "status": "success",
+            "lora_files": output_files,  # Local paths (removed after upload unless WORKSPACE_CLEANUP=keep)
+            "public_urls": public_urls,  # Public R2 URLs
+            "trigger_word": trigger_word,
+            "character_name": character_name,
+            "training_steps": spec["schedule"]["max_train_steps"],
+            "schedule": spec["schedule"],
+            "dataset": spec["dataset"],
+            "launch_profile": describe_profile(profile),
+            "compaction": compaction,
+            "estimated_seconds": spec["estimated_seconds"],
+            "fingerprint": spec["fingerprint"],
+            "memoized": False,
+            "resumed_from_step": resumed_step
+        }
+    else:
+        uploader.close()
+        if resumable is not None:
+            resumable.finish(success=False)
+        return {
+            "error": "Training failed",
+            "returncode": returncode,
+            "launch_profile": describe_profile(profile),
+            "progress": tracker.state,
+            "log_tail": tracker.log_tail()
+        }
 
-[datasets.subsets.image_preprocessing]
-resolution = 1024
-random_crop = false
-"""
-        
-        with open(f"{train_dir}/dataset.toml", "w") as f:
-            f.write(dataset_config)
-        
-        # Run Kohya training script with accelerate and all required text encoders
-        kohya_cmd = [
-            "accelerate", "launch",
-            "--mixed_precision", "bf16",
-            "--num_cpu_threads_per_process", "1",
-            "/app/sd-scripts/flux_train_network.py",
-            "--pretrained_model_name_or_path", model_path,
-            "--clip_l", "/app/models/clip/clip_l.safetensors",
-            "--t5xxl", "/app/models/clip/t5xxl_fp16.safetensors", 
-            "--ae", "/app/models/vae/ae.sft",
-            "--cache_latents_to_disk",
-            "--save_model_as", "safetensors",
-            "--sdpa", "--persistent_data_loader_workers",
-            "--max_data_loader_n_workers", "2",
-            "--seed", "42",
-            "--gradient_checkpointing",
-            "--mixed_precision", "bf16",
-            "--save_precision", "bf16",
-            "--network_module", "networks.lora_flux",
-            "--network_dim", "32",
-            "--learning_rate", "8e-4",
-            "--cache_text_encoder_outputs",
-            "--cache_text_encoder_outputs_to_disk",
-            "--fp8_base",
-            "--highvram",
-            "--max_train_epochs", "16",
-            "--save_every_n_epochs", "4",
-            "--dataset_config", f"{train_dir}/dataset.toml",
-            "--output_dir", f"{train_dir}/output",
-            "--output_name", character_name,
-            "--timestep_sampling", "shift", 
-            "--discrete_flow_shift", "3.1582",
-            "--model_prediction_type", "raw",
-            "--guidance_scale", "1.0",
-            "--loss_type", "l2",
-            "--optimizer_type", "adamw8bit"
-        ]
-        
-        # Set environment for training
-        env = os.environ.copy()
-        env['PYTHONIOENCODING'] = 'utf-8'
-        env['LOG_LEVEL'] = 'DEBUG'
-        
-        result = subprocess.run(kohya_cmd, capture_output=True, text=True, env=env)
+def run_flux_training(job):
+    """Simple FLUX training - no complications"""
+    spec, error = parse_training_spec(job["input"])
+    if error:
+        return error
+    metrics = JobMetrics()
+    train_dir = job_dir(job['id'])
+    
+    try:
+        # Claim the training directory, reclaiming old jobs/caches if the
+        # estimated footprint does not fit
+        reclaimed = prepare_workspace(train_dir, estimate_workspace_bytes(spec), caches=workspace_caches())
+        metrics.add_bytes("reclaimed", reclaimed)
         
-        result = subprocess.run(kohya_cmd, capture_output=True, text=True)
+        # Create training directory with images, captions and dataset.toml
+        prepare_dataset(spec, train_dir, metrics)
         
-        if result.returncode == 0:
-            # Find the output LoRA file
-            output_files = []
-            public_urls = []
+        if spec["memoized"]:
+            result = memoized_result(spec)
+        else:
+            # Download FLUX model if needed
+            with metrics.phase("provision"):
+                model_paths = download_flux_model()
             
-            for root, dirs, files in os.walk(f"{train_dir}/output"):
-                for file in files:
-                    if file.endswith('.safetensors'):
-                        local_path = os.path.join(root, file)
-                        output_files.append(local_path)
-                        
-                        # Generate unique object name for R2
-                        unique_id = str(uuid.uuid4())[:8]
-                        object_name = f"flux_lora/{character_name}_{trigger_word}_{unique_id}_{file}"
-                        
-                        # Upload to R2 and get public URL
-                        public_url = upload_to_r2(local_path, object_name)
-                        public_urls.append(public_url)
+            result = train_and_publish(spec, train_dir, model_paths, metrics, report=runpod_reporter(job))
+            record_result(spec["fingerprint"], result)
             
-            return {
-                "status": "success",
-                "lora_files": output_files,  # Local paths for debugging
-                "public_urls": public_urls,  # Public R2 URLs
-                "trigger_word": trigger_word,
-                "character_name": character_name,
-                "training_steps": steps
-            }
+    except (ImageDownloadError, ImageValidationError) as e:
+        result = {"error": f"Invalid input images: {str(e)}"}
+    except CaptioningError as e:
+        result = {"error": f"Captioning failed: {str(e)}"}
+    except WorkspaceError as e:
+        result = {"error": str(e)}
+    except Exception as e:
+        result = {"error": f"Exception: {str(e)}"}
+    
+    finish_workspace(train_dir, result, metrics)
+    return result
+
+def memoized_result(spec):
+    """Result for a spec that was already trained, from the result index"""
+    return {
+        "status": "success",
+        **spec["memoized"],
+        "lora_files": [],
+        "estimated_seconds": 0,
+        "fingerprint": spec["fingerprint"],
+        "memoized": True,
+    }
+
+def estimate_workspace_bytes(spec):
+    return estimate_job_bytes(len(spec["images"]), spec["resolution"], spec["schedule"],
+                              network_dim=get_launch_profile()["network_dim"])
+
+def workspace_caches():
+    return [get_image_cache(), get_encoder_cache()]
+
+def finish_workspace(train_dir, result, metrics):
+    """Delete (or archive) the job directory once its outputs are uploaded"""
+    # A failed upload leaves the local file as the only copy of the LoRA
+    published = result.get("status") == "success" and all_uploaded(result.get("public_urls") or [])
+    if result.get("status") == "success" and not published:
+        print(f"Outputs not all uploaded to R2, keeping {train_dir}")
+    reclaimed = 0
+    with metrics.phase("cleanup"):
+        try:
+            reclaimed = release_workspace(train_dir, success=published)
+        except OSError as e:
+            print(f"Workspace cleanup failed for {train_dir}: {e}")
+    metrics.add_bytes("reclaimed", reclaimed)
+    result["metrics"] = metrics.as_dict()
+
+# Popen handle of the WARM_TRAINER process started in __main__, if any
+_resident_trainer = None
+
+def resident_trainer_alive():
+    return _resident_trainer is not None and _resident_trainer.poll() is None
+
+@contextmanager
+def batch_training_session(job_id):
+    """Warm trainer shared by every character in a batch; yields its socket (or None)"""
+    if WARM_TRAINER:
+        # Right after boot the resident trainer is still importing Kohya (and
+        # may not have bound its socket yet); a dead one is not waited for
+        status = ping()
+        loading = status.get("status") == "loading" if status else resident_trainer_alive()
+        if loading:
+            wait_until_ready(TRAINER_SOCKET, BATCH_TRAINER_START_TIMEOUT)
+        if is_healthy():
+            yield TRAINER_SOCKET
+            return
+    
+    # No usable resident trainer: start one for this batch so Kohya is
+    # imported once for every character. The base weights are only cached
+    # when no live resident trainer may already be holding a copy in RAM
+    socket_path = f"/tmp/fluxgym_batch_{job_id}.sock"
+    env = os.environ.copy()
+    env['TRAINER_CACHE_WEIGHTS'] = '0' if resident_trainer_alive() else '1'
+    process = start_worker(socket_path, env=env)
+    try:
+        ready = wait_until_ready(socket_path, BATCH_TRAINER_START_TIMEOUT)
+        if not ready:
+            print("Batch trainer did not come up, training each character via accelerate launch")
+        yield socket_path if ready else None
+    finally:
+        process.terminate()
+        process.wait()
+
+def run_batch_training(job):
+    """Train several characters in one GPU session; returns per-character results"""
+    input_data = job["input"]
+    characters = input_data.get("characters") or []
+    if not isinstance(characters, list) or not characters:
+        return {"error": "characters must be a non-empty list"}
+    if len(characters) > BATCH_MAX_CHARACTERS:
+        return {"error": f"At most {BATCH_MAX_CHARACTERS} characters per batch"}
+    
+    # Top-level inputs (steps, upload_mode, ...) are defaults for every character
+    shared = {key: value for key, value in input_data.items() if key != "characters"}
+    results = [None] * len(characters)
+    specs = {}
+    for i, character in enumerate(characters):
+        if not isinstance(character, dict):
+            results[i] = {"character_name": None, "error": f"characters[{i}] must be an object"}
+            continue
+        spec, error = parse_training_spec({**shared, **character})
+        if error:
+            results[i] = {"character_name": character.get("character_name"), **error}
         else:
-            return {
-                "error": "Training failed",
-                "stdout": result.stdout,
-                "stderr": result.stderr
+            specs[i] = spec
+    if not specs:
+        return {"status": "failed", "results": results}
+    
+    # Batch-level metrics cover provisioning and the whole run; each
+    # character's result carries its own phase breakdown
+    metrics = JobMetrics()
+    character_metrics = {i: JobMetrics() for i in specs}
+    train_dirs = {i: job_dir(job['id'], i) for i in specs}
+    try:
+        for i, spec in specs.items():
+            reclaimed = prepare_workspace(train_dirs[i], estimate_workspace_bytes(spec), caches=workspace_caches())
+            metrics.add_bytes("reclaimed", reclaimed)
+        
+        # Provision models while every character's dataset is prepared in parallel
+        with ThreadPoolExecutor(max_workers=len(specs) + 1) as executor:
+            models_future = executor.submit(download_flux_model)
+            prep_futures = {
+                i: executor.submit(prepare_dataset, spec, train_dirs[i], character_metrics[i])
+                for i, spec in specs.items()
             }
-            
+            with metrics.phase("provision"):
+                model_paths = models_future.result()
+        for i, future in prep_futures.items():
+            # Any preparation failure (bad images, captioning, disk, a broken
+            # preprocess pool) fails only that character
+            error = None
+            try:
+                future.result()
+            except (ImageDownloadError, ImageValidationError) as e:
+                error = f"Invalid input images: {str(e)}"
+            except CaptioningError as e:
+                error = f"Captioning failed: {str(e)}"
+            except Exception as e:
+                error = f"Exception: {str(e)}"
+            if error:
+                results[i] = {"character_name": specs.pop(i)["character_name"], "error": error}
+                finish_workspace(train_dirs[i], results[i], character_metrics[i])
+            else:
+                if specs[i]["memoized"]:
+                    results[i] = memoized_result(specs.pop(i))
+                    finish_workspace(train_dirs[i], results[i], character_metrics[i])
+        
+        # Train sequentially against one loaded base model
+        with (batch_training_session(job['id']) if specs else nullcontext()) as trainer_socket:
+            for n, (i, spec) in enumerate(sorted(specs.items())):
+                report = runpod_reporter(job, extra={
+                    "character_name": spec["character_name"], "character": n + 1, "of": len(specs)})
+                # One character failing (compaction, upload, ...) leaves the rest of the batch running
+                try:
+                    results[i] = train_and_publish(spec, train_dirs[i], model_paths, character_metrics[i],
+                                                   report=report, trainer_socket=trainer_socket)
+                    record_result(spec["fingerprint"], results[i])
+                except Exception as e:
+                    results[i] = {"character_name": spec["character_name"], "error": f"Exception: {str(e)}"}
+                finish_workspace(train_dirs[i], results[i], character_metrics[i])
+                
+    except WorkspaceError as e:
+        return {"error": str(e), "results": results, "metrics": metrics.as_dict()}
     except Exception as e:
-        return {"error": f"Exception: {str(e)}"}
+        return {"error": f"Exception: {str(e)}", "results": results, "metrics": metrics.as_dict()}
+    finally:
+        # Unfinished characters keep their directories for debugging, but
+        # stop counting as active so the budget can reclaim them
+        for path in train_dirs.values():
+            release_workspace(path, success=False)
+    
+    succeeded = sum(1 for result in results if result and result.get("status") == "success")
+    # Exported totals (METRICS_FILE) see every character's phases, not just provisioning
+    for character in character_metrics.values():
+        metrics.merge(character)
+    return {
+        "status": "success" if succeeded == len(results) else "partial" if succeeded else "failed",
+        "results": results,
+        "metrics": metrics.as_dict(),
+    }
+
+_first_job_seen = False
 
 def handler(job):
     """RunPod serverless handler with proper validation"""
-    print(f"Handler called with job: {job}")
+    global _first_job_seen
+    if not _first_job_seen:
+        _first_job_seen = True
+        STARTUP.record("first_job_received", STARTUP.elapsed_ms() / 1000)
+        STARTUP.print_report()
+    print(f"Handler called for job {job.get('id') if job else None}")
     
     # Validate RunPod serverless environment
     if not job or 'input' not in job:
@@ -293,15 +569,58 @@ def handler(job):
     if not job.get('id'):
         return {"error": "Invalid job format - missing job ID"}
     
-    # Log environment info for debugging
-    print(f"RUNPOD_JOB_ID: {job.get('id')}")
-    print(f"Python path: {sys.path}")
-    print(f"HF_HUB_ENABLE_HF_TRANSFER: {os.getenv('HF_HUB_ENABLE_HF_TRANSFER')}")
+    # Hold (or refuse) jobs until the boot-time model pre-warm has finished
+    if MODEL_PREWARM and PREWARM.status != "warm":
+        if PREWARM_REFUSE and not PREWARM.ready.is_set():
+            return {"error": "Worker is still warming up models, please retry", "prewarm": PREWARM.as_dict()}
+        if not PREWARM.wait():
+            print(f"Model pre-warm {PREWARM.status}, provisioning inside the job instead")
     
-    return run_flux_training(job)
+    if "characters" in job["input"]:
+        result = run_batch_training(job)
+    else:
+        result = run_flux_training(job)
+    
+    # Per-phase timings travel in the result; METRICS_FILE also gets a copy
+    if result.get("metrics"):
+        emit_metrics(job['id'], result["metrics"], result.get("status", "error"))
+        print(f"Job {job['id']} metrics: {json.dumps(result['metrics'])}")
+    return result
+
+def check_model_presence():
+    """Names of model artifacts that are missing or incomplete (no downloads)"""
+    return [artifact["name"] for artifact in get_artifacts() if not is_complete(artifact, remote=False)]
+
+def profile_startup(as_json=False):
+    """Time the lazy imports and model presence check, then print the report"""
+    for module_name in LAZY_IMPORTS:
+        STARTUP.time_import(module_name)
+    with STARTUP.phase("model_presence_check"):
+        missing = check_model_presence()
+    if missing:
+        print(f"Models not yet provisioned: {', '.join(missing)}")
+    return STARTUP.print_report(as_json=as_json)
 
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        profile_startup(as_json="--json" in sys.argv)
+        sys.exit(0)
+    
     # This is the crucial RunPod serverless startup
     print("Starting RunPod serverless worker...")
+    with STARTUP.phase("import:runpod"):
+        import runpod
+    if MODEL_PREWARM:
+        # Provision, verify and page-cache the models before the first job
+        PREWARM.start(token=os.getenv('HUGGINGFACE_TOKEN'))
+    if WARM_TRAINER:
+        # Kohya/torch import (and base weights, once loaded) stay resident here
+        _resident_trainer = start_worker()
     print("FluxGym FLUX character training endpoint ready")
-    runpod.serverless.start({"handler": handler})
+    STARTUP.record("ready", STARTUP.elapsed_ms() / 1000)
+    if PIPELINE_JOBS > 1:
+        # Several jobs in flight: ingestion/uploads overlap the current training
+        runpod.serverless.start({"handler": make_async_handler(handler),
+                                 "concurrency_modifier": concurrency_modifier})
+    else:
+        runpod.serverless.start({"handler": handler})
@@ -0,0 +1,240 @@
+"""
+Parallel Image Downloader
+Fetches training images in-process with bounded concurrency, keep-alive
+connections per host, retries with backoff and a per-job deadline
+"""
+
+import http.client
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from urllib.parse import urljoin, urlsplit
+
+# Tunables (overridable from the endpoint environment)
+DEFAULT_CONCURRENCY = int(os.getenv("IMAGE_DOWNLOAD_CONCURRENCY", "8"))
+DEFAULT_RETRIES = int(os.getenv("IMAGE_DOWNLOAD_RETRIES", "3"))
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "30"))
+DEFAULT_JOB_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_JOB_TIMEOUT", "300"))
+BACKOFF_SECONDS = 0.5
+MAX_REDIRECTS = 5
+CHUNK_SIZE = 1 << 16
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/bmp": ".bmp",
+    "image/gif": ".gif",
+}
+KNOWN_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+
+
+class ImageDownloadError(Exception):
+    """Raised when an image cannot be fetched within the retry/timeout budget"""
+
+
+class _RetryableError(Exception):
+    """Transient failure (connection reset, 5xx, 429) worth another attempt"""
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections, one per (thread, scheme, host)"""
+
+    def __init__(self, timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def get(self, scheme, netloc):
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+        key = (scheme, netloc)
+        conn = conns.get(key)
+        if conn is None:
+            conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = conn_cls(netloc, timeout=self.timeout)
+            conns[key] = conn
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    def discard(self, scheme, netloc):
+        conns = getattr(self._local, "conns", {})
+        conn = conns.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+
+
+def _extension_for(url, content_type):
+    """Pick a file extension from the Content-Type, then the URL, then .jpg"""
+    mime = (content_type or "").split(";")[0].strip().lower()
+    if mime in CONTENT_TYPE_EXTENSIONS:
+        return CONTENT_TYPE_EXTENSIONS[mime]
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    if ext in KNOWN_EXTENSIONS:
+        return ".jpg" if ext == ".jpeg" else ext
+    return ".jpg"
+
+
+def _check_stopped(stop, url):
+    if stop is not None and stop.is_set():
+        raise ImageDownloadError(f"Download of {url} cancelled")
+
+
+def _fetch_once(pool, url, dest_base, deadline, headers=None, stop=None):
+    """Single GET attempt (following redirects); returns (path, response), path None on 304"""
+    for _ in range(MAX_REDIRECTS + 1):
+        _check_stopped(stop, url)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ImageDownloadError(f"Job download deadline exceeded fetching {url}")
+
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ImageDownloadError(f"Unsupported URL scheme: {url}")
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        conn = pool.get(parts.scheme, parts.netloc)
+        conn.timeout = min(pool.timeout, remaining)
+        if conn.sock is not None:
+            conn.sock.settimeout(conn.timeout)
+        try:
+            conn.request("GET", path, headers={
+                "User-Agent": "fluxgym-runpod/1.0",
+                "Connection": "keep-alive",
+                **(headers or {}),
+            })
+            response = conn.getresponse()
+            status = response.status
+
+            if status in (301, 302, 303, 307, 308):
+                response.read()
+                location = response.getheader("Location")
+                if not location:
+                    raise ImageDownloadError(f"Redirect without Location from {url}")
+                url = urljoin(url, location)
+                continue
+
+            if status == 304:
+                # Conditional request hit: the cached copy is still current
+                response.read()
+                return None, response
+
+            if status == 429 or status >= 500:
+                response.read()
+                raise _RetryableError(f"HTTP {status} from {url}")
+            if status != 200:
+                response.read()
+                raise ImageDownloadError(f"HTTP {status} from {url}")
+
+            dest = dest_base + _extension_for(url, response.getheader("Content-Type"))
+            tmp = dest + ".part"
+            try:
+                with open(tmp, "wb") as f:
+                    while True:
+                        # Stop writing into the job directory once the job gave up on it
+                        _check_stopped(stop, url)
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+            except BaseException:
+                # Half-read body: neither the file nor the connection is reusable
+                pool.discard(parts.scheme, parts.netloc)
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            os.replace(tmp, dest)
+            if response.will_close:
+                pool.discard(parts.scheme, parts.netloc)
+            return dest, response
+
+        except (http.client.HTTPException, OSError) as e:
+            # Stale keep-alive socket, reset or timeout - reconnect on retry
+            pool.discard(parts.scheme, parts.netloc)
+            raise _RetryableError(f"{type(e).__name__}: {e}") from e
+
+    raise ImageDownloadError(f"Too many redirects for {url}")
+
+
+def fetch_image(pool, url, dest_base, deadline, retries=DEFAULT_RETRIES, headers=None, stop=None):
+    """Fetch one URL to dest_base.<ext> with exponential backoff between attempts
+
+    Setting stop (a threading.Event) aborts the fetch between chunks and retries.
+    """
+    attempt = 0
+    while True:
+        try:
+            return _fetch_once(pool, url, dest_base, deadline, headers=headers, stop=stop)
+        except _RetryableError as e:
+            attempt += 1
+            delay = BACKOFF_SECONDS * (2 ** (attempt - 1))
+            if attempt > retries or time.monotonic() + delay >= deadline:
+                raise ImageDownloadError(f"Failed to download {url} after {attempt} attempts: {e}") from e
+            print(f"Retrying image download ({attempt}/{retries}) in {delay:.1f}s: {e}")
+            if stop is None:
+                time.sleep(delay)
+            elif stop.wait(delay):
+                raise ImageDownloadError(f"Download of {url} cancelled") from e
+
+
+def _download_one(pool, url, dest_base, deadline, retries, cache, stop):
+    """Fetch one image, revalidating against the worker cache when possible"""
+    entry = cache.lookup(url) if cache is not None else None
+    headers = {"If-None-Match": entry["etag"]} if entry else None
+
+    path, response = fetch_image(pool, url, dest_base, deadline, retries, headers=headers, stop=stop)
+    if path is None:
+        _check_stopped(stop, url)
+        path = cache.link_into(entry["sha256"], dest_base + entry["ext"])
+        if path is not None:
+            return path
+        # Evicted between lookup and link - fetch unconditionally
+        path, response = fetch_image(pool, url, dest_base, deadline, retries, stop=stop)
+
+    if cache is not None:
+        cache.store(url, path, response.getheader("ETag"))
+    return path
+
+
+def iter_downloads(urls, dest_dir, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES,
+                   request_timeout=DEFAULT_REQUEST_TIMEOUT, job_timeout=DEFAULT_JOB_TIMEOUT,
+                   cache=None):
+    """Download urls into dest_dir/image_NNN.<ext>, yielding (index, path) as each one lands"""
+    os.makedirs(dest_dir, exist_ok=True)
+    deadline = time.monotonic() + job_timeout
+    pool = ConnectionPool(timeout=request_timeout)
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(urls) or 1)))
+    try:
+        futures = {
+            executor.submit(_download_one, pool, url, os.path.join(dest_dir, f"image_{i:03d}"),
+                            deadline, retries, cache, stop): i
+            for i, url in enumerate(urls)
+        }
+        try:
+            for future in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+                yield futures[future], future.result()
+        except FuturesTimeoutError:
+            raise ImageDownloadError(f"Image download exceeded job timeout of {job_timeout:.0f}s")
+    finally:
+        # On timeout, error or early close: drop queued downloads and wait for
+        # running ones to notice stop, so nothing writes to dest_dir after we return
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        pool.close()
+        if cache is not None:
+            cache.evict()
@@ -0,0 +1,137 @@
+"""
+Image Preprocessing Pipeline
+Validates, EXIF-rotates and downsizes training images in a process pool as
+they arrive from the downloader, so bad inputs fail the job in seconds and
+Kohya's data loader receives bucket-sized files
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+TRAINING_RESOLUTION = int(os.getenv("TRAINING_RESOLUTION", "1024"))
+MIN_IMAGE_SIDE = int(os.getenv("MIN_IMAGE_SIDE", "256"))
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+JPEG_QUALITY = 95
+
+# Magic-byte signatures -> (format, extension Kohya will pick up)
+SIGNATURES = [
+    (b"\xff\xd8\xff", "jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png", ".png"),
+    (b"GIF87a", "gif", ".png"),
+    (b"GIF89a", "gif", ".png"),
+    (b"BM", "bmp", ".png"),
+]
+SAVE_FORMATS = {".jpg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+
+
+class ImageValidationError(Exception):
+    """Raised when an input image is corrupt, unsupported or too small"""
+
+
+def sniff_format(path):
+    """Detect the real image format from the file header; (format, ext) or (None, None)"""
+    with open(path, "rb") as f:
+        head = f.read(16)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", ".webp"
+    for magic, fmt, ext in SIGNATURES:
+        if head.startswith(magic):
+            return fmt, ext
+    return None, None
+
+
+def preprocess_image(path, resolution=TRAINING_RESOLUTION, min_side=MIN_IMAGE_SIDE):
+    """Validate and normalize one image in place; returns path/size/format info"""
+    name = os.path.basename(path)
+    fmt, ext = sniff_format(path)
+    if fmt is None:
+        raise ImageValidationError(f"{name}: not a supported image format")
+
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(path) as img:
+            img.load()
+            orientation = img.getexif().get(0x0112, 1)
+            img = ImageOps.exif_transpose(img)
+    except Exception as e:
+        raise ImageValidationError(f"{name}: corrupt or unreadable image ({e})") from e
+
+    width, height = img.size
+    if min(width, height) < min_side:
+        raise ImageValidationError(
+            f"{name}: {width}x{height} is smaller than the {min_side}px minimum side")
+
+    # Never upscale; shrink so the short side matches the training resolution,
+    # which still covers every bucket Kohya can assign at that resolution
+    scale = resolution / min(width, height)
+    resized = scale < 1.0
+    if resized:
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+        img = img.resize((width, height), Image.LANCZOS)
+
+    base = os.path.splitext(path)[0]
+    dest = base + ext
+    if resized or orientation != 1 or dest != path:
+        if ext == ".jpg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif ext == ".png" and img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+        tmp = f"{dest}.tmp"
+        # Write a new inode: the original may be hard-linked into the image cache
+        img.save(tmp, format=SAVE_FORMATS[ext], quality=JPEG_QUALITY)
+        os.replace(tmp, dest)
+        if dest != path:
+            os.remove(path)
+
+    return {"path": dest, "width": width, "height": height, "format": fmt}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Shared worker pool, created on first use and reused across jobs"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # By the first job the process already runs RunPod, pre-warm and
+            # pipeline threads, so workers come from a single-threaded fork
+            # server (with this module and PIL preloaded) rather than forking the
+            # handler. Each worker still re-imports the entry script as
+            # __mp_main__, so its top-level code runs once per worker (callers
+            # need an if __name__ == "__main__" guard); the pool lives for the
+            # whole process, so that cost is paid once, not per job
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload([__name__, "PIL.Image"])
+            _pool = ProcessPoolExecutor(max_workers=max(1, PREPROCESS_WORKERS), mp_context=context)
+    return _pool
+
+
+def _raise_first_failure(futures):
+    for future in futures.values():
+        if future.done() and future.exception() is not None:
+            raise future.exception()
+
+
+def preprocess_images(indexed_paths, resolution=TRAINING_RESOLUTION, min_side=MIN_IMAGE_SIDE):
+    """Preprocess (index, path) pairs as they stream in; returns results in index order"""
+    pool = get_pool()
+    futures = {}
+    try:
+        for index, path in indexed_paths:
+            futures[index] = pool.submit(preprocess_image, path, resolution, min_side)
+            _raise_first_failure(futures)
+        results = [futures[i].result() for i in sorted(futures)]
+    except BaseException:
+        for future in futures.values():
+            future.cancel()
+        if hasattr(indexed_paths, "close"):
+            indexed_paths.close()  # stop the downloader early
+        raise
+
+    print(f"Preprocessed {len(results)} images for resolution {resolution}")
+    return results
@@ -0,0 +1,131 @@
+"""
+Job Metrics
+Per-phase durations, bytes moved and training throughput for every job,
+returned in the result payload and optionally written to a local file:
+
+    METRICS_FILE=/tmp/fluxgym_metrics.jsonl   one JSON object per job
+    METRICS_FILE=/var/lib/node_exporter/fluxgym.prom  METRICS_FORMAT=prometheus
+                                              node_exporter textfile collector
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_FORMAT = os.getenv("METRICS_FORMAT", "jsonl")
+METRICS_FORMATS = ("jsonl", "prometheus")
+METRICS_PREFIX = "fluxgym"
+
+
+class JobMetrics:
+    """Phase timings (seconds), byte counters and gauges for one job"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.bytes = {}
+        self.values = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        """Add seconds to a phase (phases run more than once accumulate)"""
+        with self._lock:
+            self.phases[name] = round(self.phases.get(name, 0.0) + seconds, 3)
+
+    def add_bytes(self, kind, count):
+        with self._lock:
+            self.bytes[kind] = self.bytes.get(kind, 0) + count
+
+    def merge(self, other):
+        """Fold another job's phase durations and byte counts into this one"""
+        for name, seconds in other.phases.items():
+            self.record(name, seconds)
+        for kind, count in other.bytes.items():
+            self.add_bytes(kind, count)
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def as_dict(self):
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "phases": dict(self.phases),
+            "bytes": dict(self.bytes),
+            **self.values,
+        }
+
+
+def metered_downloads(indexed_paths, metrics):
+    """Pass (index, path) pairs through, timing the download and counting bytes"""
+    with metrics.phase("download"):
+        for index, path in indexed_paths:
+            metrics.add_bytes("download", os.path.getsize(path))
+            yield index, path
+
+
+# Process-wide totals for the Prometheus textfile (a scrape sees the worker's
+# cumulative counters plus the most recent job's gauges)
+_totals = {"jobs": {}, "phase_seconds": {}, "bytes": {}}
+_totals_lock = threading.Lock()
+
+
+def _prometheus_text(job, status):
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {METRICS_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            label_text = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{METRICS_PREFIX}_{name}{label_text} {value}")
+
+    metric("jobs_total", "counter", "Jobs finished by status",
+           [({"status": s}, n) for s, n in sorted(_totals["jobs"].items())])
+    metric("phase_seconds_total", "counter", "Seconds spent per job phase",
+           [({"phase": p}, round(s, 3)) for p, s in sorted(_totals["phase_seconds"].items())])
+    metric("bytes_total", "counter", "Bytes moved per direction",
+           [({"kind": k}, n) for k, n in sorted(_totals["bytes"].items())])
+    metric("last_job_phase_seconds", "gauge", "Phase durations of the most recent job",
+           [({"phase": p}, s) for p, s in sorted(job["phases"].items())])
+    metric("last_job_seconds", "gauge", "Total duration of the most recent job",
+           [({"status": status}, job["total_seconds"])])
+    if job.get("it_per_sec") is not None:
+        metric("last_job_it_per_second", "gauge", "Training throughput of the most recent job",
+               [({}, job["it_per_sec"])])
+    return "\n".join(lines) + "\n"
+
+
+def emit(job_id, job, status, path=METRICS_FILE, fmt=METRICS_FORMAT):
+    """Record one finished job's metrics (JobMetrics.as_dict()) and write the configured file"""
+    with _totals_lock:
+        _totals["jobs"][status] = _totals["jobs"].get(status, 0) + 1
+        for phase, seconds in job["phases"].items():
+            _totals["phase_seconds"][phase] = _totals["phase_seconds"].get(phase, 0.0) + seconds
+        for kind, count in job["bytes"].items():
+            _totals["bytes"][kind] = _totals["bytes"].get(kind, 0) + count
+        if not path:
+            return
+        try:
+            if fmt == "prometheus":
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    f.write(_prometheus_text(job, status))
+                os.replace(tmp, path)
+            else:
+                with open(path, "a") as f:
+                    f.write(json.dumps({"job_id": job_id, "status": status,
+                                        "timestamp": time.time(), **job}) + "\n")
+        except OSError as e:
+            print(f"Could not write metrics to {path}: {e}")
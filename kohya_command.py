@@ -0,0 +1,70 @@
+"""
+Kohya Training Command Builder
+Builds the `accelerate launch flux_train_network.py` command line (or just the
+script arguments, for the warm trainer), with all model and script paths
+taken from the model registry
+"""
+
+from launch_profile import get_launch_profile
+from model_registry import model_paths, train_script_path
+
+
+def build_training_args(dataset_config, output_dir, output_name, schedule, paths=None, profile=None,
+                        save_state=False, resume=None):
+    """flux_train_network.py arguments for one FLUX LoRA training run
+
+    save_state also writes optimizer/scheduler state at every checkpoint;
+    resume continues from such a state directory.
+    """
+    paths = paths or model_paths()
+    profile = profile or get_launch_profile()
+    args = [
+        "--pretrained_model_name_or_path", paths["flux"],
+        "--clip_l", paths["clip_l"],
+        "--t5xxl", paths["t5xxl"],
+        "--ae", paths["vae"],
+        "--cache_latents_to_disk",
+        "--save_model_as", "safetensors",
+        "--sdpa", "--persistent_data_loader_workers",
+        "--max_data_loader_n_workers", str(profile["data_loader_workers"]),
+        "--seed", "42",
+        "--mixed_precision", "bf16",
+        "--save_precision", "bf16",
+        "--network_module", "networks.lora_flux",
+        "--network_dim", str(profile["network_dim"]),
+        "--learning_rate", "8e-4",
+        "--cache_text_encoder_outputs",
+        "--cache_text_encoder_outputs_to_disk",
+        "--max_train_steps", str(schedule["max_train_steps"]),
+        "--train_batch_size", str(schedule["batch_size"]),
+        "--dataset_config", dataset_config,
+        "--output_dir", output_dir,
+        "--output_name", output_name,
+        "--timestep_sampling", "shift",
+        "--discrete_flow_shift", "3.1582",
+        "--model_prediction_type", "raw",
+        "--guidance_scale", "1.0",
+        "--loss_type", "l2",
+    ] + profile["flags"]
+    if schedule.get("save_every_n_steps"):
+        args += ["--save_every_n_steps", str(schedule["save_every_n_steps"])]
+        if save_state:
+            # Kohya drops states older than N steps, so the two newest stay
+            # on disk: a finished one remains while the next is being written
+            args += ["--save_last_n_steps_state", str(schedule["save_every_n_steps"])]
+    if save_state:
+        args += ["--save_state"]
+    if resume:
+        args += ["--resume", resume, "--skip_until_initial_step"]
+    return args
+
+
+def launch_command(training_args, profile=None):
+    """Wrap flux_train_network.py arguments in an `accelerate launch` argv"""
+    profile = profile or get_launch_profile()
+    return [
+        "accelerate", "launch",
+        "--mixed_precision", "bf16",
+        "--num_cpu_threads_per_process", str(profile["cpu_threads_per_process"]),
+        train_script_path(),
+    ] + list(training_args)
@@ -0,0 +1,97 @@
+"""
+Launch Profiles
+Picks the Kohya/accelerate flag set for the worker's GPU memory and CPU count
+from a table of tuned profiles, so small cards do not OOM and large ones are
+not held back by memory-saving flags they do not need.
+
+    LAUNCH_PROFILE=high     force a profile by name
+    GPU_VRAM_GB=24          override detected VRAM (also: CPU_COUNT)
+"""
+
+import os
+import subprocess
+from functools import lru_cache
+
+LAUNCH_PROFILE = os.getenv("LAUNCH_PROFILE")
+MAX_DATA_LOADER_WORKERS = 8
+
+ADAFACTOR = ["--optimizer_type", "adafactor",
+             "--optimizer_args", "relative_step=False", "scale_parameter=False", "warmup_init=False",
+             "--lr_scheduler", "constant_with_warmup", "--max_grad_norm", "0.0"]
+ADAMW8BIT = ["--optimizer_type", "adamw8bit"]
+
+# Ordered by min_vram_gb; the largest profile the GPU qualifies for wins.
+# 12/16 GB settings follow FluxGym's presets for those cards.
+PROFILES = [
+    {"name": "low", "min_vram_gb": 0, "network_dim": 16,
+     "flags": ["--fp8_base", "--gradient_checkpointing", "--split_mode",
+               "--network_args", "train_blocks=single"] + ADAFACTOR},
+    {"name": "mid", "min_vram_gb": 16, "network_dim": 32,
+     "flags": ["--fp8_base", "--gradient_checkpointing"] + ADAFACTOR},
+    {"name": "high", "min_vram_gb": 24, "network_dim": 32,
+     "flags": ["--fp8_base", "--gradient_checkpointing", "--highvram"] + ADAMW8BIT},
+    {"name": "xl", "min_vram_gb": 40, "network_dim": 32,
+     "flags": ["--gradient_checkpointing", "--highvram"] + ADAMW8BIT},
+    {"name": "xxl", "min_vram_gb": 64, "network_dim": 32,
+     "flags": ["--highvram"] + ADAMW8BIT},
+]
+
+
+def detect_vram_gb():
+    """Total memory of the first GPU in GB via nvidia-smi (no torch import), or 0"""
+    override = os.getenv("GPU_VRAM_GB")
+    if override:
+        return float(override)
+    try:
+        output = subprocess.run(
+            ["nvidia-smi", "--query-gpu=memory.total", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, timeout=10, check=True).stdout
+        return round(int(output.splitlines()[0].strip()) / 1024, 1)
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        return 0.0
+
+
+def detect_cpu_count():
+    override = os.getenv("CPU_COUNT")
+    if override:
+        return int(override)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def select_profile(vram_gb=None, cpu_count=None, name=LAUNCH_PROFILE):
+    """Profile for the given (or detected) hardware, with CPU-derived worker counts"""
+    vram_gb = detect_vram_gb() if vram_gb is None else vram_gb
+    cpu_count = detect_cpu_count() if cpu_count is None else cpu_count
+    if name:
+        matches = [profile for profile in PROFILES if profile["name"] == name]
+        if not matches:
+            raise ValueError(f"Unknown LAUNCH_PROFILE {name!r}; expected one of "
+                             f"{', '.join(profile['name'] for profile in PROFILES)}")
+        profile = matches[0]
+    else:
+        profile = [p for p in PROFILES if vram_gb >= p["min_vram_gb"]][-1]
+    return {
+        **profile,
+        "vram_gb": vram_gb,
+        "cpu_count": cpu_count,
+        # One core stays with the training loop, the rest feed it
+        "data_loader_workers": max(1, min(MAX_DATA_LOADER_WORKERS, cpu_count - 1)),
+        "cpu_threads_per_process": max(1, min(MAX_DATA_LOADER_WORKERS, cpu_count // 2)),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_launch_profile():
+    """Profile for this worker, detected once per process"""
+    profile = select_profile()
+    print(f"Launch profile: {profile['name']} ({profile['vram_gb']} GB VRAM, {profile['cpu_count']} CPUs)")
+    return profile
+
+
+def describe(profile):
+    """Profile summary for the job result"""
+    return {key: profile[key] for key in
+            ("name", "vram_gb", "cpu_count", "network_dim", "data_loader_workers", "cpu_threads_per_process")}
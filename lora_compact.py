@@ -0,0 +1,278 @@
+"""
+LoRA Compaction
+Optional post-training stage run on CPU before upload: pick the final or
+best checkpoint, convert the dtype, reduce the rank of every lora_up /
+lora_down pair by SVD (to a target rank or an energy threshold) and write
+a sha256 + metadata sidecar next to the result.
+
+Tensors are streamed one module at a time from the mmapped source into a
+temporary data file, so memory stays bounded by the largest layer rather
+than the size of the LoRA.
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+
+from file_cache import sha256_file
+from safetensors_header import data_start, read_header
+
+COMPACT_SELECT = os.getenv("COMPACT_SELECT", "all")     # all | final | best
+COMPACT_DTYPE = os.getenv("COMPACT_DTYPE", "")          # "" (keep) | bf16 | fp16 | fp32
+COMPACT_RANK = int(os.getenv("COMPACT_RANK", "0"))      # 0 = keep rank
+COMPACT_QUALITY = float(os.getenv("COMPACT_QUALITY", "0"))  # e.g. 0.99 singular-value energy
+COPY_CHUNK_SIZE = 16 * 1024 * 1024
+
+SELECT_MODES = ("all", "final", "best")
+DTYPE_NAMES = {"bf16": "BF16", "fp16": "F16", "fp32": "F32"}
+FLOAT_DTYPES = ("BF16", "F16", "F32")
+STEP_RE = re.compile(r"-step(\d+)\.safetensors$")
+LORA_SUFFIXES = (".lora_down.weight", ".lora_up.weight", ".alpha")
+
+
+class CompactionError(ValueError):
+    """Raised for invalid compaction options or an unreadable LoRA"""
+
+
+def compaction_options(options=None):
+    """Job-level "compact" input merged over the COMPACT_* defaults"""
+    if options is not None and not isinstance(options, dict):
+        raise CompactionError('compact must be an object, e.g. {"select": "final", "dtype": "bf16"}')
+    options = {"select": COMPACT_SELECT, "dtype": COMPACT_DTYPE, "rank": COMPACT_RANK,
+               "quality": COMPACT_QUALITY, **(options or {})}
+    if options["select"] not in SELECT_MODES:
+        raise CompactionError(f"compact.select must be one of {', '.join(SELECT_MODES)}")
+    options["dtype"] = options["dtype"] or ""
+    if options["dtype"] and (not isinstance(options["dtype"], str) or options["dtype"] not in DTYPE_NAMES):
+        raise CompactionError(f"compact.dtype must be one of {', '.join(DTYPE_NAMES)}")
+    try:
+        options["rank"] = int(options["rank"] or 0)
+    except (TypeError, ValueError):
+        raise CompactionError("compact.rank must be an integer") from None
+    try:
+        options["quality"] = float(options["quality"] or 0)
+    except (TypeError, ValueError):
+        raise CompactionError("compact.quality must be a number") from None
+    if options["rank"] < 0:
+        raise CompactionError("compact.rank must be 0 (keep) or a positive rank")
+    if not 0 <= options["quality"] <= 1:
+        raise CompactionError("compact.quality must be between 0 and 1")
+    return options
+
+
+def is_noop(options):
+    return options["select"] == "all" and not options["dtype"] and not options["rank"] and not options["quality"]
+
+
+def select_checkpoints(paths, output_name, mode, losses=None):
+    """Checkpoints to publish: every file, the final one, or the lowest-loss one"""
+    if mode == "all" or not paths:
+        return list(paths)
+    final = [path for path in paths if os.path.basename(path) == f"{output_name}.safetensors"]
+    if mode == "final" or not losses:
+        return final or [max(paths, key=_checkpoint_step)]
+
+    last_step = max(losses)
+
+    def loss(path):
+        step = _checkpoint_step(path)
+        step = last_step if step is None else step
+        # avr_loss logged at (or just before) the step the checkpoint was saved
+        logged = [s for s in losses if s <= step]
+        return losses[max(logged)] if logged else float("inf")
+
+    return [min(paths, key=loss)]
+
+
+def _checkpoint_step(path):
+    match = STEP_RE.search(os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+
+def _to_float32(raw, dtype, shape):
+    import numpy as np
+
+    if dtype == "BF16":
+        widened = np.frombuffer(raw, dtype="<u2").astype(np.uint32) << 16
+        return widened.view(np.float32).reshape(shape)
+    return np.frombuffer(raw, dtype="<f2" if dtype == "F16" else "<f4").astype(np.float32).reshape(shape)
+
+
+def _from_float32(array, dtype):
+    import numpy as np
+
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    if dtype == "BF16":
+        bits = array.view(np.uint32)
+        # Round to nearest even on the dropped 16 bits
+        rounded = (bits + 0x7FFF + ((bits >> 16) & 1)) >> 16
+        return rounded.astype("<u2").tobytes()
+    return array.astype("<f2" if dtype == "F16" else "<f4").tobytes()
+
+
+def _choose_rank(singular_values, rank, quality):
+    import numpy as np
+
+    k = len(singular_values)
+    if quality:
+        energy = np.cumsum(singular_values ** 2)
+        k = int(np.searchsorted(energy, quality * energy[-1]) + 1)
+    if rank:
+        k = min(k, rank)
+    return max(1, min(k, len(singular_values)))
+
+
+def reduce_rank(down, up, alpha, rank=0, quality=0.0):
+    """SVD-truncate one LoRA pair; returns (down, up, alpha) with the scale folded in
+
+    The product up @ down is factored through QR so only r x r matrices
+    are decomposed, never the full out x in weight delta.
+    """
+    import numpy as np
+
+    current = down.shape[0]
+    scale = (alpha / current) if alpha is not None else 1.0
+    q_up, r_up = np.linalg.qr(up)
+    q_down, r_down = np.linalg.qr(down.T)
+    u, s, vt = np.linalg.svd((r_up @ r_down.T) * scale)
+    k = _choose_rank(s, rank, quality)
+    root = np.sqrt(s[:k])
+    new_up = (q_up @ u[:, :k]) * root
+    new_down = (root[:, None] * vt[:k]) @ q_down.T
+    # alpha == rank keeps Kohya's alpha / rank multiplier at 1
+    return new_down, new_up, float(k)
+
+
+def _module_groups(header):
+    """{module prefix: {suffix: tensor name}} for LoRA down/up/alpha tensors"""
+    groups = {}
+    for name in header:
+        for suffix in LORA_SUFFIXES:
+            if name.endswith(suffix):
+                groups.setdefault(name[:-len(suffix)], {})[suffix] = name
+    return {prefix: parts for prefix, parts in groups.items()
+            if ".lora_down.weight" in parts and ".lora_up.weight" in parts}
+
+
+def compact_lora(src, dest, dtype="", rank=0, quality=0.0):
+    """Write a compacted copy of src to dest; returns a summary for the sidecar"""
+    header = read_header(src)
+    base = data_start(src)
+    metadata = dict(header.get("__metadata__") or {})
+    tensors = sorted(((name, info) for name, info in header.items() if name != "__metadata__"),
+                     key=lambda item: item[1]["data_offsets"][0])
+    groups = _module_groups(header)
+    member_of = {name: prefix for prefix, parts in groups.items() for name in parts.values()}
+    target = DTYPE_NAMES.get(dtype)
+
+    entries = {}
+    ranks = []
+    offset = 0
+    tmp_data = f"{dest}.data.tmp"
+    with open(src, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+            open(tmp_data, "wb") as out:
+
+        def raw(name):
+            begin, end = header[name]["data_offsets"]
+            return mm[base + begin:base + end]
+
+        def emit(name, dtype_name, shape, data):
+            nonlocal offset
+            out.write(data)
+            entries[name] = {"dtype": dtype_name, "shape": list(shape),
+                             "data_offsets": [offset, offset + len(data)]}
+            offset += len(data)
+
+        done = set()
+        for name, info in tensors:
+            if name in done:
+                continue
+            prefix = member_of.get(name)
+            reducible = prefix is not None and (rank or quality) \
+                and len(header[groups[prefix][".lora_down.weight"]]["shape"]) == 2
+            if reducible:
+                parts = groups[prefix]
+                down_info, up_info = header[parts[".lora_down.weight"]], header[parts[".lora_up.weight"]]
+                down = _to_float32(raw(parts[".lora_down.weight"]), down_info["dtype"], down_info["shape"])
+                up = _to_float32(raw(parts[".lora_up.weight"]), up_info["dtype"], up_info["shape"])
+                alpha = None
+                if ".alpha" in parts:
+                    alpha_info = header[parts[".alpha"]]
+                    alpha = float(_to_float32(raw(parts[".alpha"]), alpha_info["dtype"], [1])[0])
+                down, up, new_alpha = reduce_rank(down, up, alpha, rank, quality)
+                ranks.append(down.shape[0])
+                out_dtype = target or down_info["dtype"]
+                emit(parts[".lora_down.weight"], out_dtype, down.shape, _from_float32(down, out_dtype))
+                emit(parts[".lora_up.weight"], out_dtype, up.shape, _from_float32(up, out_dtype))
+                alpha_name = parts.get(".alpha", f"{prefix}.alpha")
+                alpha_dtype = target or (header[alpha_name]["dtype"] if alpha_name in header else out_dtype)
+                emit(alpha_name, alpha_dtype, [], _from_float32([new_alpha], alpha_dtype))
+                done.update(parts.values())
+                continue
+
+            if prefix is not None and name.endswith(".lora_down.weight"):
+                ranks.append(info["shape"][0])
+            if target and info["dtype"] in FLOAT_DTYPES and info["dtype"] != target:
+                emit(name, target, info["shape"],
+                     _from_float32(_to_float32(raw(name), info["dtype"], info["shape"]), target))
+            else:
+                emit(name, info["dtype"], info["shape"], raw(name))
+            done.add(name)
+
+    if ranks and (rank or quality):
+        # Kohya metadata describes the network as a whole; report the largest rank
+        metadata["ss_network_dim"] = str(max(ranks))
+        metadata["ss_network_alpha"] = str(max(ranks))
+    if metadata:
+        entries = {"__metadata__": metadata, **entries}
+    header_bytes = json.dumps(entries, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    tmp_dest = f"{dest}.tmp"
+    try:
+        with open(tmp_dest, "wb") as out, open(tmp_data, "rb") as data:
+            out.write(struct.pack("<Q", len(header_bytes)))
+            out.write(header_bytes)
+            for chunk in iter(lambda: data.read(COPY_CHUNK_SIZE), b""):
+                out.write(chunk)
+        os.replace(tmp_dest, dest)
+    finally:
+        os.remove(tmp_data)
+
+    return {
+        "source": os.path.basename(src),
+        "source_bytes": os.path.getsize(src),
+        "bytes": os.path.getsize(dest),
+        "dtype": target or "unchanged",
+        "rank": {"max": max(ranks), "min": min(ranks)} if ranks else None,
+    }
+
+
+def write_sidecar(path, summary, metadata=None):
+    """`<path>.json` with the file's sha256, size and compaction details"""
+    sidecar = f"{path}.json"
+    with open(sidecar, "w") as f:
+        json.dump({"file": os.path.basename(path), "sha256": sha256_file(path),
+                   "size": os.path.getsize(path), **summary, "metadata": metadata or {}}, f, indent=2)
+    return sidecar
+
+
+def compact_outputs(paths, output_name, options, losses=None, metadata=None):
+    """Select, compact and sidecar the training outputs; returns (files to upload, summaries)"""
+    selected = select_checkpoints(paths, output_name, options["select"], losses)
+    files, summaries = [], []
+    for path in selected:
+        if options["dtype"] or options["rank"] or options["quality"]:
+            root, ext = os.path.splitext(path)
+            dest = f"{root}-compact{ext}"
+            summary = compact_lora(path, dest, options["dtype"], options["rank"], options["quality"])
+        else:
+            dest = path
+            summary = {"source": os.path.basename(path), "source_bytes": os.path.getsize(path),
+                       "bytes": os.path.getsize(path), "dtype": "unchanged", "rank": None}
+        summary["step"] = _checkpoint_step(path)
+        files += [dest, write_sidecar(dest, summary, metadata)]
+        summaries.append(summary)
+    return files, summaries
@@ -0,0 +1,102 @@
+"""
+Model Pre-Warm
+Optional boot-time stage that provisions and verifies every model artifact,
+validates the safetensors headers and pulls the files into the page cache
+before the first job, so the first customer on a worker does not pay for it.
+
+    MODEL_PREWARM=1               enable at worker boot
+    MODEL_PREWARM_READ=fadvise    page-cache strategy: fadvise | read | none
+    PREWARM_WAIT_SECONDS=1800     how long a job waits for warm-up ("queue")
+    PREWARM_REFUSE=1              reject jobs until warm instead of waiting
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from model_provisioner import provision_models
+from safetensors_header import read_header, tensor_count
+
+MODEL_PREWARM = os.getenv("MODEL_PREWARM", "0") == "1"
+MODEL_PREWARM_READ = os.getenv("MODEL_PREWARM_READ", "fadvise")
+PREWARM_READ_MODES = ("fadvise", "read", "none")
+PREWARM_WAIT_SECONDS = float(os.getenv("PREWARM_WAIT_SECONDS", "1800"))
+PREWARM_REFUSE = os.getenv("PREWARM_REFUSE", "0") == "1"
+READ_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def warm_page_cache(path, mode=MODEL_PREWARM_READ):
+    """Pull a file into the OS page cache; returns bytes requested/read"""
+    size = os.path.getsize(path)
+    if mode == "none":
+        return 0
+    with open(path, "rb", buffering=0) as f:
+        if mode == "fadvise" and hasattr(os, "posix_fadvise"):
+            # Asynchronous readahead - returns immediately, kernel fills the cache
+            os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+            return size
+        buffer = bytearray(READ_CHUNK_SIZE)
+        total = 0
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            total += n
+        return total
+
+
+class PrewarmState:
+    """Readiness of the model artifacts, shared between boot thread and handler"""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.status = "cold"
+        self.error = None
+        self.report = {}
+
+    def run(self, token=None):
+        """Provision, verify and warm every artifact (blocking)"""
+        self.status = "warming"
+        started = time.time()
+        try:
+            paths = provision_models(token=token)
+            provisioned = time.time()
+
+            def warm(name):
+                path = paths[name]
+                header = read_header(path)
+                return name, {"tensors": tensor_count(header), "bytes": warm_page_cache(path)}
+
+            with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+                artifacts = dict(executor.map(warm, paths))
+
+            self.report = {
+                "provision_seconds": round(provisioned - started, 2),
+                "warm_seconds": round(time.time() - provisioned, 2),
+                "read_mode": MODEL_PREWARM_READ,
+                "artifacts": artifacts,
+            }
+            self.status = "warm"
+            print(f"🔥 Models warm in {time.time() - started:.1f}s: {self.report}")
+        except Exception as e:
+            self.status = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"❌ Model pre-warm failed: {self.error}")
+        finally:
+            self.ready.set()
+
+    def start(self, token=None):
+        """Run the pre-warm in a background thread"""
+        threading.Thread(target=self.run, args=(token,), daemon=True).start()
+
+    def wait(self, timeout=PREWARM_WAIT_SECONDS):
+        """Block until warm-up has finished (or failed); True when models are warm"""
+        self.ready.wait(timeout)
+        return self.status == "warm"
+
+    def as_dict(self):
+        return {"status": self.status, "error": self.error, **self.report}
+
+
+PREWARM = PrewarmState()
@@ -0,0 +1,229 @@
+"""
+FLUX Model Provisioner
+Fetches the base model and text encoders concurrently, stages each one under
+a temporary name, verifies size/sha256 and atomically renames it into place.
+Interrupted downloads resume from the partial file on the next attempt, and a
+per-artifact lock file makes concurrent workers on a shared volume wait for
+one download instead of racing it.
+"""
+
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from file_cache import sha256_file
+from file_lock import FileLock
+from model_registry import get_artifacts
+from safetensors_header import SafetensorsHeaderError, read_header
+
+# Set MODEL_HUB_DIR to a directory laid out as <repo_id>/<filename> to
+# provision from a local mirror (or a fake hub in tests) instead of HuggingFace
+MODEL_HUB_DIR = os.getenv("MODEL_HUB_DIR")
+# Optional JSON file: {"<name>": {"size": ..., "sha256": ...}, ...}
+MODEL_MANIFEST = os.getenv("MODEL_MANIFEST")
+MODEL_VERIFY_SHA256 = os.getenv("MODEL_VERIFY_SHA256", "0") == "1"
+MODEL_LOCK_TIMEOUT = float(os.getenv("MODEL_LOCK_TIMEOUT", "3600"))
+COPY_CHUNK_SIZE = 16 * 1024 * 1024
+
+class ModelProvisioningError(Exception):
+    """Raised when an artifact cannot be fetched or fails verification"""
+
+
+def load_manifest(artifacts, manifest_path=MODEL_MANIFEST):
+    """Merge expected size/sha256 from the manifest file into the artifact specs"""
+    expected = {}
+    if manifest_path:
+        with open(manifest_path) as f:
+            expected = json.load(f)
+    return [{**artifact, **expected.get(artifact["name"], {})} for artifact in artifacts]
+
+
+def _sidecar_path(dest):
+    return f"{dest}.verified.json"
+
+
+def _read_sidecar(dest):
+    try:
+        with open(_sidecar_path(dest)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_sidecar(dest, size, sha256):
+    tmp = f"{_sidecar_path(dest)}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"size": size, "sha256": sha256, "verified_at": time.time()}, f)
+    os.replace(tmp, _sidecar_path(dest))
+
+
+def artifact_fingerprint(path):
+    """Stable identity of a provisioned model file: verified sha256, else name and size"""
+    sidecar = _read_sidecar(path)
+    if sidecar and sidecar.get("sha256"):
+        return sidecar["sha256"]
+    return f"{os.path.basename(path)}:{os.path.getsize(path)}"
+
+
+def _expected_size(artifact, token, hub_dir):
+    """Size of the artifact at its source (local hub or HuggingFace), or None if unknown"""
+    if hub_dir:
+        src = os.path.join(hub_dir, artifact["repo_id"], artifact["filename"])
+        return os.path.getsize(src) if os.path.exists(src) else None
+    return _remote_metadata(artifact, token).get("size")
+
+
+def is_complete(artifact, token=None, hub_dir=MODEL_HUB_DIR, remote=True):
+    """True if the artifact is on disk and matches what we expect of it
+
+    remote=False skips the source size lookup for files without a sidecar
+    (e.g. the boot-time presence check), leaving only the header check.
+    """
+    dest = artifact["dest"]
+    if not os.path.exists(dest):
+        return False
+    size = os.path.getsize(dest)
+    if artifact.get("size") is not None and artifact["size"] != size:
+        return False
+
+    sidecar = _read_sidecar(dest)
+    if sidecar:
+        if sidecar["size"] != size:
+            return False
+        # Sidecars written without hashing (size-checked files) carry no sha256
+        if artifact.get("sha256") and sidecar.get("sha256") not in (None, artifact["sha256"]):
+            return False
+        return True
+
+    # Files placed before verification existed (or by hand, or half-written
+    # by a killed worker): the header must describe exactly this many bytes
+    try:
+        read_header(dest)
+    except SafetensorsHeaderError as e:
+        print(f"⚠️  {artifact['name']}: {e}, downloading again")
+        return False
+    if MODEL_VERIFY_SHA256 and artifact.get("sha256"):
+        if sha256_file(dest) != artifact["sha256"]:
+            return False
+        _write_sidecar(dest, size, artifact["sha256"])
+        return True
+    expected = artifact.get("size")
+    if expected is None and remote:
+        expected = _expected_size(artifact, token, hub_dir)
+        if expected is not None and expected != size:
+            print(f"⚠️  {artifact['name']}: {size} bytes on disk, source has {expected}, downloading again")
+            return False
+        if expected is None:
+            print(f"⚠️  {artifact['name']}: no expected size known, trusting existing {dest} (header is intact)")
+    if expected is not None:
+        # Header and size both check out: later jobs take the sidecar fast path
+        _write_sidecar(dest, size, None)
+    return True
+
+
+def _remote_metadata(artifact, token):
+    """Expected size and sha256 from the HuggingFace LFS headers, if reachable"""
+    try:
+        from huggingface_hub import get_hf_file_metadata, hf_hub_url
+        meta = get_hf_file_metadata(hf_hub_url(artifact["repo_id"], artifact["filename"]), token=token)
+    except Exception as e:
+        print(f"⚠️  {artifact['name']}: could not read hub metadata ({e})")
+        return {}
+    # For LFS files the etag is the content sha256
+    etag = (meta.etag or "").strip('"')
+    return {"size": meta.size, "sha256": etag if len(etag) == 64 else None}
+
+
+def _fetch_from_local_hub(artifact, hub_dir):
+    """Copy from a local mirror, appending to any existing .partial file"""
+    src = os.path.join(hub_dir, artifact["repo_id"], artifact["filename"])
+    if not os.path.exists(src):
+        raise ModelProvisioningError(f"{artifact['name']}: {src} not found in local hub")
+    partial = f"{artifact['dest']}.partial"
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    if offset > os.path.getsize(src):
+        os.remove(partial)
+        offset = 0
+    if offset:
+        print(f"Resuming {artifact['name']} at {offset / 1024 ** 2:.0f} MB")
+    with open(src, "rb") as fin, open(partial, "ab") as fout:
+        fin.seek(offset)
+        shutil.copyfileobj(fin, fout, COPY_CHUNK_SIZE)
+    return partial
+
+
+def _fetch_from_hub(artifact, token):
+    """Download through huggingface_hub into a staging dir next to the target"""
+    from huggingface_hub import hf_hub_download
+    # hf_hub_download keeps its own .incomplete file in local_dir and resumes it
+    staging_dir = os.path.join(os.path.dirname(artifact["dest"]), ".staging")
+    return hf_hub_download(
+        repo_id=artifact["repo_id"],
+        filename=artifact["filename"],
+        local_dir=staging_dir,
+        token=token if artifact.get("gated") else None,
+    )
+
+
+def fetch_artifact(artifact, token=None, hub_dir=MODEL_HUB_DIR):
+    """Ensure one artifact is present and verified; returns its final path"""
+    dest = artifact["dest"]
+    if is_complete(artifact, token, hub_dir):
+        return dest
+
+    # Single-flight across processes: one worker downloads, the rest wait on
+    # the lock and then find the finished file
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with FileLock(f"{dest}.lock", timeout=MODEL_LOCK_TIMEOUT):
+        if is_complete(artifact, token, hub_dir):
+            print(f"{artifact['name']} was provisioned by another worker")
+            return dest
+        return _download_artifact(artifact, token, hub_dir)
+
+
+def _download_artifact(artifact, token, hub_dir):
+    """Fetch, verify and atomically place one artifact (caller holds its lock)"""
+    dest = artifact["dest"]
+    expected = {key: artifact.get(key) for key in ("size", "sha256")}
+    if not hub_dir and None in expected.values():
+        for key, value in _remote_metadata(artifact, token).items():
+            if expected[key] is None:
+                expected[key] = value
+
+    print(f"Downloading {artifact['name']} ({artifact['filename']})...")
+    started = time.time()
+    staged = _fetch_from_local_hub(artifact, hub_dir) if hub_dir else _fetch_from_hub(artifact, token)
+
+    size = os.path.getsize(staged)
+    if expected.get("size") is not None and size != expected["size"]:
+        os.remove(staged)
+        raise ModelProvisioningError(
+            f"{artifact['name']}: size {size} does not match expected {expected['size']}")
+    # Re-reading ~33 GB is only worth it when there is a hash to check against
+    sha256 = None
+    if expected.get("sha256") or MODEL_VERIFY_SHA256:
+        sha256 = sha256_file(staged)
+        if expected.get("sha256") and sha256 != expected["sha256"]:
+            os.remove(staged)
+            raise ModelProvisioningError(f"{artifact['name']}: sha256 mismatch ({sha256})")
+
+    # Sidecar last, so it never describes a file that is not in place yet
+    if os.path.exists(_sidecar_path(dest)):
+        os.remove(_sidecar_path(dest))
+    os.replace(staged, dest)
+    _write_sidecar(dest, size, sha256)
+    print(f"{artifact['name']} ready in {time.time() - started:.1f}s ({size / 1024 ** 3:.2f} GB)")
+    return dest
+
+
+def provision_models(artifacts=None, token=None, hub_dir=MODEL_HUB_DIR):
+    """Fetch all artifacts concurrently; returns {name: path}"""
+    artifacts = load_manifest(artifacts if artifacts is not None else get_artifacts())
+    with ThreadPoolExecutor(max_workers=max(1, len(artifacts))) as executor:
+        futures = {
+            artifact["name"]: executor.submit(fetch_artifact, artifact, token, hub_dir)
+            for artifact in artifacts
+        }
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,67 @@
+"""
+Model Registry
+Single source of truth for where every FLUX artifact and the Kohya scripts
+live. Both the provisioner and the training command builder resolve paths
+here, from the environment at call time.
+
+Environment overrides:
+    MODELS_DIR        root for all artifacts (default /workspace/models)
+    FLUX_MODEL_PATH   / CLIP_MODEL_PATH / T5_MODEL_PATH / VAE_MODEL_PATH
+                      explicit per-artifact paths
+    T5XXL_PRECISION   fp16 (default) or fp8 - fp8 halves T5XXL load time and VRAM
+    SD_SCRIPTS_DIR    Kohya sd-scripts checkout (default /app/sd-scripts)
+"""
+
+import os
+
+DEFAULT_MODELS_DIR = "/workspace/models"
+DEFAULT_SD_SCRIPTS_DIR = "/app/sd-scripts"
+
+T5XXL_VARIANTS = {
+    "fp16": "t5xxl_fp16.safetensors",
+    "fp8": "t5xxl_fp8_e4m3fn.safetensors",
+}
+
+# name -> (env override, repo_id, filename, subdir under MODELS_DIR, gated)
+ARTIFACTS = {
+    "flux": ("FLUX_MODEL_PATH", "black-forest-labs/FLUX.1-dev", "flux1-dev.sft", "unet", True),
+    "clip_l": ("CLIP_MODEL_PATH", "comfyanonymous/flux_text_encoders", "clip_l.safetensors", "clip", False),
+    "t5xxl": ("T5_MODEL_PATH", "comfyanonymous/flux_text_encoders", None, "clip", False),
+    "vae": ("VAE_MODEL_PATH", "cocktailpeanut/xulf-dev", "ae.sft", "vae", False),
+}
+
+
+def t5xxl_filename():
+    precision = os.getenv("T5XXL_PRECISION", "fp16").lower()
+    if precision not in T5XXL_VARIANTS:
+        raise ValueError(f"T5XXL_PRECISION must be one of {sorted(T5XXL_VARIANTS)}, got {precision!r}")
+    return T5XXL_VARIANTS[precision]
+
+
+def get_artifacts():
+    """Artifact specs (name, repo_id, filename, dest, gated) for the current config"""
+    models_dir = os.getenv("MODELS_DIR", DEFAULT_MODELS_DIR)
+    artifacts = []
+    for name, (env_var, repo_id, filename, subdir, gated) in ARTIFACTS.items():
+        filename = filename or t5xxl_filename()
+        artifacts.append({
+            "name": name,
+            "repo_id": repo_id,
+            "filename": filename,
+            "dest": os.getenv(env_var) or os.path.join(models_dir, subdir, filename),
+            "gated": gated,
+        })
+    return artifacts
+
+
+def model_paths():
+    """{name: local path} for every artifact"""
+    return {artifact["name"]: artifact["dest"] for artifact in get_artifacts()}
+
+
+def sd_scripts_dir():
+    return os.getenv("SD_SCRIPTS_DIR", DEFAULT_SD_SCRIPTS_DIR)
+
+
+def train_script_path():
+    return os.path.join(sd_scripts_dir(), "flux_train_network.py")
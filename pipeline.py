@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Pipelined Job Execution
+Lets one worker hold several jobs at once so the CPU/network stages of
+queued jobs (image ingestion, dataset planning, uploads) overlap the
+GPU-bound training of the current one. Training and GPU captioning are gated
+by TrainingSlots: exactly one GPU user per visible GPU.
+
+    PIPELINE_JOBS=2     jobs in flight per worker (1 = sequential handler)
+
+Local queue driver (no RunPod needed), e.g. with the stub trainer:
+
+    WARM_TRAINER=1 TRAINER_BACKEND=stub python pipeline.py jobs.jsonl --concurrency 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+PIPELINE_JOBS = int(os.getenv("PIPELINE_JOBS", "1"))
+
+
+def visible_gpus():
+    """GPU ids training may use: CUDA_VISIBLE_DEVICES, else nvidia-smi, else [0]"""
+    visible = os.getenv("CUDA_VISIBLE_DEVICES")
+    if visible:
+        return [gpu.strip() for gpu in visible.split(",") if gpu.strip()]
+    try:
+        output = subprocess.run(["nvidia-smi", "--query-gpu=index", "--format=csv,noheader"],
+                                capture_output=True, text=True, timeout=10, check=True).stdout
+        gpus = [line.strip() for line in output.splitlines() if line.strip()]
+    except (OSError, subprocess.SubprocessError):
+        gpus = []
+    return gpus or ["0"]
+
+
+class TrainingSlots:
+    """One training slot per GPU; slot() blocks until a GPU is free and yields its id"""
+
+    def __init__(self, gpus=None):
+        self.gpus = list(gpus) if gpus is not None else visible_gpus()
+        self.primary = self.gpus[0]
+        self._free = queue.Queue()
+        for gpu in self.gpus:
+            self._free.put(gpu)
+
+    def device(self, gpu):
+        """In-process torch device for a slot's GPU id (indices follow the visible list)"""
+        return f"cuda:{self.gpus.index(gpu)}"
+
+    @contextmanager
+    def slot(self):
+        gpu = self._free.get()
+        try:
+            yield gpu
+        finally:
+            self._free.put(gpu)
+
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def get_training_slots():
+    """Process-wide TrainingSlots, created on first use"""
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = TrainingSlots()
+    return _slots
+
+
+def concurrency_modifier(current_concurrency):
+    """RunPod concurrency hook: keep PIPELINE_JOBS jobs in flight on this worker"""
+    return max(1, PIPELINE_JOBS)
+
+
+def make_async_handler(handler, max_jobs=PIPELINE_JOBS):
+    """Wrap the blocking handler so RunPod can run several jobs concurrently"""
+    # Each wrapper gets its own pool, sized for the jobs it is asked to overlap
+    executor = ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="job")
+
+    async def async_handler(job):
+        return await asyncio.get_running_loop().run_in_executor(executor, handler, job)
+
+    return async_handler
+
+
+async def _drive(jobs, async_handler, concurrency):
+    started = time.perf_counter()
+    gate = asyncio.Semaphore(concurrency)
+    timeline = []
+
+    async def one(job):
+        async with gate:
+            begin = time.perf_counter() - started
+            result = await async_handler(job)
+            timeline.append({"id": job["id"], "start": round(begin, 2),
+                             "end": round(time.perf_counter() - started, 2)})
+            return result
+
+    results = await asyncio.gather(*(one(job) for job in jobs))
+    return results, sorted(timeline, key=lambda entry: entry["start"])
+
+
+def run_local_queue(jobs, handler, concurrency=PIPELINE_JOBS):
+    """Feed jobs through the async handler like RunPod would; returns (results, timeline)"""
+    async_handler = make_async_handler(handler, concurrency)
+    return asyncio.run(_drive(jobs, async_handler, concurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("jobs", help="JSON lines file, one {\"id\": ..., \"input\": {...}} job per line")
+    parser.add_argument("--concurrency", type=int, default=max(2, PIPELINE_JOBS))
+    args = parser.parse_args()
+
+    with open(args.jobs) as f:
+        jobs = [json.loads(line) for line in f if line.strip()]
+
+    import handler_fluxgym
+    from trainer_worker import TRAINER_SOCKET, WARM_TRAINER, start_worker, wait_until_ready
+
+    worker = None
+    if WARM_TRAINER:
+        worker = start_worker()
+        wait_until_ready(TRAINER_SOCKET, timeout=60)
+    try:
+        results, timeline = run_local_queue(jobs, handler_fluxgym.handler, args.concurrency)
+    finally:
+        if worker is not None:
+            worker.terminate()
+
+    for entry, result in zip(jobs, results):
+        print(json.dumps({"id": entry["id"], "result": result}))
+    for entry in timeline:
+        print(f"{entry['id']:<20} {entry['start']:8.2f}s -> {entry['end']:8.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
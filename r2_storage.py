@@ -0,0 +1,190 @@
+"""
+Cloudflare R2 Storage
+One pooled S3 client per worker, multipart-tuned transfers and concurrent
+uploads of training outputs, optionally while training is still running
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+UPLOAD_CONCURRENCY = int(os.getenv("R2_UPLOAD_CONCURRENCY", "4"))
+MULTIPART_THRESHOLD = int(os.getenv("R2_MULTIPART_THRESHOLD", str(32 * 1024 * 1024)))
+MULTIPART_CHUNKSIZE = int(os.getenv("R2_MULTIPART_CHUNKSIZE", str(16 * 1024 * 1024)))
+MULTIPART_CONCURRENCY = int(os.getenv("R2_MULTIPART_CONCURRENCY", "8"))
+UPLOAD_MODES = ("all", "final", "stream")
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+_transfer_config = None
+
+
+def r2_settings():
+    """R2 credentials and bucket settings from the environment (web app variable names)"""
+    return {
+        "access_key": os.getenv('CLOUDFLARE_R2_ACCESS_KEY_ID'),
+        "secret_key": os.getenv('CLOUDFLARE_R2_SECRET_ACCESS_KEY'),
+        "account_id": os.getenv('CLOUDFLARE_ACCOUNT_ID'),
+        "bucket_name": os.getenv('R2_BUCKET_NAME'),
+        "public_url_base": os.getenv('R2_BUCKET_PUBLIC_URL'),
+        # Override for local S3 stand-ins (moto server, minio) in tests
+        "endpoint_url": os.getenv('R2_ENDPOINT_URL'),
+    }
+
+
+def get_r2_client(settings=None):
+    """Shared, thread-safe boto3 S3 client for the configured R2 account"""
+    global _client, _client_key, _transfer_config
+    settings = settings or r2_settings()
+    key = (settings["access_key"], settings["secret_key"], settings["account_id"], settings["endpoint_url"])
+    with _client_lock:
+        if _client is None or _client_key != key:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+            endpoint_url = settings["endpoint_url"] or f"https://{settings['account_id']}.r2.cloudflarestorage.com"
+            _client = boto3.client(
+                's3',
+                endpoint_url=endpoint_url,
+                aws_access_key_id=settings["access_key"],
+                aws_secret_access_key=settings["secret_key"],
+                config=Config(
+                    signature_version='s3v4',
+                    max_pool_connections=UPLOAD_CONCURRENCY * MULTIPART_CONCURRENCY,
+                    retries={"max_attempts": 5, "mode": "adaptive"},
+                ),
+            )
+            _transfer_config = TransferConfig(
+                multipart_threshold=MULTIPART_THRESHOLD,
+                multipart_chunksize=MULTIPART_CHUNKSIZE,
+                max_concurrency=MULTIPART_CONCURRENCY,
+                use_threads=True,
+            )
+            _client_key = key
+        return _client
+
+
+def get_transfer_config(settings=None):
+    """Multipart TransferConfig matching the shared client (created with it)"""
+    get_r2_client(settings)
+    return _transfer_config
+
+
+def public_url_for(object_name, settings=None):
+    settings = settings or r2_settings()
+    if settings["public_url_base"]:
+        return f"{settings['public_url_base']}/{object_name}"
+    return f"https://pub-{settings['account_id']}.r2.dev/{object_name}"
+
+
+def upload_to_r2(file_path, object_name):
+    """Upload file to Cloudflare R2 storage"""
+    try:
+        settings = r2_settings()
+        if not all([settings["access_key"], settings["secret_key"],
+                    settings["account_id"], settings["bucket_name"]]):
+            print("Missing R2 credentials, returning local path")
+            return file_path
+
+        client = get_r2_client(settings)
+        client.upload_file(file_path, settings["bucket_name"], object_name, Config=get_transfer_config(settings))
+
+        public_url = public_url_for(object_name, settings)
+        print(f"Uploaded to R2: {public_url}")
+        return public_url
+
+    except Exception as e:
+        print(f"R2 upload failed: {e}")
+        return file_path
+
+
+def all_uploaded(urls):
+    """True if every output made it to R2 (upload_to_r2 returns the local path on failure)"""
+    return bool(urls) and all(url.startswith("http") for url in urls)
+
+
+def lora_object_name(character_name, trigger_word, file_name, unique_id=None):
+    """Unique R2 key for one output file"""
+    unique_id = unique_id or str(uuid.uuid4())[:8]
+    return f"flux_lora/{character_name}_{trigger_word}_{unique_id}_{file_name}"
+
+
+def find_outputs(output_dir, output_name=None, final_only=False):
+    """All .safetensors files under output_dir, or only the final `<output_name>.safetensors`"""
+    outputs = []
+    for root, dirs, files in os.walk(output_dir):
+        # Training state directories (--save_state) are not deliverables
+        dirs[:] = [name for name in dirs if not name.endswith("-state")]
+        for file in sorted(files):
+            if not file.endswith('.safetensors'):
+                continue
+            if final_only and file != f"{output_name}.safetensors":
+                continue
+            outputs.append(os.path.join(root, file))
+    return outputs
+
+
+class OutputUploader:
+    """Uploads output files concurrently; can also watch the output dir during training"""
+
+    def __init__(self, character_name, trigger_word, concurrency=UPLOAD_CONCURRENCY):
+        self.character_name = character_name
+        self.trigger_word = trigger_word
+        # One id per job, so a LoRA and its .json sidecar share a key prefix
+        self.unique_id = str(uuid.uuid4())[:8]
+        self.executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        self.futures = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def submit(self, local_path):
+        """Queue one file for upload (once per path)"""
+        with self._lock:
+            if local_path not in self.futures:
+                object_name = lora_object_name(self.character_name, self.trigger_word,
+                                               os.path.basename(local_path), self.unique_id)
+                self.futures[local_path] = self.executor.submit(upload_to_r2, local_path, object_name)
+
+    def watch(self, output_dir, poll_seconds=5.0, settle_seconds=10.0):
+        """Upload checkpoints as soon as Kohya finishes writing them"""
+        def loop():
+            sizes = {}
+            while not self._stop.wait(poll_seconds):
+                for path in find_outputs(output_dir):
+                    if path in self.futures:
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    # Consider a checkpoint complete once its size stops changing
+                    if sizes.get(path) == st.st_size and time.time() - st.st_mtime >= settle_seconds:
+                        print(f"Checkpoint ready, uploading during training: {os.path.basename(path)}")
+                        self.submit(path)
+                    sizes[path] = st.st_size
+
+        self._watcher = threading.Thread(target=loop, daemon=True)
+        self._watcher.start()
+
+    def finish(self, local_paths):
+        """Stop watching, upload anything not yet queued and wait; returns (paths, urls)"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        for path in local_paths:
+            self.submit(path)
+        paths = sorted(self.futures)
+        urls = [self.futures[path].result() for path in paths]
+        self.executor.shutdown()
+        return paths, urls
+
+    def close(self):
+        """Stop watching and wait for in-flight uploads (used when training fails)"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        self.executor.shutdown()
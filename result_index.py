@@ -0,0 +1,176 @@
+"""
+Training Result Index
+Memoizes finished trainings by a canonical fingerprint of the training spec
+(image content, trigger word, character name, hyperparameters, launch
+profile, base model files and T5XXL precision), so duplicate submissions
+and client retries return the LoRA URLs already uploaded instead of
+training again.
+
+    RESULT_INDEX=local     local JSON file (RESULT_INDEX_PATH), per worker
+    RESULT_INDEX=r2        one JSON object per fingerprint in the R2 bucket
+    RESULT_INDEX=off       never memoize
+
+Jobs opt out with "force_retrain": true.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+RESULT_INDEX = os.getenv("RESULT_INDEX", "local")
+RESULT_INDEX_MODES = ("local", "r2", "off")
+RESULT_INDEX_PATH = os.getenv("RESULT_INDEX_PATH", "/tmp/fluxgym_cache/results.json")
+RESULT_INDEX_PREFIX = os.getenv("RESULT_INDEX_PREFIX", "flux_lora/index")
+# Bump when training flags change in a way that makes old LoRAs non-equivalent
+TRAINING_SPEC_VERSION = 1
+
+# Result fields stored in (and returned from) the index
+MEMO_FIELDS = ("public_urls", "trigger_word", "character_name", "training_steps", "schedule", "dataset",
+               "launch_profile", "compaction")
+
+
+def model_identity():
+    """Base model and text encoder files this worker trains against (config, not file hashes)"""
+    from model_registry import get_artifacts
+
+    models = {}
+    for artifact in get_artifacts():
+        identity = f"{artifact['repo_id']}/{artifact['filename']}"
+        # FLUX_MODEL_PATH-style overrides may point at a different file
+        if os.path.basename(artifact["dest"]) != artifact["filename"]:
+            identity += f"@{os.path.basename(artifact['dest'])}"
+        models[artifact["name"]] = identity
+    return models
+
+
+def spec_fingerprint(spec, image_hashes, profile_name):
+    """sha256 of the canonical training spec; image order does not matter"""
+    canonical = {
+        "version": TRAINING_SPEC_VERSION,
+        "images": sorted(image_hashes),
+        "trigger_word": spec["trigger_word"],
+        "character_name": spec["character_name"],
+        "steps": spec["schedule"]["max_train_steps"],
+        "batch_size": spec["schedule"]["batch_size"],
+        "resolution": spec["resolution"],
+        "captioner": spec["captioner"],
+        "upload_mode": spec["upload_mode"],
+        "launch_profile": profile_name,
+        "compact": spec.get("compact"),
+        "models": model_identity(),
+        "t5xxl_precision": os.getenv("T5XXL_PRECISION", "fp16").lower(),
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def memo_entry(result):
+    """Indexable copy of a successful result, or None if its outputs are not all in R2"""
+    from r2_storage import all_uploaded
+
+    if result.get("status") != "success" or not all_uploaded(result.get("public_urls") or []):
+        return None
+    return {**{field: result.get(field) for field in MEMO_FIELDS}, "created": time.time()}
+
+
+class LocalResultIndex:
+    """fingerprint -> result entry, in a JSON file on the worker"""
+
+    def __init__(self, path=RESULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, fingerprint):
+        with self._lock:
+            return self._load().get(fingerprint)
+
+    def put(self, fingerprint, entry):
+        with self._lock:
+            entries = self._load()
+            entries[fingerprint] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+
+
+class R2ResultIndex:
+    """One `<prefix>/<fingerprint>.json` object per entry, shared by every worker"""
+
+    def __init__(self, prefix=RESULT_INDEX_PREFIX):
+        self.prefix = prefix
+
+    def _key(self, fingerprint):
+        return f"{self.prefix}/{fingerprint}.json"
+
+    def get(self, fingerprint):
+        from r2_storage import get_r2_client, r2_settings
+
+        settings = r2_settings()
+        client = get_r2_client(settings)
+        try:
+            response = client.get_object(Bucket=settings["bucket_name"], Key=self._key(fingerprint))
+        except client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response["Body"].read())
+
+    def put(self, fingerprint, entry):
+        from r2_storage import get_r2_client, r2_settings
+
+        settings = r2_settings()
+        get_r2_client(settings).put_object(Bucket=settings["bucket_name"], Key=self._key(fingerprint),
+                                           Body=json.dumps(entry).encode("utf-8"),
+                                           ContentType="application/json")
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_result_index():
+    """Process-wide result index, or None when RESULT_INDEX=off"""
+    global _index
+    if RESULT_INDEX == "off":
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = R2ResultIndex() if RESULT_INDEX == "r2" else LocalResultIndex()
+    return _index
+
+
+def lookup(fingerprint):
+    """Memoized result for a fingerprint, or None (index errors count as a miss)"""
+    index = get_result_index()
+    if index is None:
+        return None
+    try:
+        entry = index.get(fingerprint)
+    except Exception as e:
+        print(f"Result index lookup failed, training anyway: {e}")
+        return None
+    if entry:
+        print(f"Result index hit for {fingerprint[:12]}, reusing {len(entry['public_urls'])} uploaded file(s)")
+    return entry
+
+
+def record(fingerprint, result):
+    """Store a successful, fully uploaded result under its fingerprint"""
+    index = get_result_index()
+    entry = memo_entry(result)
+    if index is None or entry is None:
+        return
+    try:
+        index.put(fingerprint, entry)
+    except Exception as e:
+        print(f"Could not record result in index: {e}")
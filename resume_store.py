@@ -0,0 +1,238 @@
+"""
+Resumable Training
+Mirrors a run's Kohya training state (`--save_state` directories) and LoRA
+checkpoints to durable storage while it trains. When the same spec comes
+back after the worker was preempted or timed out, the latest complete state
+is restored and passed to `--resume`, so only the steps since the last save
+are repeated.
+
+    RESUME_STORE=off        off | local | r2
+    RESUME_DIR=/runpod-volume/fluxgym_resume   (local: a network volume)
+    RESUME_SAVE_EVERY_STEPS=200                state cadence override
+
+Runs are keyed by the training spec fingerprint, so a retry with the same
+job id or a resubmission of the same spec both resume.
+"""
+
+import os
+import re
+import shutil
+import threading
+import time
+
+RESUME_STORE = os.getenv("RESUME_STORE", "off")
+RESUME_STORE_MODES = ("off", "local", "r2")
+RESUME_DIR = os.getenv("RESUME_DIR", "/runpod-volume/fluxgym_resume")
+RESUME_PREFIX = os.getenv("RESUME_PREFIX", "flux_lora/resume")
+RESUME_SAVE_EVERY_STEPS = int(os.getenv("RESUME_SAVE_EVERY_STEPS", "0"))
+RESUME_SYNC_SECONDS = float(os.getenv("RESUME_SYNC_SECONDS", "15"))
+
+# Kohya names step states `<output_name>-step<NNNNNNNN>-state`
+STATE_DIR_RE = re.compile(r"-step(\d+)-state$")
+COMPLETE_MARKER = ".complete"
+
+
+def is_state_dir(name):
+    return name.endswith("-state")
+
+
+def state_step(name):
+    match = STATE_DIR_RE.search(name)
+    return int(match.group(1)) if match else None
+
+
+class LocalStateStore:
+    """Files under <root>/<key>/<relpath> (e.g. on a RunPod network volume)"""
+
+    def __init__(self, root=RESUME_DIR):
+        self.root = root
+
+    def _path(self, key, relpath=""):
+        return os.path.join(self.root, key, relpath)
+
+    def put(self, key, relpath, local_path):
+        dest = self._path(key, relpath)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.tmp"
+        shutil.copyfile(local_path, tmp)
+        os.replace(tmp, dest)
+
+    def list(self, key):
+        base = self._path(key)
+        found = []
+        for dirpath, _, files in os.walk(base):
+            for name in files:
+                if not name.endswith(".tmp"):
+                    found.append(os.path.relpath(os.path.join(dirpath, name), base))
+        return found
+
+    def get(self, key, relpath, dest):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(self._path(key, relpath), dest)
+
+    def delete(self, key, relpaths=None):
+        if relpaths is None:
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            return
+        for relpath in relpaths:
+            try:
+                os.remove(self._path(key, relpath))
+            except FileNotFoundError:
+                pass
+
+
+class R2StateStore:
+    """Objects under <prefix>/<key>/<relpath> in the R2 bucket"""
+
+    def __init__(self, prefix=RESUME_PREFIX):
+        self.prefix = prefix
+
+    def _client(self):
+        from r2_storage import get_r2_client, r2_settings
+
+        settings = r2_settings()
+        return get_r2_client(settings), settings["bucket_name"]
+
+    def _key(self, key, relpath=""):
+        return f"{self.prefix}/{key}/{relpath}"
+
+    def put(self, key, relpath, local_path):
+        from r2_storage import get_transfer_config
+
+        client, bucket = self._client()
+        client.upload_file(local_path, bucket, self._key(key, relpath), Config=get_transfer_config())
+
+    def list(self, key):
+        client, bucket = self._client()
+        base = self._key(key)
+        found = []
+        for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=base):
+            found += [obj["Key"][len(base):] for obj in page.get("Contents", [])]
+        return found
+
+    def get(self, key, relpath, dest):
+        client, bucket = self._client()
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        client.download_file(bucket, self._key(key, relpath), dest)
+
+    def delete(self, key, relpaths=None):
+        client, bucket = self._client()
+        relpaths = self.list(key) if relpaths is None else list(relpaths)
+        for start in range(0, len(relpaths), 1000):
+            chunk = relpaths[start:start + 1000]
+            client.delete_objects(Bucket=bucket, Delete={
+                "Objects": [{"Key": self._key(key, relpath)} for relpath in chunk]})
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_resume_store():
+    """Process-wide durable state store, or None when RESUME_STORE=off"""
+    global _store
+    if RESUME_STORE == "off":
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = R2StateStore() if RESUME_STORE == "r2" else LocalStateStore()
+    return _store
+
+
+class ResumableRun:
+    """Restores a run from the store and mirrors its new states/checkpoints back"""
+
+    def __init__(self, store, key, output_dir, settle_seconds=10.0):
+        self.store = store
+        self.key = key
+        self.output_dir = output_dir
+        self.settle_seconds = settle_seconds
+        self.synced = set()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def restore(self):
+        """Fetch checkpoints and the latest complete state; returns (state dir, step) or (None, 0)"""
+        try:
+            remote = self.store.list(self.key)
+        except Exception as e:
+            print(f"Resume store unavailable, starting from scratch: {e}")
+            return None, 0
+        complete = {relpath.split("/")[0] for relpath in remote if relpath.endswith(f"/{COMPLETE_MARKER}")}
+        states = sorted((state_step(name), name) for name in complete if state_step(name) is not None)
+        if not states:
+            return None, 0
+        step, state = states[-1]
+        for relpath in remote:
+            top = relpath.split("/")[0]
+            if ("/" not in relpath and relpath.endswith(".safetensors")) or top == state:
+                self.store.get(self.key, relpath, os.path.join(self.output_dir, relpath))
+                self.synced.add(relpath)
+        print(f"Resuming from {state} (step {step})")
+        return os.path.join(self.output_dir, state), step
+
+    def _settled(self, paths):
+        now = time.time()
+        return all(now - os.stat(path).st_mtime >= self.settle_seconds for path in paths)
+
+    def sync(self, final=False):
+        """Push new checkpoints and the newest finished state, dropping older states"""
+        try:
+            names = sorted(os.listdir(self.output_dir))
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.output_dir, name)
+            if name.endswith(".safetensors") and name not in self.synced:
+                if final or self._settled([path]):
+                    self.store.put(self.key, name, path)
+                    self.synced.add(name)
+
+        states = sorted((state_step(name), name) for name in names if state_step(name) is not None)
+        if not states:
+            return
+        step, state = states[-1]
+        marker = f"{state}/{COMPLETE_MARKER}"
+        state_path = os.path.join(self.output_dir, state)
+        files = sorted(name for name in os.listdir(state_path)
+                       if name != COMPLETE_MARKER and os.path.isfile(os.path.join(state_path, name)))
+        if marker in self.synced or not files:
+            return
+        if not (final or self._settled([os.path.join(state_path, name) for name in files])):
+            return
+        for name in files:
+            self.store.put(self.key, f"{state}/{name}", os.path.join(state_path, name))
+        # The marker goes last so a half-uploaded state is never resumed from
+        open(os.path.join(state_path, COMPLETE_MARKER), "w").close()
+        self.store.put(self.key, marker, os.path.join(state_path, COMPLETE_MARKER))
+        self.synced.add(marker)
+        stale = [relpath for relpath in self.store.list(self.key)
+                 if is_state_dir(relpath.split("/")[0]) and relpath.split("/")[0] != state]
+        if stale:
+            self.store.delete(self.key, stale)
+        print(f"Training state at step {step} saved to durable storage")
+
+    def watch(self, poll_seconds=RESUME_SYNC_SECONDS):
+        def loop():
+            while not self._stop.wait(poll_seconds):
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"Resume sync failed (will retry): {e}")
+
+        self._watcher = threading.Thread(target=loop, daemon=True)
+        self._watcher.start()
+
+    def finish(self, success):
+        """Stop mirroring; a finished run's durable copy is dropped, a failed one flushed"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        try:
+            if success:
+                self.store.delete(self.key)
+            else:
+                self.sync(final=True)
+        except Exception as e:
+            print(f"Resume store cleanup failed: {e}")
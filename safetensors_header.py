@@ -0,0 +1,56 @@
+"""
+Safetensors Header Reader
+Parses and sanity-checks a .safetensors/.sft header through mmap, without
+loading any tensor data - cheap enough for boot-time and readiness checks
+"""
+
+import json
+import mmap
+import os
+import struct
+
+MAX_HEADER_BYTES = 100 * 1024 * 1024
+
+
+class SafetensorsHeaderError(ValueError):
+    """Raised when a file is not a well-formed safetensors file"""
+
+
+def read_header(path):
+    """Return the parsed header dict (tensor name -> dtype/shape/data_offsets)"""
+    size = os.path.getsize(path)
+    if size < 8:
+        raise SafetensorsHeaderError(f"{path}: file too small ({size} bytes)")
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        (header_len,) = struct.unpack("<Q", mm[:8])
+        if header_len > MAX_HEADER_BYTES or 8 + header_len > size:
+            raise SafetensorsHeaderError(f"{path}: invalid header length {header_len}")
+        try:
+            header = json.loads(bytes(mm[8:8 + header_len]))
+        except ValueError as e:
+            raise SafetensorsHeaderError(f"{path}: header is not valid JSON ({e})") from e
+
+    data_size = size - 8 - header_len
+    end = 0
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        begin, stop = info["data_offsets"]
+        if not 0 <= begin <= stop <= data_size:
+            raise SafetensorsHeaderError(f"{path}: tensor {name} lies outside the file (truncated?)")
+        end = max(end, stop)
+    if end != data_size:
+        raise SafetensorsHeaderError(
+            f"{path}: tensor data ends at {end} but file holds {data_size} bytes")
+    return header
+
+
+def data_start(path):
+    """Byte offset of the tensor data (8-byte length prefix + header)"""
+    with open(path, "rb") as f:
+        (header_len,) = struct.unpack("<Q", f.read(8))
+    return 8 + header_len
+
+
+def tensor_count(header):
+    return sum(1 for name in header if name != "__metadata__")
@@ -0,0 +1,64 @@
+"""
+Startup Profiler
+Records how long each phase of worker startup takes (dependency check,
+imports, model presence check, first job) so time-to-ready can be reported
+by `handler_fluxgym.py --profile-startup` and tracked by bench_startup.py
+"""
+
+import importlib
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """Ordered phase timings measured from module import of the handler"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.phases.append({"phase": name, "ms": round(seconds * 1000, 2)})
+
+    def time_import(self, module_name):
+        """Import a module (normally loaded lazily) and record how long it took"""
+        already_loaded = module_name in sys.modules
+        started = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            self.phases.append({"phase": f"import:{module_name}", "ms": None, "error": str(e)})
+            return
+        self.record(f"import:{module_name}" + (" (cached)" if already_loaded else ""),
+                    time.perf_counter() - started)
+
+    def elapsed_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+    def report(self):
+        return {"time_to_ready_ms": self.elapsed_ms(), "phases": list(self.phases)}
+
+    def print_report(self, as_json=False):
+        report = self.report()
+        if as_json:
+            print(json.dumps(report))
+            return report
+        print("⏱️  Startup profile")
+        for entry in report["phases"]:
+            ms = "failed" if entry["ms"] is None else f"{entry['ms']:10.2f} ms"
+            print(f"   {entry['phase']:<40} {ms}")
+        print(f"   {'time to ready':<40} {report['time_to_ready_ms']:10.2f} ms")
+        return report
+
+
+STARTUP = StartupProfile()
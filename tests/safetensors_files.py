@@ -0,0 +1,27 @@
+"""
+Tiny safetensors files for tests that must not depend on torch or safetensors
+"""
+
+import json
+import struct
+
+
+def write_safetensors(path, tensors, metadata=None):
+    """Minimal safetensors writer: tensors is {name: (dtype, shape, raw bytes)}"""
+    header = {"__metadata__": metadata} if metadata else {}
+    offset = 0
+    for name, (dtype, shape, data) in tensors.items():
+        header[name] = {"dtype": dtype, "shape": list(shape), "data_offsets": [offset, offset + len(data)]}
+        offset += len(data)
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for _, _, data in tensors.values():
+            f.write(data)
+    return path
+
+
+def fake_model(path, floats):
+    return write_safetensors(path, {"weight": ("F32", [floats], struct.pack(f"<{floats}f", *range(floats)))})
@@ -0,0 +1,74 @@
+"""
+Batched, cached captioning with the CPU stub captioner
+"""
+
+import pytest
+
+from captioning import CaptionCache, CaptioningError, StubCaptioner, caption_images, clean_caption
+
+
+class RecordingCaptioner(StubCaptioner):
+    """Stub captioner that remembers the batches it was asked for"""
+
+    def __init__(self):
+        super().__init__("a woman in a red coat")
+        self.batches = []
+
+    def caption_batch(self, paths, device=None):
+        self.batches.append(list(paths))
+        return super().caption_batch(paths, device)
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for n in range(5):
+        path = tmp_path / f"image_{n:03d}.jpg"
+        path.write_bytes(f"image {n}".encode())
+        paths.append(str(path))
+    return paths
+
+
+def test_images_are_captioned_in_batches_with_the_trigger_first(images):
+    captioner = RecordingCaptioner()
+
+    captions = caption_images(images, captioner, "ohwx", batch_size=2)
+
+    assert [len(batch) for batch in captioner.batches] == [2, 2, 1]
+    assert captions == {path: "ohwx, a woman in a red coat" for path in images}
+
+
+def test_second_run_is_served_from_the_cache(images, tmp_path):
+    cache_path = str(tmp_path / "cache" / "captions.json")
+    first = RecordingCaptioner()
+    caption_images(images[:3], first, "ohwx", cache=CaptionCache(cache_path), batch_size=2)
+
+    # A fresh cache object reads what the first run persisted
+    second = RecordingCaptioner()
+    captions = caption_images(images, second, "sks", cache=CaptionCache(cache_path), batch_size=2)
+
+    assert second.batches == [images[3:]]
+    assert captions == {path: "sks, a woman in a red coat" for path in images}
+
+
+def test_cache_is_keyed_by_captioner_identity(images, tmp_path):
+    cache = CaptionCache(str(tmp_path / "captions.json"))
+    caption_images(images, StubCaptioner("a man"), "ohwx", cache=cache)
+
+    other = RecordingCaptioner()
+    caption_images(images, other, "ohwx", cache=cache, batch_size=8)
+
+    assert other.batches == [images]
+
+
+def test_captioner_failure_raises_captioning_error(images):
+    class Broken(StubCaptioner):
+        def caption_batch(self, paths, device=None):
+            raise RuntimeError("out of memory")
+
+    with pytest.raises(CaptioningError, match="stub failed on a batch of 5: out of memory"):
+        caption_images(images, Broken(), "ohwx")
+
+
+def test_clean_caption_strips_florence_boilerplate():
+    assert clean_caption("The image shows  a woman\nin a red coat.") == "a woman in a red coat"
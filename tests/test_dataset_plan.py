@@ -0,0 +1,20 @@
+"""
+Resolution and aspect-ratio bucket planning for dataset.toml
+"""
+
+from dataset_plan import plan_buckets
+
+
+def test_plan_buckets_square_images_train_unbucketed():
+    assert plan_buckets([(1024, 1024), (1000, 1050)], 1024) == {"enable_bucket": False}
+
+
+def test_plan_buckets_cover_portrait_images_without_upscaling():
+    buckets = plan_buckets([(768, 1344), (1024, 1024)], 1024)
+    assert buckets == {
+        "enable_bucket": True,
+        "min_bucket_reso": 768,
+        "max_bucket_reso": 1408,
+        "bucket_reso_steps": 64,
+        "bucket_no_upscale": True,
+    }
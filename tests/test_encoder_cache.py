@@ -0,0 +1,123 @@
+"""
+Latent and text-encoder cache keys, and the store/restore round trip
+through a job dataset directory
+"""
+
+import os
+
+import pytest
+
+from encoder_cache import EncoderCache, encoder_identity
+from model_provisioner import _write_sidecar
+
+IDENTITY = {"vae": "vae-sha", "text": "text-sha"}
+
+
+def _keys(image_sha="img", caption="ohwx, a woman", identity=IDENTITY, resolution=1024):
+    return EncoderCache._keys(image_sha, caption, identity, resolution)
+
+
+def test_latent_key_follows_image_resolution_and_vae():
+    latent, _ = _keys()
+
+    assert _keys(image_sha="other")[0] != latent
+    assert _keys(resolution=768)[0] != latent
+    assert _keys(identity={**IDENTITY, "vae": "other-vae"})[0] != latent
+    # Captions and text encoders do not touch the latents
+    assert _keys(caption="sks, a man")[0] == latent
+    assert _keys(identity={**IDENTITY, "text": "other-te"})[0] == latent
+
+
+def test_text_key_follows_caption_and_text_encoders():
+    _, text = _keys()
+
+    assert _keys(caption="sks, a man")[1] != text
+    assert _keys(identity={**IDENTITY, "text": "other-te"})[1] != text
+    assert _keys(image_sha="other")[1] == text
+    assert _keys(resolution=768)[1] == text
+    assert _keys(identity={**IDENTITY, "vae": "other-vae"})[1] == text
+    assert _keys(caption=None)[1] is None
+
+
+def test_encoder_identity_tracks_each_model_file(tmp_path):
+    paths = {}
+    for name in ("vae", "clip_l", "t5xxl"):
+        paths[name] = str(tmp_path / f"{name}.safetensors")
+        with open(paths[name], "wb") as f:
+            f.write(b"weights")
+        _write_sidecar(paths[name], 7, f"{name}-sha")
+    identity = encoder_identity(paths)
+
+    _write_sidecar(paths["t5xxl"], 7, "t5xxl-fp8-sha")
+    changed = encoder_identity(paths)
+    assert changed["text"] != identity["text"]
+    assert changed["vae"] == identity["vae"]
+
+    _write_sidecar(paths["vae"], 7, "other-vae-sha")
+    assert encoder_identity(paths)["vae"] != identity["vae"]
+
+
+def _dataset(path, caption="ohwx, a woman", image=b"image bytes"):
+    path.mkdir()
+    (path / "image_000.jpg").write_bytes(image)
+    (path / "image_000.txt").write_text(caption)
+    return str(path)
+
+
+def _kohya_outputs(dataset_dir):
+    """The cache files Kohya writes next to an image at one bucket resolution"""
+    for name, data in (("image_000_1024x1024_flux.npz", b"latents"), ("image_000_flux_te.npz", b"te")):
+        with open(os.path.join(dataset_dir, name), "wb") as f:
+            f.write(data)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EncoderCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+
+
+def test_restore_copies_cached_outputs_into_a_new_job(cache, tmp_path):
+    first = _dataset(tmp_path / "job1")
+    _kohya_outputs(first)
+    assert cache.store(first, IDENTITY, 1024) == 2
+
+    second = _dataset(tmp_path / "job2")
+    assert cache.restore(second, IDENTITY, 1024) == (2, 0)
+
+    latent = os.path.join(second, "image_000_1024x1024_flux.npz")
+    with open(latent, "rb") as f:
+        assert f.read() == b"latents"
+    # Copies, not hard links: Kohya may rewrite a stale file in place
+    assert os.stat(latent).st_nlink == 1
+    with open(latent, "wb") as f:
+        f.write(b"rewritten by kohya")
+    third = _dataset(tmp_path / "job3")
+    cache.restore(third, IDENTITY, 1024)
+    with open(os.path.join(third, "image_000_1024x1024_flux.npz"), "rb") as f:
+        assert f.read() == b"latents"
+
+
+def test_changed_inputs_miss_the_cache(cache, tmp_path):
+    first = _dataset(tmp_path / "job1")
+    _kohya_outputs(first)
+    cache.store(first, IDENTITY, 1024)
+
+    assert cache.restore(_dataset(tmp_path / "caption", caption="sks, a man"), IDENTITY, 1024) == (1, 1)
+    assert cache.restore(_dataset(tmp_path / "resolution"), IDENTITY, 768) == (1, 1)
+    assert cache.restore(_dataset(tmp_path / "vae"), {**IDENTITY, "vae": "other"}, 1024) == (1, 1)
+    assert cache.restore(_dataset(tmp_path / "te"), {**IDENTITY, "text": "other"}, 1024) == (1, 1)
+    assert cache.restore(_dataset(tmp_path / "image", image=b"other image"), IDENTITY, 1024) == (1, 1)
+    assert not os.path.exists(os.path.join(str(tmp_path / "resolution"), "image_000_1024x1024_flux.npz"))
+
+
+def test_index_survives_a_new_cache_object(cache, tmp_path):
+    first = _dataset(tmp_path / "job1")
+    _kohya_outputs(first)
+    cache.store(first, IDENTITY, 1024)
+
+    reopened = EncoderCache(cache.root, max_bytes=1 << 20)
+    assert reopened.restore(_dataset(tmp_path / "job2"), IDENTITY, 1024) == (2, 0)
+
+    # Evicted objects are dropped from the index instead of half-restoring
+    reopened.evict(max_bytes=0)
+    assert reopened.restore(_dataset(tmp_path / "job3"), IDENTITY, 1024) == (0, 2)
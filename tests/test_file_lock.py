@@ -0,0 +1,76 @@
+"""
+Stale-lock breaking and live-holder waiting for the cross-worker FileLock
+"""
+
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from file_lock import FileLock, LockTimeout
+
+
+def _foreign_lock(path, age):
+    with open(path, "w") as f:
+        json.dump({"host": f"not-{socket.gethostname()}", "pid": 1, "token": "theirs",
+                   "created": time.time() - age}, f)
+    os.utime(path, (time.time() - age, time.time() - age))
+
+
+def test_file_lock_breaks_a_lock_that_stopped_heartbeating(tmp_path):
+    path = str(tmp_path / "model.lock")
+    _foreign_lock(path, age=120)
+
+    with FileLock(path, stale_after=60, poll=0.01, timeout=1) as lock:
+        with open(path) as f:
+            assert json.load(f)["token"] == lock.token
+    assert not os.path.exists(path)
+    assert [name for name in os.listdir(tmp_path) if ".stale." in name] == []
+
+
+def test_file_lock_waits_on_a_live_holder(tmp_path):
+    path = str(tmp_path / "model.lock")
+    _foreign_lock(path, age=0)
+
+    with pytest.raises(LockTimeout):
+        FileLock(path, stale_after=60, poll=0.01, timeout=0.05).acquire()
+    with open(path) as f:
+        assert json.load(f)["token"] == "theirs"
+
+
+def test_slow_breaker_puts_back_a_lock_taken_after_the_stale_one(tmp_path):
+    path = str(tmp_path / "model.lock")
+    _foreign_lock(path, age=120)
+    slow = FileLock(path, stale_after=60, poll=0.01, timeout=1)
+    # Both waiters read the same stale record...
+    stale = slow._stale_snapshot()
+    assert stale is not None
+
+    # ...the fast one breaks it and takes the lock...
+    with FileLock(path, stale_after=60, poll=0.01, timeout=1) as fast:
+        # ...before the slow one gets to its rename
+        slow._break_stale(stale)
+
+        with open(path) as f:
+            assert json.load(f)["token"] == fast.token
+        with pytest.raises(LockTimeout):
+            slow.acquire()
+    assert not os.path.exists(path)
+    assert [name for name in os.listdir(tmp_path) if ".stale." in name] == []
+
+
+def test_half_written_fresh_lock_is_not_broken(tmp_path):
+    path = str(tmp_path / "model.lock")
+    _foreign_lock(path, age=120)
+    waiter = FileLock(path, stale_after=60, poll=0.01)
+    stale = waiter._stale_snapshot()
+
+    # Another worker replaced the stale lock and has not written its record yet
+    os.remove(path)
+    open(path, "w").close()
+    waiter._break_stale(stale)
+
+    assert os.path.exists(path)
+    assert waiter._stale_snapshot() is None
@@ -0,0 +1,128 @@
+"""
+Parallel image ingestion against a local http.server: retries with backoff,
+ETag revalidation through the worker cache and the per-job deadline
+"""
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import image_downloader
+from file_cache import ImageCache
+from image_downloader import ImageDownloadError, iter_downloads
+
+JPEG_BODY = b"\xff\xd8\xff\xe0" + b"jpeg" * 256
+PNG_BODY = b"\x89PNG\r\n\x1a\n" + b"png!" * 256
+
+
+class ImageServer(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = {}
+    hits = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        with self.lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+            failing = self.failures.get(path, 0) > 0
+            if failing:
+                self.failures[path] -= 1
+
+        if failing:
+            self._send(503)
+        elif path == "/flaky.jpg":
+            self._send(200, JPEG_BODY, {"Content-Type": "image/jpeg"})
+        elif path == "/tagged.png":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self._send(304, headers={"ETag": '"v1"'})
+            else:
+                self._send(200, PNG_BODY, {"Content-Type": "image/png", "ETag": '"v1"'})
+        elif path == "/slow.jpg":
+            # Headers and a first chunk, then stall far past the job deadline
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(1 << 20))
+            self.end_headers()
+            self.wfile.write(b"\xff\xd8" + b"\0" * 1022)
+            self.wfile.flush()
+            time.sleep(3)
+        else:
+            self._send(404)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(image_downloader, "BACKOFF_SECONDS", 0.01)
+    ImageServer.failures = {}
+    ImageServer.hits = {}
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ImageServer)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_transient_errors_are_retried_with_backoff(server, tmp_path):
+    ImageServer.failures["/flaky.jpg"] = 2
+
+    results = dict(iter_downloads([f"{server}/flaky.jpg"], str(tmp_path), retries=3))
+
+    assert results == {0: str(tmp_path / "image_000.jpg")}
+    assert ImageServer.hits["/flaky.jpg"] == 3
+    with open(results[0], "rb") as f:
+        assert f.read() == JPEG_BODY
+
+
+def test_retries_are_bounded(server, tmp_path):
+    ImageServer.failures["/flaky.jpg"] = 5
+
+    with pytest.raises(ImageDownloadError, match="after 3 attempts"):
+        list(iter_downloads([f"{server}/flaky.jpg"], str(tmp_path), retries=2))
+    assert ImageServer.hits["/flaky.jpg"] == 3
+
+
+def test_unchanged_etag_links_the_cached_copy(server, tmp_path):
+    cache = ImageCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    url = f"{server}/tagged.png"
+
+    first = dict(iter_downloads([f"{url}?sig=1"], str(tmp_path / "job1"), cache=cache))
+    # Presigned query strings differ between jobs; the cache keys on the path
+    second = dict(iter_downloads([f"{url}?sig=2"], str(tmp_path / "job2"), cache=cache))
+
+    assert first == {0: str(tmp_path / "job1" / "image_000.png")}
+    assert second == {0: str(tmp_path / "job2" / "image_000.png")}
+    assert ImageServer.hits["/tagged.png"] == 2
+    assert os.path.samefile(second[0], cache.object_path(cache.lookup(url)["sha256"]))
+    with open(second[0], "rb") as f:
+        assert f.read() == PNG_BODY
+
+
+def test_job_deadline_stops_every_download(server, tmp_path):
+    urls = [f"{server}/slow.jpg", f"{server}/flaky.jpg"]
+
+    started = time.monotonic()
+    with pytest.raises(ImageDownloadError):
+        list(iter_downloads(urls, str(tmp_path), concurrency=1, retries=0, job_timeout=0.3))
+
+    # Returns near the deadline, not when the server finally gives up, and
+    # leaves no partial file behind for later stages to pick up
+    assert time.monotonic() - started < 2
+    assert os.listdir(tmp_path) == []
+    assert "/flaky.jpg" not in ImageServer.hits
@@ -0,0 +1,98 @@
+"""
+Format sniffing, rejection of bad inputs, EXIF rotation and downscaling of
+training images; skipped without Pillow
+"""
+
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from image_preprocess import ImageValidationError, preprocess_image, sniff_format
+
+
+def _image(path, size, fmt, color=(200, 30, 30), exif=None):
+    image = Image.new("RGB", size, color)
+    if exif is not None:
+        image.save(path, format=fmt, exif=exif)
+    else:
+        image.save(path, format=fmt)
+    return str(path)
+
+
+def test_sniff_format_trusts_the_header_not_the_extension(tmp_path):
+    assert sniff_format(_image(tmp_path / "a.jpg", (8, 8), "PNG")) == ("png", ".png")
+    assert sniff_format(_image(tmp_path / "b.png", (8, 8), "JPEG")) == ("jpeg", ".jpg")
+    assert sniff_format(_image(tmp_path / "c.jpg", (8, 8), "WEBP")) == ("webp", ".webp")
+    (tmp_path / "d.jpg").write_text("<html>Access denied</html>")
+    assert sniff_format(str(tmp_path / "d.jpg")) == (None, None)
+
+
+def test_wrong_extension_is_renamed_to_the_real_format(tmp_path):
+    path = _image(tmp_path / "image_000.jpg", (512, 512), "PNG")
+
+    result = preprocess_image(path, resolution=1024, min_side=256)
+
+    assert result == {"path": str(tmp_path / "image_000.png"), "width": 512, "height": 512, "format": "png"}
+    assert os.listdir(tmp_path) == ["image_000.png"]
+
+
+def test_non_image_is_rejected(tmp_path):
+    path = tmp_path / "image_000.jpg"
+    path.write_text("<html>Access denied</html>")
+
+    with pytest.raises(ImageValidationError, match="not a supported image format"):
+        preprocess_image(str(path))
+
+
+def test_truncated_image_is_rejected(tmp_path):
+    path = _image(tmp_path / "image_000.jpg", (512, 512), "JPEG")
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+
+    with pytest.raises(ImageValidationError, match="corrupt or unreadable"):
+        preprocess_image(path, resolution=1024, min_side=256)
+
+
+def test_undersized_image_is_rejected(tmp_path):
+    path = _image(tmp_path / "image_000.jpg", (1024, 200), "JPEG")
+
+    with pytest.raises(ImageValidationError, match="1024x200 is smaller than the 256px minimum side"):
+        preprocess_image(path, resolution=1024, min_side=256)
+
+
+def test_exif_rotation_is_applied_and_dropped(tmp_path):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored sideways, displayed rotated 90 degrees clockwise
+    path = _image(tmp_path / "image_000.jpg", (400, 300), "JPEG", exif=exif.tobytes())
+
+    result = preprocess_image(path, resolution=1024, min_side=256)
+
+    assert (result["width"], result["height"]) == (300, 400)
+    with Image.open(result["path"]) as image:
+        assert image.size == (300, 400)
+        assert image.getexif().get(0x0112, 1) == 1
+
+
+def test_oversized_image_is_shrunk_to_the_training_resolution(tmp_path):
+    path = _image(tmp_path / "image_000.png", (3000, 2000), "PNG")
+    original = os.stat(path).st_ino
+
+    result = preprocess_image(path, resolution=1024, min_side=256)
+
+    assert (result["width"], result["height"]) == (1536, 1024)
+    with Image.open(result["path"]) as image:
+        assert image.size == (1536, 1024)
+    # Rewritten as a new file, so a hard-linked cache copy is never modified
+    assert os.stat(result["path"]).st_ino != original
+
+
+def test_image_already_at_size_is_left_alone(tmp_path):
+    path = _image(tmp_path / "image_000.jpg", (1024, 1024), "JPEG")
+    mtime = os.stat(path).st_mtime_ns
+
+    assert preprocess_image(path, resolution=1024, min_side=256)["path"] == path
+    assert os.stat(path).st_mtime_ns == mtime
@@ -0,0 +1,45 @@
+"""
+Launch profile selection from injected GPU memory and CPU counts
+"""
+
+import pytest
+
+from launch_profile import get_launch_profile, select_profile
+
+
+@pytest.fixture(autouse=True)
+def fresh_profile():
+    get_launch_profile.cache_clear()
+    yield
+    get_launch_profile.cache_clear()
+
+
+@pytest.mark.parametrize("vram_gb, cpu_count, name, workers, threads", [
+    ("0", "1", "low", 1, 1),
+    ("12", "4", "low", 3, 2),
+    ("16", "8", "mid", 7, 4),
+    ("24", "16", "high", 8, 8),
+    ("40", "32", "xl", 8, 8),
+    ("80", "2", "xxl", 1, 1),
+])
+def test_detected_hardware_picks_the_profile(monkeypatch, vram_gb, cpu_count, name, workers, threads):
+    monkeypatch.setenv("GPU_VRAM_GB", vram_gb)
+    monkeypatch.setenv("CPU_COUNT", cpu_count)
+
+    profile = get_launch_profile()
+
+    assert profile["name"] == name
+    assert profile["vram_gb"] == float(vram_gb)
+    assert profile["data_loader_workers"] == workers
+    assert profile["cpu_threads_per_process"] == threads
+
+
+def test_memory_saving_flags_are_dropped_on_large_cards():
+    assert "--split_mode" in select_profile(12, 4, name=None)["flags"]
+    assert "--fp8_base" not in select_profile(48, 4, name=None)["flags"]
+
+
+def test_profile_can_be_forced_by_name():
+    assert select_profile(80, 8, name="low")["name"] == "low"
+    with pytest.raises(ValueError, match="Unknown LAUNCH_PROFILE 'huge'"):
+        select_profile(80, 8, name="huge")
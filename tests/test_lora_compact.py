@@ -0,0 +1,73 @@
+"""
+SVD rank reduction of trained LoRAs before upload; skipped without numpy
+"""
+
+import json
+import os
+
+import pytest
+
+from safetensors_files import write_safetensors
+
+
+def _lora(path, np, rank=32, true_rank=4, alpha=16.0):
+    rng = np.random.default_rng(0)
+    # The weight delta really has rank 4; the remaining columns are left at zero
+    delta = rng.standard_normal((48, true_rank)) @ rng.standard_normal((true_rank, 64))
+    up = np.zeros((48, rank), dtype=np.float32)
+    down = np.zeros((rank, 64), dtype=np.float32)
+    up[:, :true_rank] = rng.standard_normal((48, true_rank))
+    down[:true_rank] = np.linalg.lstsq(up[:, :true_rank], delta, rcond=None)[0]
+    prefix = "lora_unet_double_blocks_0_img_attn_proj"
+    write_safetensors(path, {
+        f"{prefix}.lora_down.weight": ("F32", down.shape, down.astype("<f4").tobytes()),
+        f"{prefix}.lora_up.weight": ("F32", up.shape, up.astype("<f4").tobytes()),
+        f"{prefix}.alpha": ("F32", [], np.float32(alpha).tobytes()),
+    }, metadata={"ss_network_dim": str(rank), "ss_network_alpha": str(alpha)})
+    return prefix, (up @ down) * (alpha / rank)
+
+
+def _load(path, np):
+    from safetensors_header import data_start, read_header
+
+    header = read_header(path)
+    base = data_start(path)
+    with open(path, "rb") as f:
+        raw = f.read()
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        begin, end = info["data_offsets"]
+        tensors[name] = np.frombuffer(raw[base + begin:base + end], dtype="<f4").reshape(info["shape"])
+    return header, tensors
+
+
+def test_compact_outputs_reduces_rank_of_final_checkpoint(tmp_path):
+    np = pytest.importorskip("numpy")
+    from lora_compact import compact_outputs, compaction_options
+
+    intermediate = str(tmp_path / "hero-step00000500.safetensors")
+    final = str(tmp_path / "hero.safetensors")
+    _lora(intermediate, np)
+    prefix, expected = _lora(final, np)
+
+    files, summaries = compact_outputs([intermediate, final], "hero",
+                                       compaction_options({"select": "final", "rank": 4}))
+
+    compacted = str(tmp_path / "hero-compact.safetensors")
+    assert files == [compacted, f"{compacted}.json"]
+    assert summaries[0]["source"] == "hero.safetensors"
+    assert summaries[0]["rank"] == {"max": 4, "min": 4}
+    assert summaries[0]["bytes"] < summaries[0]["source_bytes"]
+
+    header, tensors = _load(compacted, np)
+    down, up = tensors[f"{prefix}.lora_down.weight"], tensors[f"{prefix}.lora_up.weight"]
+    alpha = float(tensors[f"{prefix}.alpha"])
+    assert down.shape == (4, 64) and up.shape == (48, 4)
+    assert header["__metadata__"]["ss_network_dim"] == "4"
+    assert np.allclose((up @ down) * (alpha / 4), expected, atol=1e-3)
+
+    with open(f"{compacted}.json") as f:
+        sidecar = json.load(f)
+    assert sidecar["size"] == os.path.getsize(compacted)
@@ -0,0 +1,95 @@
+"""
+Offline checks for model provisioning: artifacts come from a fake local hub
+(hub_dir / MODEL_HUB_DIR), so nothing here needs a GPU or network access
+"""
+
+import json
+import os
+
+import pytest
+
+import model_provisioner
+from model_provisioner import fetch_artifact, is_complete
+from safetensors_files import fake_model
+
+
+@pytest.fixture
+def hub(tmp_path):
+    """A local hub holding one model, and the artifact spec that points at it"""
+    hub_dir = tmp_path / "hub"
+    (hub_dir / "black-forest-labs" / "FLUX.1-dev").mkdir(parents=True)
+    fake_model(str(hub_dir / "black-forest-labs" / "FLUX.1-dev" / "flux1-dev.safetensors"), 256)
+    (tmp_path / "models").mkdir()
+    artifact = {"name": "flux", "repo_id": "black-forest-labs/FLUX.1-dev", "filename": "flux1-dev.safetensors",
+                "dest": str(tmp_path / "models" / "flux1-dev.safetensors"), "gated": False}
+    return str(hub_dir), artifact
+
+
+def _hub_bytes(hub_dir, artifact):
+    with open(os.path.join(hub_dir, artifact["repo_id"], artifact["filename"]), "rb") as f:
+        return f.read()
+
+
+def test_truncated_model_without_sidecar_is_downloaded_again(hub):
+    hub_dir, artifact = hub
+    # A worker killed mid-copy leaves a short file behind and never writes the sidecar
+    with open(artifact["dest"], "wb") as f:
+        f.write(_hub_bytes(hub_dir, artifact)[:-100])
+
+    assert not is_complete(artifact, hub_dir=hub_dir)
+    assert not is_complete(artifact, hub_dir=hub_dir, remote=False)
+
+    assert fetch_artifact(artifact, hub_dir=hub_dir) == artifact["dest"]
+    with open(artifact["dest"], "rb") as f:
+        assert f.read() == _hub_bytes(hub_dir, artifact)
+    assert os.path.exists(f"{artifact['dest']}.verified.json")
+    assert is_complete(artifact, hub_dir=hub_dir)
+
+
+def test_model_with_intact_header_but_wrong_size_is_downloaded_again(hub):
+    hub_dir, artifact = hub
+    # Self-consistent file that is not the one on the hub (e.g. an older upload)
+    fake_model(artifact["dest"], 64)
+
+    assert is_complete(artifact, hub_dir=hub_dir, remote=False)
+    assert not is_complete(artifact, hub_dir=hub_dir)
+
+    fetch_artifact(artifact, hub_dir=hub_dir)
+    with open(artifact["dest"], "rb") as f:
+        assert f.read() == _hub_bytes(hub_dir, artifact)
+
+
+def test_verified_model_is_not_fetched_again(hub):
+    hub_dir, artifact = hub
+    fetch_artifact(artifact, hub_dir=hub_dir)
+    mtime = os.stat(artifact["dest"]).st_mtime_ns
+
+    assert fetch_artifact(artifact, hub_dir=hub_dir) == artifact["dest"]
+    assert os.stat(artifact["dest"]).st_mtime_ns == mtime
+
+
+def test_size_checked_model_gets_a_sidecar(hub):
+    hub_dir, artifact = hub
+    # Placed by hand, so there is no sidecar; the first check asks the hub for its size
+    with open(artifact["dest"], "wb") as f:
+        f.write(_hub_bytes(hub_dir, artifact))
+
+    assert is_complete(artifact, hub_dir=hub_dir)
+    assert os.path.exists(f"{artifact['dest']}.verified.json")
+
+    # Later checks no longer need the source at all
+    os.remove(os.path.join(hub_dir, artifact["repo_id"], artifact["filename"]))
+    assert is_complete(artifact, hub_dir=hub_dir)
+
+
+def test_download_without_expected_hash_skips_hashing(hub, monkeypatch):
+    hub_dir, artifact = hub
+    hashed = []
+    monkeypatch.setattr(model_provisioner, "sha256_file", lambda path: hashed.append(path))
+
+    fetch_artifact(artifact, hub_dir=hub_dir)
+
+    assert hashed == []
+    with open(f"{artifact['dest']}.verified.json") as f:
+        assert json.load(f)["sha256"] is None
+    assert not os.path.exists(f"{artifact['dest']}.partial")
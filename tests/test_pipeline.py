@@ -0,0 +1,67 @@
+"""
+Pipelined jobs through the local queue driver with a stub handler: ingestion
+overlaps across jobs while training never exceeds the GPU slots
+"""
+
+import threading
+import time
+
+import pytest
+
+import pipeline
+from pipeline import TrainingSlots, concurrency_modifier, run_local_queue
+
+
+class StubJobs:
+    """Handler that 'prepares' off the GPU, then 'trains' inside a slot"""
+
+    def __init__(self, slots, prepare_seconds=0.05, train_seconds=0.05):
+        self.slots = slots
+        self.prepare_seconds = prepare_seconds
+        self.train_seconds = train_seconds
+        self.lock = threading.Lock()
+        self.in_flight = self.max_in_flight = 0
+        self.training = self.max_training = 0
+        self.gpus = {}
+
+    def _count(self, name, delta):
+        with self.lock:
+            value = getattr(self, name) + delta
+            setattr(self, name, value)
+            peak = f"max_{name}"
+            setattr(self, peak, max(getattr(self, peak), value))
+
+    def __call__(self, job):
+        self._count("in_flight", 1)
+        try:
+            time.sleep(self.prepare_seconds)
+            with self.slots.slot() as gpu:
+                self._count("training", 1)
+                self.gpus[job["id"]] = gpu
+                time.sleep(self.train_seconds)
+                self._count("training", -1)
+            return {"status": "success", "id": job["id"]}
+        finally:
+            self._count("in_flight", -1)
+
+
+@pytest.mark.parametrize("gpus, concurrency", [(["0"], 2), (["0"], 3), (["0", "1"], 3)])
+def test_local_queue_never_trains_more_jobs_than_slots(gpus, concurrency):
+    handler = StubJobs(TrainingSlots(gpus))
+    jobs = [{"id": f"job-{n}", "input": {}} for n in range(6)]
+
+    results, timeline = run_local_queue(jobs, handler, concurrency)
+
+    assert results == [{"status": "success", "id": job["id"]} for job in jobs]
+    assert sorted(entry["id"] for entry in timeline) == [job["id"] for job in jobs]
+    assert handler.max_training == len(gpus)
+    # Preparation of queued jobs overlaps training, up to the pipeline depth
+    assert handler.max_in_flight == concurrency
+    assert set(handler.gpus.values()) == set(gpus)
+
+
+@pytest.mark.parametrize("pipeline_jobs, expected", [(1, 1), (2, 2), (4, 4), (0, 1)])
+def test_concurrency_modifier_keeps_pipeline_jobs_in_flight(monkeypatch, pipeline_jobs, expected):
+    monkeypatch.setattr(pipeline, "PIPELINE_JOBS", pipeline_jobs)
+    assert concurrency_modifier(1) == expected
+    assert concurrency_modifier(expected) == expected
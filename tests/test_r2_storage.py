@@ -0,0 +1,113 @@
+"""
+R2 uploads against a local moto S3 server (R2_ENDPOINT_URL); skipped
+without boto3 and moto[server]
+"""
+
+import os
+import socket
+import time
+import urllib.request
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto_server = pytest.importorskip("moto.server")
+
+import r2_storage
+from r2_storage import OutputUploader, all_uploaded, get_r2_client, get_transfer_config, upload_to_r2
+
+BUCKET = "loras"
+PART = 5 * 1024 * 1024  # S3's smallest multipart part
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def r2(monkeypatch):
+    port = _free_port()
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    endpoint = f"http://127.0.0.1:{port}"
+    # moto keeps its backends per process; start each test from an empty account
+    urllib.request.urlopen(urllib.request.Request(f"{endpoint}/moto-api/reset", method="POST")).close()
+    for name, value in {
+        "CLOUDFLARE_R2_ACCESS_KEY_ID": "testing",
+        "CLOUDFLARE_R2_SECRET_ACCESS_KEY": "testing",
+        "CLOUDFLARE_ACCOUNT_ID": "account",
+        "R2_BUCKET_NAME": BUCKET,
+        "R2_BUCKET_PUBLIC_URL": "https://cdn.example",
+        "R2_ENDPOINT_URL": endpoint,
+        "AWS_DEFAULT_REGION": "us-east-1",
+    }.items():
+        monkeypatch.setenv(name, value)
+    # Small parts so a multipart upload needs only a few MB of test data
+    monkeypatch.setattr(r2_storage, "MULTIPART_THRESHOLD", PART)
+    monkeypatch.setattr(r2_storage, "MULTIPART_CHUNKSIZE", PART)
+    monkeypatch.setattr(r2_storage, "_client", None)
+    client = get_r2_client()
+    client.create_bucket(Bucket=BUCKET)
+    yield client
+    monkeypatch.setattr(r2_storage, "_client", None)
+    server.stop()
+
+
+def _write(path, size):
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return str(path)
+
+
+def test_large_output_is_uploaded_in_parts(r2, tmp_path):
+    path = _write(tmp_path / "hero.safetensors", 2 * PART + 1024)
+
+    url = upload_to_r2(path, "flux_lora/hero.safetensors")
+
+    assert url == "https://cdn.example/flux_lora/hero.safetensors"
+    assert get_transfer_config().multipart_threshold == PART
+    head = r2.head_object(Bucket=BUCKET, Key="flux_lora/hero.safetensors")
+    assert head["ContentLength"] == os.path.getsize(path)
+    # Multipart ETags end in -<part count>
+    assert head["ETag"].strip('"').endswith("-3")
+
+
+def test_failed_upload_returns_the_local_path(r2, tmp_path, monkeypatch):
+    path = _write(tmp_path / "hero.safetensors", 1024)
+    monkeypatch.setenv("R2_BUCKET_NAME", "missing-bucket")
+
+    url = upload_to_r2(path, "flux_lora/hero.safetensors")
+
+    assert url == path
+    assert not all_uploaded([url])
+
+
+def test_watched_checkpoints_are_uploaded_once(r2, tmp_path, monkeypatch):
+    calls = []
+    upload = r2_storage.upload_to_r2
+
+    def counting_upload(local_path, object_name):
+        calls.append(os.path.basename(local_path))
+        return upload(local_path, object_name)
+
+    monkeypatch.setattr(r2_storage, "upload_to_r2", counting_upload)
+    checkpoint = _write(tmp_path / "hero-step00000500.safetensors", 1024)
+    uploader = OutputUploader("hero", "ohwx", concurrency=2)
+    uploader.watch(str(tmp_path), poll_seconds=0.01, settle_seconds=0)
+
+    # The watcher picks the settled checkpoint up while "training" continues
+    deadline = time.monotonic() + 5
+    while checkpoint not in uploader.futures and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert checkpoint in uploader.futures
+
+    final = _write(tmp_path / "hero.safetensors", 1024)
+    paths, urls = uploader.finish([checkpoint, final])
+
+    assert paths == sorted([checkpoint, final])
+    assert sorted(calls) == sorted(["hero-step00000500.safetensors", "hero.safetensors"])
+    assert all_uploaded(urls)
+    keys = sorted(obj["Key"] for obj in r2.list_objects_v2(Bucket=BUCKET)["Contents"])
+    assert keys == sorted(f"flux_lora/hero_ohwx_{uploader.unique_id}_{os.path.basename(path)}" for path in paths)
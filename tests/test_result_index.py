@@ -0,0 +1,153 @@
+"""
+Training result memoization: fingerprint stability and sensitivity, which
+results may be memoized, and the local and R2 (moto) index round trips
+"""
+
+import socket
+import urllib.request
+
+import pytest
+
+import r2_storage
+import result_index
+from result_index import LocalResultIndex, R2ResultIndex, lookup, memo_entry, record, spec_fingerprint
+
+IMAGES = ["a" * 64, "b" * 64, "c" * 64]
+
+
+def _spec(**overrides):
+    spec = {
+        "trigger_word": "ohwx",
+        "character_name": "hero",
+        "schedule": {"max_train_steps": 1000, "batch_size": 1},
+        "resolution": 1024,
+        "captioner": "none",
+        "upload_mode": "final",
+        "compact": None,
+    }
+    spec.update(overrides)
+    return spec
+
+
+def _result(urls, status="success"):
+    return {"status": status, "public_urls": urls, "trigger_word": "ohwx", "character_name": "hero",
+            "training_steps": 1000, "lora_file": "/runpod-volume/hero.safetensors"}
+
+
+@pytest.fixture(autouse=True)
+def model_config(monkeypatch, tmp_path):
+    for name in ("FLUX_MODEL_PATH", "CLIP_MODEL_PATH", "T5_MODEL_PATH", "VAE_MODEL_PATH", "T5XXL_PRECISION"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("MODELS_DIR", str(tmp_path / "models"))
+
+
+def test_fingerprint_is_stable_and_ignores_image_order():
+    first = spec_fingerprint(_spec(), IMAGES, "high")
+
+    assert spec_fingerprint(_spec(), list(reversed(IMAGES)), "high") == first
+    assert len(first) == 64
+
+
+@pytest.mark.parametrize("spec, images, profile", [
+    (_spec(), IMAGES[:2], "high"),
+    (_spec(trigger_word="sks"), IMAGES, "high"),
+    (_spec(schedule={"max_train_steps": 1500, "batch_size": 1}), IMAGES, "high"),
+    (_spec(resolution=768), IMAGES, "high"),
+    (_spec(captioner="florence2"), IMAGES, "high"),
+    (_spec(compact={"rank": 8}), IMAGES, "high"),
+    (_spec(), IMAGES, "low"),
+])
+def test_fingerprint_changes_with_the_training_spec(spec, images, profile):
+    assert spec_fingerprint(spec, images, profile) != spec_fingerprint(_spec(), IMAGES, "high")
+
+
+def test_fingerprint_changes_with_model_identity(monkeypatch, tmp_path):
+    baseline = spec_fingerprint(_spec(), IMAGES, "high")
+
+    # Moving the same file elsewhere is not a different model...
+    monkeypatch.setenv("MODELS_DIR", str(tmp_path / "elsewhere"))
+    assert spec_fingerprint(_spec(), IMAGES, "high") == baseline
+
+    # ...but a differently named base model file is
+    monkeypatch.setenv("FLUX_MODEL_PATH", str(tmp_path / "flux1-dev-finetune.safetensors"))
+    assert spec_fingerprint(_spec(), IMAGES, "high") != baseline
+
+
+def test_fingerprint_changes_with_t5xxl_precision(monkeypatch):
+    baseline = spec_fingerprint(_spec(), IMAGES, "high")
+
+    monkeypatch.setenv("T5XXL_PRECISION", "FP16")
+    assert spec_fingerprint(_spec(), IMAGES, "high") == baseline
+    monkeypatch.setenv("T5XXL_PRECISION", "fp8")
+    assert spec_fingerprint(_spec(), IMAGES, "high") != baseline
+
+
+def test_only_fully_uploaded_successes_are_memoized():
+    urls = ["https://cdn.example/flux_lora/hero.safetensors", "https://cdn.example/flux_lora/hero.json"]
+
+    entry = memo_entry(_result(urls))
+    assert entry["public_urls"] == urls
+    # Local paths never leave the worker that trained them
+    assert "lora_file" not in entry
+
+    # upload_to_r2 returns the local path when an upload fails
+    assert memo_entry(_result([urls[0], "/runpod-volume/hero.json"])) is None
+    assert memo_entry(_result([])) is None
+    assert memo_entry(_result(urls, status="failed")) is None
+
+
+def test_local_index_round_trip(monkeypatch, tmp_path):
+    monkeypatch.setattr(result_index, "RESULT_INDEX", "local")
+    monkeypatch.setattr(result_index, "_index", LocalResultIndex(str(tmp_path / "index" / "results.json")))
+    fingerprint = spec_fingerprint(_spec(), IMAGES, "high")
+    urls = ["https://cdn.example/flux_lora/hero.safetensors"]
+
+    assert lookup(fingerprint) is None
+    record(fingerprint, _result(["/runpod-volume/hero.safetensors"]))
+    assert lookup(fingerprint) is None
+
+    record(fingerprint, _result(urls))
+    assert lookup(fingerprint)["public_urls"] == urls
+    # A second index object reads what the first one persisted
+    assert LocalResultIndex(str(tmp_path / "index" / "results.json")).get(fingerprint)["public_urls"] == urls
+
+
+def test_index_disabled_never_memoizes(monkeypatch):
+    monkeypatch.setattr(result_index, "RESULT_INDEX", "off")
+    monkeypatch.setattr(result_index, "_index", None)
+
+    record("f" * 64, _result(["https://cdn.example/flux_lora/hero.safetensors"]))
+    assert lookup("f" * 64) is None
+
+
+def test_r2_index_round_trip(monkeypatch):
+    pytest.importorskip("boto3")
+    moto_server = pytest.importorskip("moto.server")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    try:
+        endpoint = f"http://127.0.0.1:{port}"
+        urllib.request.urlopen(urllib.request.Request(f"{endpoint}/moto-api/reset", method="POST")).close()
+        for name, value in {"CLOUDFLARE_R2_ACCESS_KEY_ID": "testing", "CLOUDFLARE_R2_SECRET_ACCESS_KEY": "testing",
+                            "CLOUDFLARE_ACCOUNT_ID": "account", "R2_BUCKET_NAME": "loras",
+                            "R2_ENDPOINT_URL": endpoint, "AWS_DEFAULT_REGION": "us-east-1"}.items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.setattr(r2_storage, "_client", None)
+        client = r2_storage.get_r2_client()
+        client.create_bucket(Bucket="loras")
+
+        index = R2ResultIndex(prefix="flux_lora/index")
+        fingerprint = spec_fingerprint(_spec(), IMAGES, "high")
+        urls = ["https://cdn.example/flux_lora/hero.safetensors"]
+
+        assert index.get(fingerprint) is None
+        index.put(fingerprint, memo_entry(_result(urls)))
+
+        assert index.get(fingerprint)["public_urls"] == urls
+        assert client.head_object(Bucket="loras", Key=f"flux_lora/index/{fingerprint}.json")
+    finally:
+        monkeypatch.setattr(r2_storage, "_client", None)
+        server.stop()
@@ -0,0 +1,118 @@
+"""
+Durable training state: LocalStateStore round trips, and ResumableRun
+mirroring states/checkpoints and restoring only complete states
+"""
+
+import os
+
+import pytest
+
+from resume_store import COMPLETE_MARKER, LocalStateStore, ResumableRun
+
+KEY = "f" * 64
+
+
+def _write(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStateStore(str(tmp_path / "volume"))
+
+
+def _train(output_dir, steps):
+    """What Kohya leaves behind after saving a checkpoint and state at each step"""
+    for step in steps:
+        _write(os.path.join(output_dir, f"hero-step{step:08d}.safetensors"), f"lora {step}".encode())
+        _write(os.path.join(output_dir, f"hero-step{step:08d}-state", "optimizer.bin"), f"opt {step}".encode())
+        _write(os.path.join(output_dir, f"hero-step{step:08d}-state", "model.safetensors"), b"state")
+
+
+def test_local_store_round_trip(store, tmp_path):
+    src = _write(str(tmp_path / "src.bin"), b"payload")
+
+    store.put(KEY, "state/optimizer.bin", src)
+    store.put(KEY, "hero.safetensors", src)
+    assert sorted(store.list(KEY)) == ["hero.safetensors", "state/optimizer.bin"]
+
+    dest = str(tmp_path / "restored" / "optimizer.bin")
+    store.get(KEY, "state/optimizer.bin", dest)
+    with open(dest, "rb") as f:
+        assert f.read() == b"payload"
+
+    store.delete(KEY, ["hero.safetensors", "missing.bin"])
+    assert store.list(KEY) == ["state/optimizer.bin"]
+    store.delete(KEY)
+    assert store.list(KEY) == []
+
+
+def test_sync_keeps_only_the_newest_complete_state(store, tmp_path):
+    output_dir = str(tmp_path / "run1")
+    run = ResumableRun(store, KEY, output_dir, settle_seconds=0)
+
+    _train(output_dir, [250])
+    run.sync()
+    _train(output_dir, [500])
+    run.sync()
+
+    assert sorted(store.list(KEY)) == [
+        "hero-step00000250.safetensors",
+        "hero-step00000500-state/.complete",
+        "hero-step00000500-state/model.safetensors",
+        "hero-step00000500-state/optimizer.bin",
+        "hero-step00000500.safetensors",
+    ]
+
+
+def test_restore_resumes_from_the_latest_complete_state(store, tmp_path, monkeypatch):
+    first = ResumableRun(store, KEY, str(tmp_path / "run1"), settle_seconds=0)
+    _train(first.output_dir, [250, 500])
+    first.sync(final=True)
+    # A preempted upload of a newer state: files but no completion marker
+    store.put(KEY, "hero-step00000750-state/optimizer.bin", _write(str(tmp_path / "partial.bin")))
+
+    second = ResumableRun(store, KEY, str(tmp_path / "run2"), settle_seconds=0)
+    state_dir, step = second.restore()
+
+    assert step == 500
+    assert state_dir == os.path.join(second.output_dir, "hero-step00000500-state")
+    with open(os.path.join(state_dir, "optimizer.bin"), "rb") as f:
+        assert f.read() == b"opt 500"
+    assert os.path.exists(os.path.join(state_dir, COMPLETE_MARKER))
+    assert sorted(name for name in os.listdir(second.output_dir) if name.endswith(".safetensors")) == [
+        "hero-step00000250.safetensors", "hero-step00000500.safetensors"]
+    assert not os.path.exists(os.path.join(second.output_dir, "hero-step00000750-state"))
+
+    # Restored files are not uploaded again
+    uploads = []
+    monkeypatch.setattr(store, "put", lambda key, relpath, local_path: uploads.append(relpath))
+    second.sync(final=True)
+    assert uploads == []
+
+
+def test_restore_without_a_complete_state_starts_over(store, tmp_path):
+    store.put(KEY, "hero-step00000250-state/optimizer.bin", _write(str(tmp_path / "partial.bin")))
+
+    run = ResumableRun(store, KEY, str(tmp_path / "run"), settle_seconds=0)
+
+    assert run.restore() == (None, 0)
+    assert not os.path.exists(run.output_dir)
+
+
+def test_finish_drops_a_successful_run_and_flushes_a_failed_one(store, tmp_path):
+    failed = ResumableRun(store, KEY, str(tmp_path / "run1"), settle_seconds=3600)
+    _train(failed.output_dir, [250])
+    failed.sync()
+    # Nothing has settled yet; a failing run flushes regardless
+    assert store.list(KEY) == []
+    failed.finish(success=False)
+    assert "hero-step00000250-state/.complete" in store.list(KEY)
+
+    succeeded = ResumableRun(store, KEY, str(tmp_path / "run2"), settle_seconds=0)
+    succeeded.restore()
+    succeeded.finish(success=True)
+    assert store.list(KEY) == []
@@ -0,0 +1,78 @@
+"""
+Warm trainer IPC over a Unix socket, driven by the stub backend
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+from trainer_worker import (MAX_CONSECUTIVE_CRASHES, TrainerServer, TrainerState, is_healthy, ping,
+                            submit_training, wait_until_ready)
+
+
+@pytest.fixture
+def worker():
+    # Unix socket paths are limited to ~100 bytes, too short for pytest's tmp_path
+    root = tempfile.mkdtemp(prefix="trainer")
+    socket_path = os.path.join(root, "t.sock")
+    state = TrainerState()
+    threading.Thread(target=state.run, args=("stub",), daemon=True).start()
+    server = TrainerServer(socket_path, state)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield socket_path, state, root
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(root)
+
+
+def test_ping_reports_a_ready_worker(worker):
+    socket_path, _, _ = worker
+
+    assert wait_until_ready(socket_path, timeout=5, poll=0.01)
+    assert ping(socket_path) == {"ok": True, "status": "ready", "queued": 0, "jobs_done": 0}
+
+
+def test_ping_without_a_worker_is_none(tmp_path):
+    assert ping(str(tmp_path / "missing.sock")) is None
+    assert not is_healthy(str(tmp_path / "missing.sock"))
+
+
+def test_submit_training_streams_logs_and_writes_the_lora(worker):
+    socket_path, _, root = worker
+    assert wait_until_ready(socket_path, timeout=5, poll=0.01)
+    streamed = []
+
+    returncode, lines = submit_training(["--output_dir", root, "--output_name", "hero"],
+                                        on_line=streamed.append, socket_path=socket_path)
+
+    assert returncode == 0
+    assert lines == streamed
+    assert len(lines) == 10 and lines[-1].startswith("steps: 100%| 10/10")
+    assert os.path.exists(os.path.join(root, "hero.safetensors"))
+    assert ping(socket_path)["jobs_done"] == 1
+
+
+def test_consecutive_crashes_mark_the_worker_unhealthy(worker):
+    socket_path, state, root = worker
+    assert wait_until_ready(socket_path, timeout=5, poll=0.01)
+
+    # A success in between resets the count
+    assert submit_training(["--stub_crash"], socket_path=socket_path)[0] == 1
+    assert submit_training(["--output_dir", root], socket_path=socket_path)[0] == 0
+    assert state.crashes == 0
+
+    for _ in range(MAX_CONSECUTIVE_CRASHES):
+        assert is_healthy(socket_path)
+        returncode, lines = submit_training(["--stub_crash"], socket_path=socket_path)
+        assert returncode == 1
+        assert "Trainer exception: RuntimeError: stub backend crashed" in lines
+
+    assert state.crashes == MAX_CONSECUTIVE_CRASHES
+    assert not is_healthy(socket_path)
+    # An unhealthy worker refuses new jobs instead of queueing them
+    returncode, lines = submit_training(["--output_dir", root], socket_path=socket_path)
+    assert returncode == 1
+    assert lines == [f"trainer unhealthy after {MAX_CONSECUTIVE_CRASHES} crashes"]
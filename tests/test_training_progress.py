@@ -0,0 +1,76 @@
+"""
+Parsing of captured Kohya/tqdm output and streaming from a child process
+"""
+
+import sys
+
+import pytest
+
+from training_progress import ProgressTracker, parse_progress_line, stream_process
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("steps:  12%|█▏        | 120/1000 [01:00<07:20,  2.00it/s, avr_loss=0.123]",
+     {"step": 120, "total_steps": 1000, "it_per_sec": 2.0, "loss": 0.123, "eta_seconds": 440}),
+    # Slow cards report seconds per iteration
+    ("steps:  50%|█████     | 500/1000 [1:02:30<1:02:30,  7.50s/it, avr_loss=8.5e-02]",
+     {"step": 500, "total_steps": 1000, "it_per_sec": pytest.approx(1 / 7.5), "loss": 0.085,
+      "eta_seconds": 3750}),
+    # tqdm's first redraw, before any rate or loss is known
+    ("steps:   0%|          | 0/1000 [00:00<?, ?it/s]", {"step": 0, "total_steps": 1000}),
+    ("\nepoch 3/16", {"epoch": 3, "total_epochs": 16}),
+    ("INFO     epoch is incremented. current_epoch: 2", {}),
+    ("2024-09-13 10:00:00 INFO     Loading state dict", {}),
+])
+def test_parse_progress_line(line, expected):
+    assert parse_progress_line(line) == expected
+
+
+def test_tracker_throttles_reports_and_remembers_losses():
+    reports = []
+    tracker = ProgressTracker(report=reports.append, interval=3600, tail_lines=3)
+
+    for line in ["loading model", "epoch 1/2",
+                 "steps:  10%|█         | 10/100 [00:05<00:45,  2.00it/s, avr_loss=0.5]",
+                 "steps:  20%|██        | 20/100 [00:10<00:40,  2.00it/s, avr_loss=0.4]",
+                 "   ", "saving checkpoint"]:
+        tracker.feed(line + "\n")
+
+    # Only the first progress line gets through inside one interval
+    assert reports == [{"epoch": 1, "total_epochs": 2}]
+    assert tracker.state["step"] == 20 and tracker.state["epoch"] == 1
+    assert tracker.losses == {10: 0.5, 20: 0.4}
+    assert tracker.log_tail().splitlines() == [
+        "steps:  10%|█         | 10/100 [00:05<00:45,  2.00it/s, avr_loss=0.5]",
+        "steps:  20%|██        | 20/100 [00:10<00:40,  2.00it/s, avr_loss=0.4]",
+        "saving checkpoint",
+    ]
+
+
+CHILD = r"""
+import sys
+sys.stdout.write("epoch 1/1\n")
+for step in range(1, 4):
+    sys.stdout.write(f"\rsteps: {step * 33}%| | {step}/3 [00:0{step}<00:00, 1.00it/s, avr_loss=0.{step}]")
+    sys.stdout.flush()
+sys.stdout.write("\n")
+sys.stderr.write("done\n")
+sys.exit(3)
+"""
+
+
+def test_stream_process_splits_tqdm_redraws_into_lines():
+    tracker = ProgressTracker(interval=0)
+    lines = []
+
+    def on_line(line):
+        lines.append(line)
+        tracker.feed(line)
+
+    returncode = stream_process([sys.executable, "-c", CHILD], on_line)
+
+    assert returncode == 3
+    assert [line.strip() for line in lines if line.strip()][0] == "epoch 1/1"
+    assert [line.strip() for line in lines if line.strip()][-1] == "done"
+    assert tracker.losses == {1: 0.1, 2: 0.2, 3: 0.3}
+    assert tracker.state["step"] == 3 and tracker.state["total_steps"] == 3
@@ -0,0 +1,40 @@
+"""
+Step, repeat, epoch and checkpoint planning for the requested training steps
+"""
+
+import pytest
+
+from training_schedule import ScheduleError, plan_schedule
+
+
+def test_plan_schedule_spreads_checkpoints_over_the_run():
+    schedule = plan_schedule(1000, 20, batch_size=1, checkpoints=4)
+    assert schedule == {
+        "max_train_steps": 1000,
+        "batch_size": 1,
+        "num_repeats": 10,
+        "steps_per_epoch": 200,
+        "epochs": 5,
+        "save_every_n_steps": 250,
+    }
+
+
+def test_plan_schedule_short_run_still_finishes_an_epoch():
+    schedule = plan_schedule(30, 20, checkpoints=4)
+    assert schedule["num_repeats"] == 1
+    assert schedule["epochs"] * schedule["steps_per_epoch"] >= 30
+    # 30 // 4 is below MIN_SAVE_EVERY_STEPS, so no intermediate checkpoints
+    assert schedule["save_every_n_steps"] == 0
+
+
+def test_plan_schedule_accounts_for_batch_size():
+    schedule = plan_schedule(100, 10, batch_size=2, checkpoints=1)
+    assert schedule["steps_per_epoch"] == 50
+    assert schedule["epochs"] == 2
+    assert schedule["save_every_n_steps"] == 0
+
+
+@pytest.mark.parametrize("steps, images, batch_size", [(0, 10, 1), ("many", 10, 1), (100, 0, 1), (100, 10, 0)])
+def test_plan_schedule_rejects_invalid_input(steps, images, batch_size):
+    with pytest.raises(ScheduleError):
+        plan_schedule(steps, images, batch_size=batch_size)
@@ -0,0 +1,119 @@
+"""
+Job directory budget, free-space check and cleanup modes under a tmp_path
+TRAINING_ROOT
+"""
+
+import errno
+import os
+
+import pytest
+
+import workspace
+from file_cache import FileCache
+from workspace import WorkspaceError, enforce_budget, job_dir, prepare_workspace, release_workspace
+
+KB = 1024
+
+
+@pytest.fixture(autouse=True)
+def root(monkeypatch, tmp_path):
+    monkeypatch.setattr(workspace, "TRAINING_ROOT", str(tmp_path / "training"))
+    monkeypatch.setattr(workspace, "WORKSPACE_ARCHIVE_DIR", str(tmp_path / "training" / "training_archive"))
+    monkeypatch.setattr(workspace, "WORKSPACE_MIN_FREE_BYTES", 0)
+    monkeypatch.setattr(workspace, "_active", set())
+    os.makedirs(tmp_path / "training")
+    return tmp_path / "training"
+
+
+def _job(job_id, size, age):
+    """A finished job directory holding size bytes, last touched age seconds ago"""
+    path = job_dir(job_id)
+    os.makedirs(path)
+    with open(os.path.join(path, "lora.safetensors"), "wb") as f:
+        f.write(b"\0" * size)
+    os.utime(path, (1_000_000 - age, 1_000_000 - age))
+    return path
+
+
+def test_budget_removes_oldest_job_dirs_before_evicting_caches(tmp_path):
+    oldest, older, newest = _job("a", 10 * KB, 300), _job("b", 10 * KB, 200), _job("c", 10 * KB, 100)
+    cache = FileCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    src = tmp_path / "object.bin"
+    src.write_bytes(b"\0" * 10 * KB)
+    cache.put(str(src), copy=True)
+
+    reclaimed = enforce_budget(max_bytes=25 * KB, caches=[cache])
+
+    assert reclaimed == 20 * KB
+    assert not os.path.exists(oldest) and not os.path.exists(older)
+    assert os.path.exists(newest)
+    assert workspace.disk_usage(cache.objects_dir) == 10 * KB
+
+    # Still over budget once every job dir is gone: the cache goes next
+    assert enforce_budget(max_bytes=5 * KB, caches=[cache]) == 20 * KB
+    assert not os.path.exists(newest)
+    assert workspace.disk_usage(cache.objects_dir) == 0
+
+
+def test_budget_never_touches_active_job_dirs():
+    busy = _job("busy", 10 * KB, 300)
+    prepare_workspace(busy, 0)
+    idle = _job("idle", 10 * KB, 100)
+
+    enforce_budget(max_bytes=KB)
+
+    assert os.path.exists(busy)
+    assert not os.path.exists(idle)
+
+
+def test_budget_of_zero_is_disabled():
+    path = _job("a", 10 * KB, 100)
+    assert enforce_budget(max_bytes=0) == 0
+    assert os.path.exists(path)
+
+
+def test_prepare_workspace_without_room_raises(monkeypatch):
+    stale = _job("stale", 10 * KB, 100)
+    path = job_dir("new")
+    monkeypatch.setattr(workspace, "WORKSPACE_MIN_FREE_BYTES", 1 << 60)
+
+    with pytest.raises(WorkspaceError, match="Not enough disk space"):
+        prepare_workspace(path, 10 * KB)
+
+    # Finished dirs were dropped trying to make room, and the new one is released
+    assert not os.path.exists(stale)
+    assert path not in workspace._active
+
+
+def test_release_deletes_a_successful_job():
+    path = _job("done", 10 * KB, 100)
+    assert release_workspace(path, success=True, mode="delete") == 10 * KB
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize("success, mode", [(False, "delete"), (True, "keep")])
+def test_release_keeps_failed_or_kept_jobs(success, mode):
+    path = _job("kept", 10 * KB, 100)
+    assert release_workspace(path, success=success, mode=mode) == 0
+    assert os.path.exists(path)
+
+
+def test_release_archives_across_mounts(monkeypatch):
+    path = _job("done", 10 * KB, 100)
+    replace = os.replace
+
+    def cross_device_replace(src, dst):
+        if src == path:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return replace(src, dst)
+
+    monkeypatch.setattr(workspace.os, "replace", cross_device_replace)
+
+    assert release_workspace(path, success=True, mode="archive") == 0
+    archived = os.path.join(workspace.WORKSPACE_ARCHIVE_DIR, os.path.basename(path))
+    assert not os.path.exists(path)
+    assert os.path.getsize(os.path.join(archived, "lora.safetensors")) == 10 * KB
+
+    # Archived jobs count against the budget like any finished job
+    assert enforce_budget(max_bytes=KB) == 10 * KB
+    assert not os.path.exists(archived)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Warm Trainer Worker
+Long-lived process that imports Kohya (and optionally keeps the base model
+state dicts resident in RAM) once, then trains jobs it receives over a local
+Unix socket one at a time. The handler talks to it through the client
+functions below and falls back to `accelerate launch` when it is unhealthy.
+
+Protocol: one JSON request line per connection, JSON reply lines.
+    {"op": "ping"}                 -> {"ok": true, "status": "ready", ...}
+    {"op": "train", "args": [...]} -> {"log": "..."}* then {"done": true, "returncode": N}
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+TRAINER_SOCKET = os.getenv("TRAINER_SOCKET", "/tmp/fluxgym_trainer.sock")
+WARM_TRAINER = os.getenv("WARM_TRAINER", "0") == "1"
+TRAINER_BACKEND = os.getenv("TRAINER_BACKEND", "kohya")
+TRAINER_BACKENDS = ("kohya", "stub")
+# Keeping the FLUX, CLIP-L, T5XXL and VAE state dicts resident is what saves the
+# per-job model load; it costs roughly their size in host RAM (~30-35 GB)
+TRAINER_CACHE_WEIGHTS = os.getenv("TRAINER_CACHE_WEIGHTS", "1") == "1"
+# Consecutive backend crashes (not ordinary training failures) before the
+# worker reports itself unhealthy and the handler stops routing jobs to it
+MAX_CONSECUTIVE_CRASHES = 2
+
+
+class _LineWriter(io.TextIOBase):
+    """File-like object that forwards complete lines (and tqdm \\r updates) to emit"""
+
+    def __init__(self, emit):
+        self.emit = emit
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        while True:
+            breaks = [i for i in (self.buffer.find("\n"), self.buffer.find("\r")) if i >= 0]
+            if not breaks:
+                break
+            cut = min(breaks)
+            line, self.buffer = self.buffer[:cut], self.buffer[cut + 1:]
+            if line.strip():
+                self.emit(line)
+        return len(text)
+
+    def flush(self):
+        if self.buffer.strip():
+            self.emit(self.buffer)
+        self.buffer = ""
+
+
+class _EmitHandler(logging.Handler):
+    def __init__(self, emit):
+        super().__init__()
+        self.emit_line = emit
+
+    def emit(self, record):
+        self.emit_line(self.format(record))
+
+
+class StubBackend:
+    """Pretends to train: emits progress lines and writes a dummy LoRA file
+
+    A --stub_crash argument raises instead, like a backend crash would.
+    """
+
+    def __init__(self, step_seconds=0.0):
+        self.step_seconds = step_seconds
+
+    def train(self, args, emit):
+        if "--stub_crash" in args:
+            raise RuntimeError("stub backend crashed")
+        output_dir = args[args.index("--output_dir") + 1] if "--output_dir" in args else "."
+        output_name = args[args.index("--output_name") + 1] if "--output_name" in args else "lora"
+        total = 10
+        for step in range(1, total + 1):
+            time.sleep(self.step_seconds)
+            emit(f"steps: {step * 10}%| {step}/{total} [00:00<00:00, 5.00it/s, avr_loss=0.1]")
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, f"{output_name}.safetensors"), "wb") as f:
+            f.write(b"stub")
+        return 0
+
+
+class KohyaBackend:
+    """Runs flux_train_network in-process with torch/Kohya imported once"""
+
+    def __init__(self, cache_weights=TRAINER_CACHE_WEIGHTS):
+        from model_registry import sd_scripts_dir
+        sys.path.insert(0, sd_scripts_dir())
+        started = time.time()
+        import flux_train_network
+        from library import train_util
+        self.flux_train_network = flux_train_network
+        self.train_util = train_util
+        if cache_weights:
+            self._install_weight_cache()
+        print(f"Kohya backend imported in {time.time() - started:.1f}s")
+
+    def _install_weight_cache(self):
+        """Keep CPU state dicts loaded by Kohya resident between jobs"""
+        from library import flux_utils, utils
+        original = utils.load_safetensors
+        cache = {}
+
+        def cached_load_safetensors(path, device, disable_mmap=False, dtype=None):
+            if str(device) != "cpu":
+                return original(path, device, disable_mmap=disable_mmap, dtype=dtype)
+            key = (os.path.abspath(path), os.path.getmtime(path), str(dtype))
+            if key not in cache:
+                cache[key] = original(path, device, disable_mmap=disable_mmap, dtype=dtype)
+            # Shallow copy: Kohya may pop keys from the dict it receives
+            return dict(cache[key])
+
+        utils.load_safetensors = cached_load_safetensors
+        flux_utils.load_safetensors = cached_load_safetensors
+
+    def train(self, args, emit):
+        import gc
+        import torch
+        parser = self.flux_train_network.setup_parser()
+        parsed = parser.parse_args(args)
+        self.train_util.verify_command_line_training_args(parsed)
+        parsed = self.train_util.read_config_from_file(parsed, parser)
+        try:
+            self.flux_train_network.FluxNetworkTrainer().train(parsed)
+        finally:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        return 0
+
+
+def load_backend(name):
+    if name == "stub":
+        return StubBackend(step_seconds=float(os.getenv("STUB_STEP_SECONDS", "0")))
+    if name == "kohya":
+        return KohyaBackend()
+    raise ValueError(f"Unknown trainer backend: {name}")
+
+
+class TrainerState:
+    """Job queue plus health bookkeeping shared by the socket handlers"""
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.status = "loading"
+        self.backend = None
+        self.jobs_done = 0
+        self.crashes = 0
+
+    def healthy(self):
+        return self.status == "ready" and self.crashes < MAX_CONSECUTIVE_CRASHES
+
+    def run(self, backend_name):
+        """Load the backend, then train queued jobs one at a time, forever"""
+        try:
+            self.backend = load_backend(backend_name)
+            self.status = "ready"
+        except Exception as e:
+            print(f"❌ Trainer backend failed to load: {e}")
+            self.status = "failed"
+            return
+        while True:
+            args, emit, done = self.jobs.get()
+            done(self._train_one(args, emit))
+
+    def _train_one(self, args, emit):
+        writer = _LineWriter(emit)
+        log_handler = _EmitHandler(emit)
+        root = logging.getLogger()
+        root.addHandler(log_handler)
+        saved = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = writer
+        try:
+            returncode = self.backend.train(args, emit)
+            self.crashes = 0
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            emit(f"Trainer exception: {type(e).__name__}: {e}")
+            self.crashes += 1
+            returncode = 1
+        finally:
+            writer.flush()
+            sys.stdout, sys.stderr = saved
+            root.removeHandler(log_handler)
+        self.jobs_done += 1
+        return returncode
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def _send(self, message):
+        self.wfile.write((json.dumps(message) + "\n").encode())
+        self.wfile.flush()
+
+    def handle(self):
+        state = self.server.state
+        request = json.loads(self.rfile.readline() or b"{}")
+        op = request.get("op")
+
+        if op == "ping":
+            self._send({"ok": state.healthy(), "status": state.status,
+                        "queued": state.jobs.qsize(), "jobs_done": state.jobs_done})
+            return
+
+        if op != "train":
+            self._send({"done": True, "returncode": 1, "error": f"unknown op {op!r}"})
+            return
+        if not state.healthy():
+            reason = state.status if state.status != "ready" else f"unhealthy after {state.crashes} crashes"
+            self._send({"done": True, "returncode": 1, "error": f"trainer {reason}"})
+            return
+
+        finished = queue.Queue()
+        send_lock = threading.Lock()
+
+        def emit(line):
+            with send_lock:
+                try:
+                    self._send({"log": line})
+                except OSError:
+                    pass  # client went away; keep training
+
+        state.jobs.put((request.get("args", []), emit, finished.put))
+        returncode = finished.get()
+        with send_lock:
+            self._send({"done": True, "returncode": returncode})
+
+
+class TrainerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, state):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+        self.state = state
+
+
+def serve(socket_path=TRAINER_SOCKET, backend_name=TRAINER_BACKEND):
+    """Start the trainer loop and answer requests until killed"""
+    state = TrainerState()
+    threading.Thread(target=state.run, args=(backend_name,), daemon=True).start()
+    with TrainerServer(socket_path, state) as server:
+        print(f"Warm trainer listening on {socket_path} (backend: {backend_name})")
+        server.serve_forever()
+
+
+# ---------------------------------------------------------------------------
+# Client side (used by the handler)
+# ---------------------------------------------------------------------------
+
+def _request(message, socket_path, timeout):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(socket_path)
+    sock.sendall((json.dumps(message) + "\n").encode())
+    return sock, sock.makefile("r", encoding="utf-8")
+
+
+def ping(socket_path=TRAINER_SOCKET, timeout=2.0):
+    """Worker status dict, or None if it is not reachable"""
+    try:
+        sock, reader = _request({"op": "ping"}, socket_path, timeout)
+        with sock, reader:
+            return json.loads(reader.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def is_healthy(socket_path=TRAINER_SOCKET):
+    status = ping(socket_path)
+    return bool(status and status.get("ok"))
+
+
+def submit_training(args, on_line=None, socket_path=TRAINER_SOCKET):
+    """Run one training job on the warm worker; returns (returncode, log lines)"""
+    lines = []
+    sock, reader = _request({"op": "train", "args": args}, socket_path, None)
+    with sock, reader:
+        for raw in reader:
+            message = json.loads(raw)
+            if "log" in message:
+                lines.append(message["log"])
+                if on_line:
+                    on_line(message["log"])
+            elif message.get("done"):
+                if message.get("error"):
+                    lines.append(message["error"])
+                return message["returncode"], lines
+    raise ConnectionError("Warm trainer closed the connection mid-job")
+
+
+def start_worker(socket_path=TRAINER_SOCKET, backend_name=TRAINER_BACKEND, env=None):
+    """Spawn the warm trainer as a background process next to the handler"""
+    script = os.path.abspath(__file__)
+    return subprocess.Popen([sys.executable, script, "--socket", socket_path, "--backend", backend_name],
+                            env=env)
+
+
+def wait_until_ready(socket_path=TRAINER_SOCKET, timeout=300.0, poll=1.0):
+    """Poll the worker until it reports ready; False on timeout or backend failure"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = ping(socket_path)
+        if status and status.get("ok"):
+            return True
+        if status and status.get("status") == "failed":
+            return False
+        time.sleep(poll)
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm FLUX LoRA trainer worker")
+    parser.add_argument("--socket", default=TRAINER_SOCKET)
+    parser.add_argument("--backend", default=TRAINER_BACKEND, choices=TRAINER_BACKENDS)
+    cli = parser.parse_args()
+    serve(cli.socket, cli.backend)
@@ -0,0 +1,118 @@
+"""
+Training Progress Streaming
+Parses Kohya's console output line by line into step/epoch/loss/speed,
+pushes throttled RunPod progress updates and keeps only a bounded tail of
+the log for error reports
+"""
+
+import collections
+import os
+import re
+import subprocess
+import time
+
+LOG_TAIL_LINES = int(os.getenv("LOG_TAIL_LINES", "200"))
+PROGRESS_INTERVAL_SECONDS = float(os.getenv("PROGRESS_INTERVAL_SECONDS", "5"))
+
+# tqdm bar, e.g. "steps:  12%|█▏  | 120/1000 [01:00<07:20, 2.00it/s, avr_loss=0.123]"
+STEP_RE = re.compile(r"steps:.*?\|\s*(\d+)/(\d+)\s*\[([^\]]*)\]")
+RATE_RE = re.compile(r"([\d.]+)\s*(it/s|s/it)")
+LOSS_RE = re.compile(r"avr_loss=([\d.eE+-]+)")
+ETA_RE = re.compile(r"<([\d:]+)")
+EPOCH_RE = re.compile(r"^\s*epoch (\d+)/(\d+)", re.IGNORECASE)
+
+
+def _seconds(clock):
+    seconds = 0
+    for part in clock.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def parse_progress_line(line):
+    """Progress fields found in one line of Kohya output (empty dict if none)"""
+    match = STEP_RE.search(line)
+    if match:
+        progress = {"step": int(match.group(1)), "total_steps": int(match.group(2))}
+        stats = match.group(3)
+        rate = RATE_RE.search(stats)
+        if rate:
+            value = float(rate.group(1))
+            progress["it_per_sec"] = value if rate.group(2) == "it/s" else (1.0 / value if value else 0.0)
+        loss = LOSS_RE.search(stats)
+        if loss:
+            progress["loss"] = float(loss.group(1))
+        eta = ETA_RE.search(stats)
+        if eta:
+            progress["eta_seconds"] = _seconds(eta.group(1))
+        return progress
+    match = EPOCH_RE.search(line)
+    if match:
+        return {"epoch": int(match.group(1)), "total_epochs": int(match.group(2))}
+    return {}
+
+
+class ProgressTracker:
+    """Accumulates parsed progress and reports it at most every `interval` seconds"""
+
+    def __init__(self, report=None, interval=PROGRESS_INTERVAL_SECONDS, tail_lines=LOG_TAIL_LINES):
+        self.report = report
+        self.interval = interval
+        self.state = {}
+        # step -> running average loss, used to pick the best checkpoint
+        self.losses = {}
+        self.tail = collections.deque(maxlen=tail_lines)
+        self._last_report = None
+
+    def feed(self, line):
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            return
+        self.tail.append(line)
+        progress = parse_progress_line(line)
+        if not progress:
+            print(line)
+            return
+        self.state.update(progress)
+        if "step" in progress and "loss" in progress:
+            self.losses[progress["step"]] = progress["loss"]
+        now = time.monotonic()
+        # The first update always goes out, however recently the host booted
+        if self.report and (self._last_report is None or now - self._last_report >= self.interval):
+            self._last_report = now
+            self.report(dict(self.state))
+
+    def log_tail(self):
+        return "\n".join(self.tail)
+
+
+def runpod_reporter(job, extra=None):
+    """Progress callback that forwards updates through the RunPod job progress API"""
+    import runpod
+
+    def report(progress):
+        progress.update(extra or {})
+        if progress.get("total_steps"):
+            progress["percent"] = round(100.0 * progress["step"] / progress["total_steps"], 1)
+        try:
+            runpod.serverless.progress_update(job, progress)
+        except Exception as e:
+            print(f"Progress update failed: {e}")
+
+    return report
+
+
+def stream_process(cmd, on_line, env=None):
+    """Run cmd with stdout+stderr merged, feeding each line to on_line; returns exit code"""
+    # Text mode's universal newlines turn tqdm's \r redraws into separate lines
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, encoding="utf-8", errors="replace", bufsize=1, env=env)
+    try:
+        for line in process.stdout:
+            on_line(line)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    process.stdout.close()
+    return process.wait()
@@ -0,0 +1,84 @@
+"""
+Training Schedule Planner
+Turns the requested optimizer steps, image count and batch size into Kohya
+settings (max_train_steps, num_repeats, checkpoint cadence) and estimates
+wall-clock time from a calibration table before anything is launched
+"""
+
+import json
+import math
+import os
+
+DEFAULT_STEPS = int(os.getenv("DEFAULT_STEPS", "1000"))
+DEFAULT_NUM_REPEATS = 10
+DEFAULT_CHECKPOINTS = int(os.getenv("TRAINING_CHECKPOINTS", "4"))
+MAX_STEPS = int(os.getenv("MAX_TRAINING_STEPS", "10000"))
+MIN_SAVE_EVERY_STEPS = 50
+# Optional JSON file with the same shape as DEFAULT_CALIBRATION
+TRAINING_CALIBRATION = os.getenv("TRAINING_CALIBRATION")
+
+# Starting points for a 24GB+ card with --fp8_base; replace with numbers
+# measured on your own fleet via TRAINING_CALIBRATION
+DEFAULT_CALIBRATION = {
+    "default": {
+        "startup_seconds": 150.0,          # process start + model load
+        "cache_seconds_per_image": 1.5,    # latent + text encoder caching
+        "seconds_per_step": {"512": 0.9, "768": 1.6, "1024": 2.6},
+    },
+}
+
+
+class ScheduleError(ValueError):
+    """Raised when the requested schedule is invalid"""
+
+
+def plan_schedule(steps, image_count, batch_size=1, checkpoints=DEFAULT_CHECKPOINTS):
+    """Kohya schedule that runs exactly `steps` optimizer steps"""
+    try:
+        steps, batch_size = int(steps), int(batch_size)
+    except (TypeError, ValueError):
+        raise ScheduleError("steps and batch_size must be integers")
+    if not 1 <= steps <= MAX_STEPS:
+        raise ScheduleError(f"steps must be between 1 and {MAX_STEPS}, got {steps}")
+    if batch_size < 1:
+        raise ScheduleError(f"batch_size must be at least 1, got {batch_size}")
+    if image_count < 1:
+        raise ScheduleError("at least one image is required")
+
+    # Repeats only shape epoch boundaries once max_train_steps is set; keep an
+    # epoch no longer than the whole run so small step counts still finish one
+    num_repeats = max(1, min(DEFAULT_NUM_REPEATS, steps * batch_size // image_count))
+    steps_per_epoch = math.ceil(image_count * num_repeats / batch_size)
+    save_every = steps // checkpoints if checkpoints > 1 else 0
+
+    return {
+        "max_train_steps": steps,
+        "batch_size": batch_size,
+        "num_repeats": num_repeats,
+        "steps_per_epoch": steps_per_epoch,
+        "epochs": math.ceil(steps / steps_per_epoch),
+        "save_every_n_steps": save_every if MIN_SAVE_EVERY_STEPS <= save_every < steps else 0,
+    }
+
+
+def load_calibration(path=TRAINING_CALIBRATION):
+    if path:
+        with open(path) as f:
+            return json.load(f)
+    return DEFAULT_CALIBRATION
+
+
+def estimate_seconds(schedule, image_count, resolution=1024, profile="default", calibration=None):
+    """Predicted wall-clock seconds for a planned run"""
+    calibration = calibration or load_calibration()
+    table = calibration.get(profile) or calibration["default"]
+    per_step = table["seconds_per_step"]
+    # Use the nearest calibrated resolution, scaled by pixel count
+    nearest = min(per_step, key=lambda reso: abs(int(reso) - resolution))
+    seconds_per_step = per_step[nearest] * (resolution / int(nearest)) ** 2
+    return round(
+        table["startup_seconds"]
+        + table["cache_seconds_per_image"] * image_count
+        + seconds_per_step * schedule["batch_size"] * schedule["max_train_steps"],
+        1,
+    )
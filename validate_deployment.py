@@ -2,14 +2,67 @@
 """
 Pre-deployment validation script for FluxGym RunPod Serverless Endpoint.
 Run this script to validate your deployment configuration before going live.
+
+    python validate_deployment.py                  # full check (imports torch, Kohya)
+    python validate_deployment.py --fast           # readiness probe, no heavy imports
+    python validate_deployment.py --fast --json    # same, machine-readable
+
+--fast runs independent checks concurrently, each with a timeout, and never
+imports torch or Kohya: dependencies are found via package metadata, model
+files are verified by parsing their safetensors headers through mmap, and
+environment variables are those the handler actually reads. Exit status is
+non-zero if any check fails (warnings do not count).
 """
 
+import argparse
+import json
 import os
+import shutil
 import sys
 import subprocess
 import importlib
+import threading
+import time
 from pathlib import Path
 
+VALIDATE_CHECK_TIMEOUT = float(os.getenv("VALIDATE_CHECK_TIMEOUT", "5"))
+
+# R2 credentials the handler reads (r2_storage.r2_settings); without them
+# LoRAs are only returned as local paths
+R2_REQUIRED_VARS = [
+    "CLOUDFLARE_R2_ACCESS_KEY_ID",
+    "CLOUDFLARE_R2_SECRET_ACCESS_KEY",
+    "CLOUDFLARE_ACCOUNT_ID",
+    "R2_BUCKET_NAME",
+]
+
+OPTIONAL_VARS = [
+    "R2_BUCKET_PUBLIC_URL",
+    "FLUX_MODEL_PATH",
+    "CLIP_MODEL_PATH",
+    "T5_MODEL_PATH",
+    "VAE_MODEL_PATH",
+]
+
+# Modules that parse settings with int()/float() at import; a bad value
+# makes the import (and so the worker) fail
+SETTINGS_MODULES = [
+    "captioning", "dataset_plan", "encoder_cache", "file_cache", "file_lock", "image_downloader",
+    "image_preprocess", "job_metrics", "launch_profile", "lora_compact", "model_prewarm",
+    "model_provisioner", "model_registry", "pipeline", "r2_storage", "result_index", "resume_store",
+    "trainer_worker", "training_progress", "training_schedule", "workspace",
+]
+
+# Modules the handler imports; compiled (not imported) by the fast check
+HANDLER_SOURCES = [
+    "handler_fluxgym.py", "startup_profile.py", "ensure_deps.py", "image_downloader.py", "file_cache.py",
+    "encoder_cache.py", "file_lock.py", "image_preprocess.py", "captioning.py", "dataset_plan.py",
+    "model_provisioner.py", "model_registry.py", "kohya_command.py", "launch_profile.py",
+    "trainer_worker.py", "training_progress.py", "job_metrics.py", "workspace.py", "pipeline.py",
+    "training_schedule.py", "r2_storage.py", "result_index.py", "resume_store.py",
+    "safetensors_header.py", "lora_compact.py", "model_prewarm.py",
+]
+
 class Colors:
     GREEN = '\033[92m'
     RED = '\033[91m'
@@ -35,39 +88,88 @@ def print_status(message, status, details=None):
         if details:
             print(f"   {Colors.BLUE}{details}{Colors.ENDC}")
 
+def _choice(var, value, allowed):
+    if value in allowed:
+        return []
+    return [f"{var}={value!r} is not one of {', '.join(str(option) for option in allowed if option)}"]
+
+
+def settings_problems():
+    """Messages for settings the handler modules would fail to parse or reject
+
+    Values and allowed choices come from the owning modules themselves, so
+    this stays in step with what the handler actually reads.
+    """
+    problems = []
+    modules = {}
+    for name in SETTINGS_MODULES:
+        try:
+            modules[name] = importlib.import_module(name)
+        except ValueError as e:
+            problems.append(f"{name}.py rejects its settings: {e}")
+    if problems:
+        return problems
+
+    m = modules
+    upload_mode = os.getenv("R2_UPLOAD_MODE")
+    if upload_mode is not None:
+        problems += _choice("R2_UPLOAD_MODE", upload_mode, m["r2_storage"].UPLOAD_MODES)
+    problems += _choice("CAPTIONER", m["captioning"].CAPTIONER, ("none", *m["captioning"].CAPTIONERS))
+    problems += _choice("RESULT_INDEX", m["result_index"].RESULT_INDEX, m["result_index"].RESULT_INDEX_MODES)
+    problems += _choice("RESUME_STORE", m["resume_store"].RESUME_STORE, m["resume_store"].RESUME_STORE_MODES)
+    problems += _choice("WORKSPACE_CLEANUP", m["workspace"].WORKSPACE_CLEANUP, m["workspace"].CLEANUP_MODES)
+    problems += _choice("MODEL_PREWARM_READ", m["model_prewarm"].MODEL_PREWARM_READ,
+                        m["model_prewarm"].PREWARM_READ_MODES)
+    problems += _choice("METRICS_FORMAT", m["job_metrics"].METRICS_FORMAT, m["job_metrics"].METRICS_FORMATS)
+    problems += _choice("TRAINER_BACKEND", m["trainer_worker"].TRAINER_BACKEND, m["trainer_worker"].TRAINER_BACKENDS)
+    problems += _choice("TRAINING_RESOLUTION", m["image_preprocess"].TRAINING_RESOLUTION,
+                        m["dataset_plan"].RESOLUTIONS)
+    problems += _choice("PREVIEW_RESOLUTION", m["dataset_plan"].PREVIEW_RESOLUTION, m["dataset_plan"].RESOLUTIONS)
+
+    # Settings the modules only parse on use: run the same code
+    checks = [
+        m["model_registry"].t5xxl_filename,
+        m["lora_compact"].compaction_options,
+        m["launch_profile"].detect_cpu_count,
+        lambda: m["launch_profile"].select_profile(vram_gb=0, cpu_count=1),
+    ]
+    if os.getenv("GPU_VRAM_GB"):
+        checks.append(m["launch_profile"].detect_vram_gb)
+    for check in checks:
+        try:
+            check()
+        except ValueError as e:
+            problems.append(str(e))
+    return problems
+
+
 def check_environment_variables():
     """Check required environment variables."""
     print(f"\n{Colors.BOLD}🔧 Environment Variables{Colors.ENDC}")
     
-    required_vars = [
-        "CF_ACCESS_KEY_ID",
-        "CF_SECRET_ACCESS_KEY", 
-        "CF_R2_ENDPOINT_URL",
-        "CF_R2_BUCKET_NAME",
-        "HUGGINGFACE_TOKEN"
-    ]
-    
-    optional_vars = [
-        "FLUX_MODEL_PATH",
-        "CLIP_MODEL_PATH",
-        "T5_MODEL_PATH", 
-        "VAE_MODEL_PATH"
-    ]
-    
     all_good = True
     
-    for var in required_vars:
+    for var in R2_REQUIRED_VARS:
         if os.getenv(var):
             print_status(f"{var} configured", "PASS")
         else:
-            print_status(f"{var} missing", "FAIL", "This environment variable is required")
+            print_status(f"{var} missing", "FAIL", "Required for R2 uploads (see .env.example)")
             all_good = False
     
-    for var in optional_vars:
+    if os.getenv("HUGGINGFACE_TOKEN"):
+        print_status("HUGGINGFACE_TOKEN configured", "PASS")
+    else:
+        print_status("HUGGINGFACE_TOKEN missing", "WARN", "FLUX.1-dev is gated; needed unless models are pre-provisioned")
+    
+    for problem in settings_problems():
+        print_status(problem, "FAIL")
+        all_good = False
+    
+    for var in OPTIONAL_VARS:
         if os.getenv(var):
             print_status(f"{var} configured", "PASS")
         else:
-            print_status(f"{var} using defaults", "INFO", "Will use default path")
+            print_status(f"{var} using defaults", "INFO", "Will use the default")
     
     return all_good
 
@@ -148,7 +250,10 @@ def check_kohya_setup():
     """Check Kohya sd-scripts setup."""
     print(f"\n{Colors.BOLD}🔧 Kohya sd-scripts Setup{Colors.ENDC}")
     
+    from model_registry import sd_scripts_dir
+    
     kohya_paths = [
+        sd_scripts_dir(),
         "/workspace/fluxgym/sd-scripts",
         "./sd-scripts",
         "../sd-scripts"
@@ -169,7 +274,7 @@ def check_kohya_setup():
     
     # Check Python path configuration
     try:
-        sys.path.insert(0, "/workspace/fluxgym/sd-scripts")
+        sys.path.insert(0, path)
         import library.train_util
         print_status("Kohya library imports work", "PASS")
     except ImportError as e:
@@ -232,8 +337,176 @@ def run_handler_syntax_check():
         print_status("Handler syntax check failed", "FAIL", str(e))
         return False
 
+# --- Fast mode: concurrent, import-free checks -------------------------------
+# Each check returns (status, details) with status PASS, WARN or FAIL.
+
+def fast_check_env():
+    missing = [var for var in R2_REQUIRED_VARS if not os.getenv(var)]
+    problems = settings_problems()
+    if missing or problems:
+        return "FAIL", "; ".join(([f"missing {', '.join(missing)}"] if missing else []) + problems)
+    if not os.getenv("HUGGINGFACE_TOKEN"):
+        return "WARN", "HUGGINGFACE_TOKEN missing (needed to download gated FLUX.1-dev)"
+    return "PASS", f"{len(R2_REQUIRED_VARS) + 1} required variables set"
+
+
+def fast_check_dependencies():
+    from ensure_deps import check_manifest
+
+    missing, report = check_manifest()
+    required = [package for package, _, scope in missing if scope in ("handler", "trainer")]
+    optional = [f"{package} ({scope})" for package, _, scope in missing if scope not in ("handler", "trainer")]
+    if required:
+        return "FAIL", f"missing {', '.join(required)}"
+    if optional:
+        return "WARN", f"optional packages missing: {', '.join(optional)}"
+    return "PASS", f"{len(report)} packages present"
+
+
+def fast_check_model(artifact):
+    """Existence + safetensors header parse via mmap; no tensor data is read"""
+    from safetensors_header import SafetensorsHeaderError, read_header, tensor_count
+
+    def check():
+        path = artifact["dest"]
+        if not os.path.exists(path):
+            return "WARN", f"{path} not provisioned yet (downloaded by pre-warm or the first job)"
+        try:
+            header = read_header(path)
+        except SafetensorsHeaderError as e:
+            return "FAIL", str(e)
+        return "PASS", f"{tensor_count(header)} tensors, {os.path.getsize(path) / 1024 ** 3:.2f} GB"
+
+    return check
+
+
+def fast_check_kohya():
+    from model_registry import sd_scripts_dir, train_script_path
+
+    missing = [path for path in (train_script_path(), os.path.join(sd_scripts_dir(), "library", "train_util.py"))
+               if not os.path.isfile(path)]
+    if missing:
+        return "FAIL", f"missing {', '.join(missing)}"
+    return "PASS", sd_scripts_dir()
+
+
+def fast_check_accelerate():
+    path = shutil.which("accelerate")
+    return ("PASS", path) if path else ("FAIL", "accelerate not on PATH")
+
+
+def fast_check_gpu():
+    from launch_profile import detect_vram_gb, select_profile
+
+    vram_gb = detect_vram_gb()
+    if not vram_gb:
+        return "WARN", "no GPU detected via nvidia-smi"
+    return "PASS", f"{vram_gb:g} GB VRAM, launch profile {select_profile(vram_gb=vram_gb)['name']}"
+
+
+def fast_check_disk():
+    from workspace import TRAINING_ROOT, WORKSPACE_MIN_FREE_BYTES
+
+    free = shutil.disk_usage(TRAINING_ROOT).free
+    details = f"{free / 1024 ** 3:.1f} GB free under {TRAINING_ROOT}"
+    return ("PASS", details) if free >= WORKSPACE_MIN_FREE_BYTES else ("FAIL", details)
+
+
+def fast_check_sources():
+    """Compile the handler modules in-process (no py_compile subprocess, nothing imported)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    missing, errors = [], []
+    for name in HANDLER_SOURCES:
+        path = os.path.join(here, name)
+        try:
+            with open(path, "rb") as f:
+                compile(f.read(), path, "exec")
+        except FileNotFoundError:
+            missing.append(name)
+        except SyntaxError as e:
+            errors.append(f"{name}:{e.lineno}: {e.msg}")
+    if missing or errors:
+        return "FAIL", "; ".join(([f"missing {', '.join(missing)}"] if missing else []) + errors)
+    return "PASS", f"{len(HANDLER_SOURCES)} modules compile"
+
+
+def fast_checks():
+    """(name, check) pairs for the fast mode, one per model artifact"""
+    from model_registry import get_artifacts
+
+    checks = [
+        ("environment", fast_check_env),
+        ("dependencies", fast_check_dependencies),
+        ("handler_sources", fast_check_sources),
+        ("kohya", fast_check_kohya),
+        ("accelerate", fast_check_accelerate),
+        ("gpu", fast_check_gpu),
+        ("disk", fast_check_disk),
+    ]
+    try:
+        artifacts = get_artifacts()
+    except ValueError as e:
+        return checks + [("models", lambda: ("FAIL", str(e)))]
+    return checks + [(f"model:{artifact['name']}", fast_check_model(artifact)) for artifact in artifacts]
+
+
+def run_checks(checks, timeout=VALIDATE_CHECK_TIMEOUT):
+    """Run every check concurrently; a check still running timeout seconds after it started fails
+
+    Checks run on daemon threads so a hung one (e.g. nvidia-smi) cannot keep
+    the probe from exiting.
+    """
+    results = {}
+
+    def run(name, check):
+        started = time.perf_counter()
+        try:
+            status, details = check()
+        except Exception as e:
+            status, details = "FAIL", f"{type(e).__name__}: {e}"
+        results[name] = {"name": name, "status": status, "details": details,
+                         "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    deadlines = {}
+    threads = [(name, threading.Thread(target=run, args=(name, check), daemon=True)) for name, check in checks]
+    for name, thread in threads:
+        deadlines[name] = time.monotonic() + timeout
+        thread.start()
+    for name, thread in threads:
+        thread.join(max(0.0, deadlines[name] - time.monotonic()))
+    return [results.get(name) or {"name": name, "status": "FAIL", "details": f"timed out after {timeout:g}s",
+                                  "ms": round(timeout * 1000, 1)}
+            for name, _ in threads]
+
+
+def run_fast(as_json=False, timeout=VALIDATE_CHECK_TIMEOUT):
+    """Fast readiness probe; returns the process exit code"""
+    started = time.perf_counter()
+    results = run_checks(fast_checks(), timeout)
+    ok = all(result["status"] != "FAIL" for result in results)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    if as_json:
+        print(json.dumps({"ok": ok, "ms": elapsed_ms, "checks": results}))
+    else:
+        for result in results:
+            print_status(f"{result['name']} ({result['ms']:.1f}ms)", result["status"],
+                         result["details"] if result["status"] != "PASS" else None)
+        failed = sum(1 for result in results if result["status"] == "FAIL")
+        print(f"\n{Colors.BOLD}{len(results) - failed}/{len(results)} checks passed in {elapsed_ms:.0f}ms{Colors.ENDC}")
+    return 0 if ok else 1
+
+
 def main():
     """Run all validation checks."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fast", action="store_true", help="concurrent, import-free readiness checks")
+    parser.add_argument("--json", action="store_true", help="print one JSON object (implies --fast)")
+    parser.add_argument("--timeout", type=float, default=VALIDATE_CHECK_TIMEOUT, help="per-check timeout in seconds")
+    args = parser.parse_args()
+    if args.fast or args.json:
+        return run_fast(as_json=args.json, timeout=args.timeout)
+    
     print(f"{Colors.BOLD}{Colors.BLUE}")
     print("=" * 60)
     print("  FluxGym RunPod Serverless - Deployment Validation")
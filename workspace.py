@@ -0,0 +1,175 @@
+"""
+Workspace Manager
+Per-job training directories under TRAINING_ROOT: a free-space check before
+a job starts, cleanup (or archiving) once its outputs are uploaded, and a
+global byte budget across job directories and the worker caches so
+long-lived workers do not fill their disk.
+
+    WORKSPACE_CLEANUP=delete    delete | archive | keep  (successful jobs)
+    WORKSPACE_MAX_BYTES=...     budget for job dirs + caches (0 = disk only)
+"""
+
+import errno
+import os
+import shutil
+import threading
+import time
+
+TRAINING_ROOT = os.getenv("TRAINING_ROOT", "/tmp")
+WORKSPACE_CLEANUP = os.getenv("WORKSPACE_CLEANUP", "delete")
+CLEANUP_MODES = ("delete", "archive", "keep")
+WORKSPACE_ARCHIVE_DIR = os.getenv("WORKSPACE_ARCHIVE_DIR", os.path.join(TRAINING_ROOT, "training_archive"))
+WORKSPACE_MAX_BYTES = int(os.getenv("WORKSPACE_MAX_BYTES", "0"))
+# Free space kept on top of a job's estimate (for logs, pip caches, the OS)
+WORKSPACE_MIN_FREE_BYTES = int(os.getenv("WORKSPACE_MIN_FREE_BYTES", str(2 * 1024 ** 3)))
+JOB_DIR_PREFIX = "training_"
+
+# Rough on-disk sizes used to estimate a job's footprint
+IMAGE_BYTES_AT_1024 = 2 * 1024 ** 2
+ENCODER_CACHE_BYTES_PER_IMAGE = 10 * 1024 ** 2
+LORA_BYTES_PER_RANK = int(2.6 * 1024 ** 2)
+
+_active = set()
+_active_lock = threading.Lock()
+
+
+class WorkspaceError(Exception):
+    """Raised when there is not enough disk space to start a job"""
+
+
+def job_dir(job_id, index=None):
+    """Training directory for a job (or one character of a batch)"""
+    name = f"{JOB_DIR_PREFIX}{job_id}" if index is None else f"{JOB_DIR_PREFIX}{job_id}_{index:02d}"
+    return os.path.join(TRAINING_ROOT, name)
+
+
+def disk_usage(path):
+    """Bytes used by a file or directory tree (0 if it does not exist)"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+def estimate_job_bytes(image_count, resolution, schedule, network_dim=32):
+    """Expected peak footprint: images, encoder caches and every saved checkpoint"""
+    scale = (resolution / 1024) ** 2
+    checkpoints = 1
+    if schedule.get("save_every_n_steps"):
+        checkpoints += schedule["max_train_steps"] // schedule["save_every_n_steps"]
+    return int(image_count * (IMAGE_BYTES_AT_1024 * scale + ENCODER_CACHE_BYTES_PER_IMAGE)
+               + checkpoints * network_dim * LORA_BYTES_PER_RANK)
+
+
+def _inactive_job_dirs():
+    """(mtime, path) of job and archived directories not in use, oldest first"""
+    with _active_lock:
+        active = set(_active)
+    candidates = []
+    for root in (TRAINING_ROOT, WORKSPACE_ARCHIVE_DIR):
+        try:
+            names = os.listdir(root)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            path = os.path.join(root, name)
+            if not name.startswith(JOB_DIR_PREFIX) or path in active or path == WORKSPACE_ARCHIVE_DIR:
+                continue
+            if os.path.isdir(path):
+                candidates.append((os.path.getmtime(path), path))
+    return sorted(candidates)
+
+
+def _remove(path):
+    size = disk_usage(path)
+    shutil.rmtree(path, ignore_errors=True)
+    return size
+
+
+def enforce_budget(max_bytes=WORKSPACE_MAX_BYTES, caches=(), reserve=0):
+    """Bring job dirs + caches under max_bytes - reserve; returns bytes reclaimed
+
+    Old job directories go first, then the caches are evicted (LRU) for
+    whatever is still over budget.
+    """
+    if not max_bytes:
+        return 0
+    limit = max(0, max_bytes - reserve)
+    caches = [cache for cache in caches if cache is not None]
+    cache_sizes = [disk_usage(cache.objects_dir) for cache in caches]
+    dirs = _inactive_job_dirs()
+    total = sum(cache_sizes) + sum(disk_usage(path) for _, path in dirs)
+    with _active_lock:
+        total += sum(disk_usage(path) for path in _active)
+
+    reclaimed = 0
+    for _, path in dirs:
+        if total <= limit:
+            break
+        size = _remove(path)
+        total -= size
+        reclaimed += size
+    for cache, size in zip(caches, cache_sizes):
+        if total <= limit:
+            break
+        freed = cache.evict(max_bytes=max(0, size - (total - limit)))
+        total -= freed
+        reclaimed += freed
+    if reclaimed:
+        print(f"Workspace budget: reclaimed {reclaimed / 1024 ** 2:.1f} MB")
+    return reclaimed
+
+
+def prepare_workspace(path, needed_bytes, caches=()):
+    """Claim a job directory, making room for needed_bytes; returns bytes reclaimed"""
+    with _active_lock:
+        _active.add(path)
+    os.makedirs(path, exist_ok=True)
+    reclaimed = enforce_budget(caches=caches, reserve=needed_bytes)
+
+    free = shutil.disk_usage(path).free
+    if free < needed_bytes + WORKSPACE_MIN_FREE_BYTES:
+        # Out of disk regardless of the budget: drop every finished job dir
+        for _, stale in _inactive_job_dirs():
+            reclaimed += _remove(stale)
+        free = shutil.disk_usage(path).free
+    if free < needed_bytes + WORKSPACE_MIN_FREE_BYTES:
+        release_workspace(path, success=False)
+        raise WorkspaceError(
+            f"Not enough disk space: job needs ~{needed_bytes / 1024 ** 3:.1f} GB "
+            f"plus {WORKSPACE_MIN_FREE_BYTES / 1024 ** 3:.1f} GB headroom, "
+            f"{free / 1024 ** 3:.1f} GB free")
+    return reclaimed
+
+
+def release_workspace(path, success, mode=WORKSPACE_CLEANUP):
+    """Finish with a job directory; returns bytes reclaimed
+
+    Successful jobs are deleted (or archived / kept, per mode). Failed jobs
+    are left for debugging until the budget reclaims them.
+    """
+    with _active_lock:
+        _active.discard(path)
+    if not success or mode == "keep" or not os.path.isdir(path):
+        return 0
+    if mode == "archive":
+        os.makedirs(WORKSPACE_ARCHIVE_DIR, exist_ok=True)
+        dest = os.path.join(WORKSPACE_ARCHIVE_DIR, os.path.basename(path))
+        if os.path.exists(dest):
+            shutil.rmtree(dest, ignore_errors=True)
+        try:
+            os.replace(path, dest)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Archive dir on another mount: copy across, then delete
+            shutil.move(path, dest)
+        os.utime(dest, (time.time(), time.time()))
+        return 0
+    return _remove(path)